@@ -13,6 +13,9 @@ Hook which chooses an environment file to use based on the current context.
 
 """
 
+import os
+import sys
+
 from tank import Hook
 
 class PickEnvironment(Hook):
@@ -23,6 +26,45 @@ class PickEnvironment(Hook):
 		and project, and switches to these based on entity type.
 		"""
 		
+		lib_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "hooks", "lib")
+		if lib_path not in sys.path:
+			sys.path.append(lib_path)
+
+		from rts import env_cache
+		if env_cache.enabled():
+			# resolve the environment from the precompiled cache, see hooks/lib/rts/env_cache.py
+			env_cache.install()
+
+		if os.environ.get("RTS_SG_RECORD") or os.environ.get("RTS_SG_REPLAY") or os.environ.get("RTS_SG_PROFILE"):
+			from rts import sg_instrument
+			from rts import sg_replay
+			# record or replay the shotgun traffic of this session, see hooks/lib/rts/sg_replay.py
+			sg_replay.install(self.parent)
+			if sg_instrument.enabled():
+				# record every shotgun call made through this tk instance, see hooks/lib/rts/sg_instrument.py
+				sg_instrument.install(self.parent)
+
+		from rts import scene_inventory
+		if scene_inventory.enabled():
+			# index the publishable nodes of the Maya scene from its callbacks, see hooks/lib/rts/scene_inventory.py
+			scene_inventory.install()
+
+		if not os.environ.get("RTS_STARTUP_TRACE"):
+			return self._pick_environment(context)
+
+		from rts import startup_trace
+		# timeline of the engine startup, see hooks/lib/rts/startup_trace.py
+		tracer = startup_trace.install(self.parent)
+		with tracer.span("pick_environment", "environment") as span:
+			name = self._pick_environment(context)
+			span.args = {"environment": name, "context": str(context)}
+		tracer.metadata["environment"] = name
+		return name
+
+	def _pick_environment(self, context):
+		"""
+		Return the name of the environment matching a context.
+		"""
 		if context.project is None:
 			# our context is completely empty! 
 			# don't know how to handle this case.
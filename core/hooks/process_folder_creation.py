@@ -0,0 +1,46 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+I/O Hook which creates folders on disk.
+
+"""
+
+import os
+import sys
+
+from tank import Hook
+
+class ProcessFolderCreation(Hook):
+
+	def execute(self, items, preview_mode, **kwargs):
+		"""
+		Creates a list of files and folders.
+
+		The default implementation creates files and folders recursively using
+		open permissions. This one gets the folders of every entity of a
+		create_filesystem_structure call at once and creates each of them with a
+		single mkdir, see hooks/lib/rts/folder_batch.py.
+
+		This hook should return a list of files and folders that have been created.
+		"""
+
+		lib_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "hooks", "lib")
+		if lib_path not in sys.path:
+			sys.path.append(lib_path)
+
+		from rts import folder_batch
+
+		# set the umask so that we get true permissions
+		old_umask = os.umask(0)
+		try:
+			return folder_batch.process_items(items, preview_mode)
+		finally:
+			os.umask(old_umask)
@@ -9,12 +9,19 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 import maya.cmds as cmds
 
 import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import scene_inventory
+
 class ScanSceneHook(Hook):
 	"""
 	Hook to scan scene for items to publish
@@ -67,10 +74,17 @@ class ScanSceneHook(Hook):
 		# create the primary item - this will match the primary output 'scene_item_type':            
 		items.append({"type": "work_file", "name": name})
 		
+		# the alembic groups are known to the scene inventory when it is running
+		inventory = scene_inventory.get_inventory()
+		if inventory is not None:
+			groups = inventory.names("alembic", long=True)
+		else:
+			groups = cmds.ls("*:alembic", long=True)
+		
 		# Deselect all
 		cmds.select(deselect=True)
 		# look for root level groups that have meshes as children:
-		for grp in cmds.ls("*:alembic", long=True):
+		for grp in groups:
 			# Use selection to get all the children of "Alembic" objectset
 			cmds.select(grp, hierarchy=True, add=True)
 			# Get only the selected items. (if necessary take only certain types to export!)
@@ -9,12 +9,20 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 import maya.cmds as cmds
 
 import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import scan_cache
+from rts import scene_hierarchy
+
 class ScanSceneHook(Hook):
 	"""
 	Hook to scan selection for items to publish
@@ -22,7 +30,21 @@ class ScanSceneHook(Hook):
 	
 	def execute(self, **kwargs):
 		"""
-		Main hook entry point
+		Main hook entry point, returns the items found by _scan(), reused
+		while the scene did not change, see hooks/lib/rts/scan_cache.py. Only
+		the scene is cached, Shotgun is asked again whether the assets exist.
+		"""
+		items = scan_cache.cached_scan("assets_Maya_scan_selection", lambda: self._scan(**kwargs), selection=True)
+		for item in items:
+			other_params = item.get("other_params")
+			if other_params and "existing" in other_params:
+				other_params["existing"] = checkIfAssetExists(self.parent.shotgun, item["name"], item["type"])
+				item["selected"] = not other_params["existing"]
+		return items
+
+	def _scan(self, **kwargs):
+		"""
+		Scan the scene
 		:returns:       A list of any items that were found to be published.  
 						Each item in the list should be a dictionary containing 
 						the following keys:
@@ -73,9 +95,6 @@ class ScanSceneHook(Hook):
 		items.append({"type": "work_file", "name": name})
 		
 		
-		# Deselect all
-		# cmds.select(deselect=True)
-		
 		# look for root level groups that have meshes as children:
 		modelDict = {}
 		selectedObjects = cmds.ls(selection = True, allPaths= True)
@@ -83,19 +102,24 @@ class ScanSceneHook(Hook):
 		if selectedObjects == []:
 			return items
 		
-		allObjectList = cmds.ls(cmds.listRelatives(cmds.ls(type = "locator", allPaths= True) ,parent = True, type = "transform", path = True))
+		# read the DAG once, the selection is left alone
+		hierarchy = scene_hierarchy.from_maya()
+		allObjectList = set(hierarchy.locator_transforms())
 		
 		objectList = []
 		for s in selectedObjects:
 			if s in allObjectList:
-				objectList.append(s)
+				if s not in objectList:
+					objectList.append(s)
 			else:
-				selectionObjectList = cmds.ls(cmds.listRelatives(cmds.ls(selection = True) ,parent = True, type = "transform", path = True))
-				for t in selectionObjectList:
-					if t in allObjectList and t not in objectList:
-						objectList.append(t)
+				# a shape or a child of a locator transform is selected
+				t = hierarchy.parent(s)
+				if t in allObjectList and t not in objectList:
+					objectList.append(t)
+		# an instanced locator is one candidate, its instances are counted in its amount
+		objectList = hierarchy.first_instances(objectList)
 		
-		childrenAndParentsDict, typeDict = getAllParentsAndTypeDict(objectList)
+		childrenAndParentsDict, typeDict = getAllParentsAndTypeDict(objectList, hierarchy)
 		
 		for obj in objectList:
 			print '   # Checking object : %s' %obj
@@ -120,7 +144,7 @@ class ScanSceneHook(Hook):
 			print assetName
 			
 			if assetName in modelDict:
-				modelDict[assetName]["other_params"]["amount"] += 1
+				modelDict[assetName]["other_params"]["amount"] += hierarchy.instance_count(obj)
 				modelDict[assetName]["description"] = "objectName : %s, amount in scene : %s" %(obj,modelDict[assetName]["other_params"]["amount"])
 				# print 'DOUBLES : ', assetName, obj
 				continue
@@ -146,17 +170,14 @@ class ScanSceneHook(Hook):
 			elif assetObjName in typeDict:
 				tempType = typeDict[obj]
 				
-			existing = checkIfAssetExists(self.parent.shotgun, assetName, tempType)
-			selected = not existing
+			# filled in by execute(), the cached scan must not decide whether the asset is created
+			existing = None
+			selected = True
 			
-			# Use selection to get all the children of "Alembic" objectset
-			tempChildren = cmds.listRelatives(obj, allDescendents = False, children = True, path = True)
-			cmds.select(tempChildren, hierarchy=True, add=True)
-			# Get only the selected items. (if necessary take only certain types to export!)
-			sel=cmds.ls(selection=True, showType=True)
+			# all the nodes below the object with their types, as ls(selection=True, showType=True) gave them
+			sel = hierarchy.descendants_with_types(obj)
 			descr = 'objectName : %s' %obj
-			modelDict[assetName] = {"type":tempType, "name":assetName, "selected":selected, "description":descr, "other_params":{"selectionDict":sel,"amount":1, "propName":obj, "existing":existing}}
-			cmds.select(deselect=True)		
+			modelDict[assetName] = {"type":tempType, "name":assetName, "selected":selected, "description":descr, "other_params":{"selectionDict":sel,"amount":hierarchy.instance_count(obj), "propName":obj, "existing":existing}}
 			
 		for m in modelDict:
 			items.append(modelDict[m])
@@ -169,35 +190,15 @@ class ScanSceneHook(Hook):
 		# print testList.getList()
 		# print "### testing importstuff ###"
 		
-		cmds.select(selectedObjects, add = False)
-		
 		return items
 
 		
-def getAllParentsAndTypeDict(objectList = None):
-	childrenAndParentsDict = {}
-	
+def getAllParentsAndTypeDict(objectList = None, hierarchy = None):
+	if hierarchy == None:
+		hierarchy = scene_hierarchy.from_maya()
 	if objectList == None:
-		objectList = cmds.listRelatives(cmds.ls(type = "locator", allPaths= True) ,parent = True, type = "transform")
-	typeDict = {}
-	parentsDict = {}
-	for obj in objectList:
-		if obj not in typeDict:
-			typeDict[str(obj)] = "Prop"
-		tempParent = cmds.listRelatives(obj, parent = True)
-		if tempParent != None:
-			typeDict[str(tempParent[0])] = "Set"
-			parentsDict[str(obj)] = str(tempParent[0])
-		
-	for obj in objectList:
-		parentList = []
-		newChild = obj
-		while str(newChild) in parentsDict:
-			parent = parentsDict[str(newChild)]
-			parentList.append(parent)
-			newChild = parent
-		childrenAndParentsDict[str(obj)] = parentList
-	return childrenAndParentsDict, typeDict
+		objectList = hierarchy.locator_transforms()
+	return hierarchy.parents_and_types(objectList)
 	
 def checkReference(obj):
 	# tempCheck = cmds.ls(references = True)
@@ -1,4 +1,5 @@
 import os
+import sys
 import shutil
 import maya.cmds as cmds
 import maya.mel as mel
@@ -7,6 +8,16 @@ import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import folder_batch
+from rts import fs_cache
+from rts import instancing
+from rts import poslist_spatial
+from rts import version_index
+
 class PublishHook(Hook):
 	"""
 	Single hook that implements publish functionality for secondary tasks
@@ -77,7 +88,12 @@ class PublishHook(Hook):
 						}
 		"""
 
+		# folders cached by an earlier publish of the session may be gone, a failed
+		# publish never reaches the post publish hook resetting the cache
+		fs_cache.reset()
 		results = []
+		# assets created by this publish, their folders are created together at the end
+		new_entities = []
 
 		# publish all tasks:
 		for task in tasks:
@@ -92,7 +108,9 @@ class PublishHook(Hook):
 			if output["name"] == "prop":
 				try:
 					print item["name"]
-					self._publish_prop_for_item(item, output, work_template, primary_publish_path, sg_task, comment, thumbnail_path, progress_cb)
+					new_entity = self._publish_prop_for_item(item, output, work_template, primary_publish_path, sg_task, comment, thumbnail_path, progress_cb)
+					if new_entity:
+						new_entities.append((task, new_entity))
 				except Exception, e:
 					errors.append("Publish failed - %s" % e)
 			else:
@@ -106,11 +124,23 @@ class PublishHook(Hook):
 
 			progress_cb(100)
 
+		if new_entities:
+			### Create folders from shotgun for all the new assets in one go ###
+			progress_cb(0, "Creating folders for %d new assets" % len(new_entities))
+			try:
+				folder_batch.create_folders(self.parent.tank, [entity for _, entity in new_entities], "tk-maya")
+			except Exception, e:
+				for task, entity in new_entities:
+					results.append({"task":task, "errors":["Folder creation failed for %s - %s" % (entity.get("code", entity["id"]), e)]})
+			progress_cb(100)
+
 		return results
 
 	def _publish_prop_for_item(self, item, output, work_template, primary_publish_path, sg_task, comment, thumbnail_path, progress_cb):
 		"""
 		Export an asset from the scene and publish it to Shotgun.
+		Returns the asset entity if it was created by this publish, its folders
+		are left to the caller.
 		"""
 		assetName = item["name"]
 		objectName = item["other_params"]["propName"]
@@ -178,6 +208,8 @@ class PublishHook(Hook):
 		
 		tempPos, tempRot, tempScl = getTransform(objectName)
 		setTransform(objectName)
+		# the loader culls the asset with a sphere around its locator, see hooks/lib/rts/poslist_spatial.py
+		boundingRadius = poslist_spatial.asset_bounding_radius(sel, cmds.xform(objectName, query = True, worldSpace = True, translation = True))
 		
 		progress_cb(25)
 		
@@ -185,8 +217,8 @@ class PublishHook(Hook):
 			print 'TRY to publish model : %s' %objectName
 			publish_folder = os.path.dirname(model_publish_path)
 			workfile_folder = os.path.dirname(model_workfile_path)
-			self.parent.ensure_folder_exists(publish_folder)
-			self.parent.ensure_folder_exists(workfile_folder)
+			fs_cache.ensure_folder(publish_folder, self.parent.ensure_folder_exists)
+			fs_cache.ensure_folder(workfile_folder, self.parent.ensure_folder_exists)
 			
 			tk = self.parent.tank
 			print 'implement the export of object :', assetName
@@ -228,14 +260,21 @@ class PublishHook(Hook):
 		print "Publish name = ", publish_name
 		setTransform(objectName, tempPos, tempRot, tempScl)
 		
-		returnEntity = None
-		if item["other_params"]["existing"]:
-			filters = [ ['code', 'is', assetName] ]
-			returnEntity = self.parent.shotgun.find_one("Asset", filters)
-		else:
+		# asked again right before creating, the asset may have been created
+		# since the scan by someone else or by a publish that failed later on
+		filters = [ ['code', 'is', assetName] ]
+		returnEntity = self.parent.shotgun.find_one("Asset", filters)
+		created = returnEntity == None
+		if created:
 			returnEntity = self._create_asset_in_shotgun(assetName, assetType, [self.parent.context.entity], template = taskTemplate)
 		returnContext = self.parent.tank.context_from_entity(returnEntity["type"], returnEntity["id"])
 		
+		if boundingRadius != None:
+			try:
+				self.parent.shotgun.update("Asset", returnEntity["id"], {poslist_spatial.radius_field(): boundingRadius})
+			except Exception, e:
+				print "Could not store the bounding radius of %s - %s" %(assetName, e)
+		
 		print "Find right task..."
 		taskFilters = [ ['content','is','Model Layout'],['entity', 'is', {'type':returnEntity["type"], 'id':returnEntity["id"]}]]
 		taskFields = ['id', 'content', 'sg_status_list']
@@ -263,11 +302,9 @@ class PublishHook(Hook):
 							   [primary_publish_path])
 
 		progress_cb(90)
-		### Create folders from shotgun... (= wait long time) ###
-		# print self.parent.tank.preview_filesystem_structure(returnEntity["type"], returnEntity["id"], "tk-maya")
-		if not item["other_params"]["existing"]:
-			self.parent.tank.create_filesystem_structure(returnEntity["type"], returnEntity["id"], "tk-maya")
-			
+		if created:
+			return returnEntity
+		return None
 		
 	def _register_publish(self, path, name, sg_task, publish_version, tank_type, comment, thumbnail_path, context = None, dependency_paths=None):
 		"""
@@ -367,17 +404,8 @@ class PublishHook(Hook):
 	def versionUpAsset(self, targetPath, assetTemplate):
 		fields = assetTemplate.get_fields(str(targetPath))
 		print fields
-		all_versions = self.parent.tank.paths_from_template(assetTemplate, fields, skip_keys=["version"])
-		# now look for the highest version number...
-		
-		latest_version = 0
-		if len(all_versions) > 0:
-			for ver in all_versions:
-				fields = assetTemplate.get_fields(ver)
-				if fields["version"] > latest_version:
-					latest_version = fields["version"]
-				
-		return (latest_version)
+		# highest version on disk, 0 if there is none
+		return version_index.get_index().latest_version(assetTemplate, fields)
 		
 			
 		
@@ -402,40 +430,41 @@ def getTransform(objName):
 	return pos, rot, scl
 
 def getInstances():
-	instances = []
-	iterDag = om.MItDag(om.MItDag.kBreadthFirst)
-	while not iterDag.isDone():
-		instanced = om.MItDag.isInstanced(iterDag)
-		if instanced:
-			instances.append(iterDag.fullPathName())
-		iterDag.next()
-	return instances
+	# every instanced node, meshes included
+	return instancing.instanced_paths(skip_types=())
 	
 def uninstance():
-	instances = getInstances()
-	for i in instances:
-		if cmds.objExists(i):
-			if cmds.objectType(i) != "mesh":
-				parenttmp = cmds.listRelatives(i, parent=True, fullPath=True)
-				parentname = str(parenttmp)
-				currName = i.split('|')[-2]
-				cmds.duplicate(parenttmp,n=currName+"tmpToRename")
-				cmds.delete(parenttmp)
-				instances = getInstances()
+	# instanced paths are collected once, parents first, a path below a group
+	# already replaced is gone without asking Maya
+	replaced = set()
+	for i in instancing.instanced_paths():
+		if instancing.is_below(i, replaced):
+			continue
+		parenttmp = i.rsplit('|', 1)[0]
+		if not parenttmp:
+			continue
+		currName = parenttmp.split('|')[-1]
+		cmds.duplicate(parenttmp,n=currName+"tmpToRename")
+		cmds.delete(parenttmp)
+		replaced.add(parenttmp)
 
 def deleteUnusedGroups():
-	instances = getInstances()
-	for i in instances:
-		if cmds.objExists(i):
-			if cmds.objectType(i) != "mesh":
-				try:
-					cmds.delete(i)
-				except:
-					None
+	# children go with their group, only the top-most instanced groups left are deleted
+	leftovers = instancing.top_most(instancing.instanced_paths())
+	if not leftovers:
+		return
+	try:
+		cmds.delete(leftovers)
+	except:
+		for i in leftovers:
+			try:
+				cmds.delete(i)
+			except:
+				None
 
 def RenameUnistanced():
-	AllScene = cmds.ls()
-	for i in AllScene:
-		if cmds.objExists(i):
-			if cmds.objectType(i) != "mesh" and 'tmpToRename' in i:
-					cmds.rename( i, i.split('tmpToRename')[0] )
\ No newline at end of file
+	# one query for the duplicates, renamed children first so the long names stay valid
+	found = cmds.ls("*tmpToRename*", long=True, recursive=True, showType=True) or []
+	toRename = [found[n] for n in range(0, len(found), 2) if found[n+1] != "mesh"]
+	for i in instancing.deepest_first(toRename):
+		cmds.rename( i, i.split('|')[-1].split('tmpToRename')[0] )
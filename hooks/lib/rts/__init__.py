@@ -0,0 +1,5 @@
+"""
+Shared helpers for the project hooks.
+
+See hooks/lib/README for how hooks put this package on the python path.
+"""
@@ -0,0 +1,550 @@
+"""
+Precompiled environment configurations.
+
+Every engine start and context switch reads an environment file of env/,
+parses the files it includes (env/includes/*.yml and, for app_launchers.yml,
+the sgtk_overrides.yml of the sequence, shot or asset when they exist) and
+resolves the '@' references. The result only changes when one of those files
+does, so EnvironmentCache keeps it, as JSON, next to a manifest of the files
+it was built from:
+
+- the modification time, size and sha1 of every file read.
+- the include paths resolved from the context which did not exist, so that
+  an sgtk_overrides.yml created later is picked up.
+
+A lookup stats the files of the manifest. When they are unchanged, or only
+touched with the same content, the stored result is returned and no yaml is
+parsed. Anything else falls back to a full load which refreshes the entry.
+Entries are keyed by environment file and by the project, entity, step and
+task of the context, and live in RTS_ENV_CACHE_DIR, a per-user folder by
+default (see user_cache.py). Files owned by another user or writable by others
+are ignored, and an environment holding values JSON can not keep as they are
+is not cached.
+
+install() makes Toolkit use the cache: the pick_environment core hook calls it
+before the environment is loaded, and setting RTS_ENV_CACHE=0 turns it off.
+Toolkit still reads the environment file itself, what gets skipped is the
+parsing of the included files and the resolution of the references.
+
+Building the cache ahead of time for the contexts of some entities, with the
+keys the engines look them up with, and comparing load times:
+
+	python hooks/lib/rts/env_cache.py build --entity Shot:1234 Sequence:56 [--task 789 ...]
+	python hooks/lib/rts/env_cache.py benchmark [--repeat 20]
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+try:
+	import yaml
+except ImportError:
+	from tank_vendor import yaml
+
+if __name__ == "__main__":
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import user_cache
+
+ENABLE_ENV = "RTS_ENV_CACHE"
+CACHE_DIR_ENV = "RTS_ENV_CACHE_DIR"
+
+# env folder of this configuration
+ENV_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+	os.path.abspath(__file__))))), "env")
+# pipeline configuration holding it
+PIPELINE_CONFIG_ROOT = os.path.dirname(os.path.dirname(ENV_ROOT))
+
+_TOKEN = re.compile(r"\{([^}]+)\}")
+
+try:
+	_string_types = (str, unicode)
+except NameError:
+	_string_types = (str,)
+
+_cache = None
+_original_process_includes = None
+
+
+class IncludeError(Exception):
+	"""
+	Raised when an include or a reference of an environment can not be resolved.
+	"""
+
+
+def enabled():
+	"""
+	Return False if the cache was turned off with RTS_ENV_CACHE=0.
+	"""
+	return os.environ.get(ENABLE_ENV, "1") not in ("0", "false", "False", "")
+
+
+def get_cache():
+	"""
+	Return the environment cache of the session.
+	"""
+	global _cache
+	if _cache is None:
+		_cache = EnvironmentCache()
+	return _cache
+
+
+def context_key(context):
+	"""
+	Return a string identifying what of a context changes the includes: the
+	project, entity, step and task of a Toolkit context or the fields of a
+	dictionary.
+	"""
+	if context is None:
+		return "none"
+	if isinstance(context, dict):
+		return repr(sorted(context.items()))
+	parts = []
+	for name in ("project", "entity", "step", "task"):
+		value = getattr(context, name, None)
+		parts.append("%s:%s" % (name, "%s/%s" % (value.get("type"), value.get("id")) if value else None))
+	return "|".join(parts)
+
+
+def _context_include(include, context, project_root):
+	"""
+	Resolve an include holding {tokens} from the context, None if the context
+	lacks a value.
+	"""
+	if isinstance(context, dict):
+		try:
+			relative = _TOKEN.sub(lambda m: str(context[m.group(1)]), include)
+		except KeyError:
+			return None
+		return os.path.join(project_root or "", relative)
+
+	# a Toolkit context, resolve it the way the core does
+	import tank
+	keys = dict((name, tank.templatekey.StringKey(name)) for name in _TOKEN.findall(include))
+	root = project_root or context.tank.project_path
+	template = tank.template.TemplatePath(include, keys, root)
+	try:
+		return template.apply_fields(context.as_template_fields(template))
+	except tank.TankError:
+		return None
+
+
+def resolve_includes(file_name, data, context=None, project_root=None):
+	"""
+	Return (included files, files which could have been included but do not
+	exist) for the includes of an environment file.
+
+	:raises IncludeError: If a plain include does not exist
+	"""
+	data = data or {}
+	includes = []
+	if data.get("include"):
+		includes.append(data["include"])
+	includes.extend(data.get("includes") or [])
+	included = []
+	missing = []
+	for include in includes:
+		path = os.path.expandvars(os.path.expanduser(include))
+		if "{" in path:
+			if context is None:
+				continue
+			path = _context_include(path, context, project_root)
+			if path is None:
+				continue
+			path = os.path.normpath(path)
+			if not os.path.exists(path):
+				missing.append(path)
+				continue
+		else:
+			if not os.path.isabs(path):
+				path = os.path.join(os.path.dirname(file_name), path)
+			path = os.path.normpath(path)
+			if not os.path.exists(path):
+				raise IncludeError("Include resolve error in '%s': '%s' resolved to '%s' which does not exist!" %
+								   (file_name, include, path))
+		included.append(path)
+	return included, missing
+
+
+def _read_yaml(path):
+	with open(path) as source:
+		return yaml.safe_load(source) or {}
+
+
+def _resolve_refs(lookup, data):
+	if isinstance(data, dict):
+		return dict((k, _resolve_refs(lookup, v)) for k, v in data.items())
+	if isinstance(data, list):
+		return [_resolve_refs(lookup, v) for v in data]
+	if isinstance(data, _string_types) and data.startswith("@"):
+		reference = data[1:]
+		if reference not in lookup:
+			raise IncludeError("Undefined Reference %s!" % reference)
+		return copy.deepcopy(lookup[reference])
+	return data
+
+
+def _merge_frameworks(lookup, data):
+	frameworks = lookup.get("frameworks")
+	if isinstance(frameworks, dict):
+		if not isinstance(data.get("frameworks"), dict):
+			data["frameworks"] = {}
+		data["frameworks"].update(frameworks)
+	return data
+
+
+def _flatten_r(file_name, data, context, project_root, files, missing):
+	included, absent = resolve_includes(file_name, data, context, project_root)
+	missing.extend(absent)
+	lookup = {}
+	for path in included:
+		files.append(path)
+		included_data = _flatten_r(path, _read_yaml(path), context, project_root, files, missing)
+		if isinstance(included_data.get("frameworks"), dict):
+			# frameworks of the included files are merged instead of replaced
+			lookup = _merge_frameworks(included_data, lookup)
+		lookup.update(included_data)
+	try:
+		data = _resolve_refs(lookup, data)
+	except IncludeError as e:
+		raise IncludeError("Include error. Could not resolve references for %s: %s" % (file_name, e))
+	return _merge_frameworks(lookup, data)
+
+
+def flatten(env_path, context=None, project_root=None, data=None):
+	"""
+	Read an environment file, resolve its includes and references like the
+	Toolkit core does.
+
+	:param env_path:     Environment file
+	:param context:      Toolkit context or dictionary of fields used by includes
+						 holding {tokens}, these includes are skipped without one
+	:param project_root: Folder {token} includes are relative to, the project
+						 folder of the context by default
+	:param data:         Content of the environment file if already parsed
+	:returns:            (resolved data, files read, include paths not found)
+	"""
+	env_path = os.path.normpath(env_path)
+	files = [env_path]
+	missing = []
+	if data is None:
+		data = _read_yaml(env_path)
+	resolved = _flatten_r(env_path, data, context, project_root, files, missing)
+	return resolved, files, missing
+
+
+def include_manifest(env_path, data, context=None, project_root=None):
+	"""
+	Return (files, missing) an environment file depends on without resolving
+	its references.
+	"""
+	files = [os.path.normpath(env_path)]
+	missing = []
+	pending = [(env_path, data)]
+	while pending:
+		file_name, file_data = pending.pop()
+		included, absent = resolve_includes(file_name, file_data, context, project_root)
+		missing.extend(absent)
+		for path in included:
+			if path not in files:
+				files.append(path)
+				pending.append((path, _read_yaml(path)))
+	return files, missing
+
+
+def _file_hash(path):
+	with open(path, "rb") as source:
+		return hashlib.sha1(source.read()).hexdigest()
+
+
+def _file_state(path):
+	info = os.stat(path)
+	return [info.st_mtime, info.st_size, _file_hash(path)]
+
+
+class EnvironmentCache(object):
+	"""
+	Resolved environments keyed by environment file and context, checked
+	against the content of the files they were built from.
+
+	:param folder: Folder of the cache entries, RTS_ENV_CACHE_DIR or a per-user
+				   folder by default
+	"""
+
+	def __init__(self, folder=None):
+		self.folder = folder or user_cache.cache_folder("env_cache", CACHE_DIR_ENV)
+		self._memory = {}
+		self._lock = threading.Lock()
+		self.stats = {"hits": 0, "misses": 0, "rehashed": 0}
+
+	def _entry_path(self, env_path, key):
+		digest = hashlib.sha1(("%s|%s" % (os.path.normcase(os.path.normpath(env_path)), key)).encode("utf-8"))
+		name = os.path.splitext(os.path.basename(env_path))[0]
+		return os.path.join(self.folder, "%s_%s.json" % (name, digest.hexdigest()[:16]))
+
+	def _read_entry(self, entry_path):
+		with self._lock:
+			entry = self._memory.get(entry_path)
+		if entry is not None:
+			return entry
+		if not os.path.exists(entry_path) or not user_cache.ensure_private(self.folder) \
+				or not user_cache.trusted(entry_path):
+			return None
+		try:
+			with open(entry_path, "r") as source:
+				return json.load(source)
+		except Exception:
+			return None
+
+	def _valid(self, entry, entry_path):
+		"""
+		Return True if the files of an entry still have the content it was
+		built from. Touched files with an unchanged content are updated in the
+		manifest so they are not hashed again.
+		"""
+		touched = False
+		for path, state in entry["files"].items():
+			try:
+				info = os.stat(path)
+			except OSError:
+				return False
+			if [info.st_mtime, info.st_size] == state[:2]:
+				continue
+			self.stats["rehashed"] += 1
+			if info.st_size != state[1] or _file_hash(path) != state[2]:
+				return False
+			state[0] = info.st_mtime
+			touched = True
+		for path in entry["missing"]:
+			if os.path.exists(path):
+				return False
+		if touched:
+			self._write_entry(entry_path, entry)
+		return True
+
+	def _write_entry(self, entry_path, entry):
+		with self._lock:
+			self._memory[entry_path] = entry
+		if not user_cache.ensure_private(self.folder):
+			return
+		try:
+			temp_path = "%s.%d.tmp" % (entry_path, os.getpid())
+			with open(temp_path, "w") as target:
+				json.dump(entry, target)
+			if os.path.exists(entry_path):
+				os.remove(entry_path)
+			os.rename(temp_path, entry_path)
+		except (IOError, OSError):
+			# the memory copy is still used for this session
+			pass
+
+	def lookup(self, env_path, context=None):
+		"""
+		Return a copy of the resolved environment if the cache holds a valid
+		one, None otherwise.
+		"""
+		entry_path = self._entry_path(env_path, context_key(context))
+		entry = self._read_entry(entry_path)
+		if entry is None or not self._valid(entry, entry_path):
+			self.stats["misses"] += 1
+			return None
+		self.stats["hits"] += 1
+		with self._lock:
+			self._memory[entry_path] = entry
+		# every caller gets its own copy, the core modifies what it is given
+		return _decode(entry["data"])
+
+	def store(self, env_path, data, files, missing, context=None):
+		"""
+		Store a resolved environment with the files it was built from. An
+		environment JSON would not give back as it is, with dates or keys
+		which are not strings, is not stored.
+
+		:returns: True if the environment was stored
+		"""
+		try:
+			text = json.dumps(data, sort_keys=True)
+		except (TypeError, ValueError):
+			return False
+		if _decode(text) != data:
+			return False
+		entry = {"env_path": env_path,
+				 "context": context_key(context),
+				 "files": dict((path, _file_state(path)) for path in files),
+				 "missing": list(missing),
+				 "data": text}
+		self._write_entry(self._entry_path(env_path, context_key(context)), entry)
+		return True
+
+	def load(self, env_path, context=None, project_root=None):
+		"""
+		Return the resolved environment, from the cache when it is valid and
+		by reading the yaml files otherwise.
+		"""
+		data = self.lookup(env_path, context)
+		if data is None:
+			data, files, missing = flatten(env_path, context, project_root)
+			self.store(env_path, data, files, missing, context)
+		return data
+
+
+def _native(value):
+	"""
+	Return a value read from JSON with the str type yaml gives on python 2.
+	"""
+	if isinstance(value, dict):
+		return dict((_native(k), _native(v)) for k, v in value.items())
+	if isinstance(value, list):
+		return [_native(v) for v in value]
+	if not isinstance(value, str) and isinstance(value, _string_types):
+		try:
+			return value.encode("ascii")
+		except UnicodeError:
+			return value
+	return value
+
+
+def _decode(text):
+	data = json.loads(text)
+	if sys.version_info[0] < 3:
+		data = _native(data)
+	return data
+
+
+def install():
+	"""
+	Make the Toolkit core resolve environments through the cache. Calling it
+	more than once is harmless.
+
+	:returns: True if the core was patched
+	"""
+	global _original_process_includes
+	if _original_process_includes is not None:
+		return True
+	try:
+		from tank.platform import environment_includes
+	except ImportError:
+		return False
+	original = environment_includes.process_includes
+
+	def process_includes(file_name, data, context):
+		cache = get_cache()
+		cached = cache.lookup(file_name, context)
+		if cached is not None:
+			return cached
+		resolved = original(file_name, data, context)
+		try:
+			files, missing = include_manifest(file_name, data, context)
+			cache.store(file_name, resolved, files, missing, context)
+		except Exception:
+			# the environment loaded fine, it just won't be cached
+			pass
+		return resolved
+
+	_original_process_includes = original
+	environment_includes.process_includes = process_includes
+	return True
+
+
+def toolkit_contexts(config_root, entities=(), tasks=()):
+	"""
+	Return the Toolkit contexts of entities given as "Type:id" and of task
+	ids, built the way the engines build them so the entries get the keys
+	they are looked up with.
+	"""
+	import sgtk
+	tk = sgtk.sgtk_from_path(config_root)
+	contexts = []
+	for entity in entities:
+		entity_type, entity_id = entity.split(":", 1)
+		contexts.append(tk.context_from_entity(entity_type, int(entity_id)))
+	for task_id in tasks:
+		contexts.append(tk.context_from_entity("Task", task_id))
+	return contexts
+
+
+def environment_files(env_root=None):
+	"""
+	Return the environment files of the configuration, includes excluded.
+	"""
+	env_root = env_root or ENV_ROOT
+	return sorted(os.path.join(env_root, name) for name in os.listdir(env_root) if name.endswith(".yml"))
+
+
+def benchmark(env_root=None, repeat=20, context=None, project_root=None, folder=None):
+	"""
+	Compare resolving every environment from yaml with loading it from the
+	cache.
+
+	:returns: List of {environment, yaml_ms, cached_ms, speedup} dictionaries
+	"""
+	cache = EnvironmentCache(folder or tempfile.mkdtemp(prefix="rts_env_cache_"))
+	results = []
+	for env_path in environment_files(env_root):
+		started = time.time()
+		for _ in range(repeat):
+			reference, files, missing = flatten(env_path, context, project_root)
+		yaml_seconds = (time.time() - started) / repeat
+		cache.store(env_path, reference, files, missing, context)
+
+		# a new cache object, so that the entries are read from disk once
+		cold = EnvironmentCache(cache.folder)
+		started = time.time()
+		for _ in range(repeat):
+			loaded = cold.lookup(env_path, context)
+		cached_seconds = (time.time() - started) / repeat
+		if loaded != reference:
+			raise AssertionError("Cached %s differs from the yaml one" % env_path)
+		results.append({"environment": os.path.basename(env_path),
+						"yaml_ms": yaml_seconds * 1000,
+						"cached_ms": cached_seconds * 1000,
+						"speedup": yaml_seconds / cached_seconds if cached_seconds else None})
+	return results
+
+
+def main(argv=None):
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Precompile or benchmark the environment configurations.")
+	parser.add_argument("command", choices=["build", "benchmark"])
+	parser.add_argument("--env", help="env folder, the one of this configuration by default")
+	parser.add_argument("--project-root", help="folder {token} includes are relative to")
+	parser.add_argument("--context", nargs="*", default=[], metavar="KEY=VALUE",
+						help="benchmark: fields resolving {token} includes, e.g. Sequence=q010 Shot=q010_s010")
+	parser.add_argument("--entity", nargs="*", default=[], metavar="TYPE:ID",
+						help="build: entities to build the contexts of, e.g. Shot:1234 Asset:56")
+	parser.add_argument("--task", nargs="*", default=[], type=int, metavar="ID",
+						help="build: tasks to build the contexts of")
+	parser.add_argument("--config", default=PIPELINE_CONFIG_ROOT,
+						help="build: pipeline configuration, the one of this configuration by default")
+	parser.add_argument("--repeat", type=int, default=20, help="loads per environment when benchmarking")
+	args = parser.parse_args(argv)
+
+	if args.command == "build":
+		if not args.entity and not args.task:
+			parser.error("build needs --entity or --task, the engines look entries up by context")
+		cache = get_cache()
+		for context in toolkit_contexts(args.config, args.entity, args.task):
+			print(context_key(context))
+			for env_path in environment_files(args.env):
+				data, files, missing = flatten(env_path, context, args.project_root)
+				stored = cache.store(env_path, data, files, missing, context)
+				print("  %-32s %d files%s" % (os.path.basename(env_path), len(files), "" if stored else ", not cached"))
+		print("written to %s" % cache.folder)
+	else:
+		context = dict(item.split("=", 1) for item in args.context) or None
+		print("%-32s %10s %10s %8s" % ("environment", "yaml ms", "cached ms", "speedup"))
+		for result in benchmark(args.env, args.repeat, context, args.project_root):
+			print("%-32s %10.2f %10.2f %7.1fx" % (result["environment"], result["yaml_ms"],
+												  result["cached_ms"], result["speedup"]))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,159 @@
+"""
+Folder creation for many entities at once.
+
+tk.create_filesystem_structure() walks core/schema/project, computes the
+folders of the entity, hands them to the process_folder_creation core hook and
+registers them in the path cache and in Shotgun. Calling it once per new asset
+repeats the whole walk and the registration round-trips for every asset.
+create_folders() groups the entities per type and makes one call per type with
+the list of their ids, so the schema is walked once for all of them and the
+new folders are registered in a single batch:
+
+	new_entities = []
+	for item in items:
+		new_entities.append(self._create_asset_in_shotgun(...))
+	folder_batch.create_folders(self.parent.tank, new_entities, "tk-maya")
+
+process_items() is the implementation of the process_folder_creation core
+hook of this configuration (core/hooks/process_folder_creation.py). It receives
+the union of the folders of every entity of the call and creates them with one
+mkdir each, parents first, instead of an exists() test followed by makedirs()
+which stats every parent again. Files whose folder was just created are
+written without checking whether they exist.
+"""
+
+import errno
+import os
+import shutil
+import sys
+
+from rts import fs_cache
+
+FOLDER_MODE = 0o777
+FILE_MODE = 0o666
+
+# remote_entity_folder is an entity folder another machine registered in the
+# path cache, created here when it is missing locally like the stock hook does
+FOLDER_ACTIONS = ("entity_folder", "remote_entity_folder", "folder")
+
+
+def group_entities(entities):
+	"""
+	Group Shotgun entity dictionaries by type, without duplicates.
+
+	:param entities: List of {"type": ..., "id": ...} dictionaries, None entries are ignored
+	:returns:        List of (entity type, [ids]) in the order the types first appear
+	"""
+	groups = []
+	ids_by_type = {}
+	for entity in entities:
+		if not entity:
+			continue
+		ids = ids_by_type.get(entity["type"])
+		if ids is None:
+			ids = ids_by_type[entity["type"]] = []
+			groups.append((entity["type"], ids))
+		if entity["id"] not in ids:
+			ids.append(entity["id"])
+	return groups
+
+
+def create_folders(tk, entities, engine=None):
+	"""
+	Create the folders of several entities, one Toolkit call per entity type.
+
+	:param tk:       Tank API instance
+	:param entities: List of Shotgun entity dictionaries
+	:param engine:   Engine name used to filter the deferred folders, e.g. "tk-maya"
+	:returns:        Number of folders created
+	"""
+	created = 0
+	for entity_type, ids in group_entities(entities):
+		created += tk.create_filesystem_structure(entity_type, ids, engine) or 0
+	return created
+
+
+def make_folders(paths, preview_mode=False):
+	"""
+	Create folders, parents first, with a single mkdir per folder.
+
+	:param paths:        Folder paths, duplicates allowed
+	:param preview_mode: Only report the folders which do not exist yet
+	:returns:            (created folders in creation order, set of normalized folders known to exist)
+	"""
+	unique = {}
+	for path in paths:
+		unique.setdefault(os.path.normpath(path), path)
+	created = []
+	existing = set()
+	for normalized in sorted(unique, key=lambda p: (p.count(os.sep), p)):
+		path = unique[normalized]
+		if preview_mode:
+			if not os.path.isdir(path):
+				created.append(path)
+			continue
+		try:
+			os.mkdir(path, FOLDER_MODE)
+			created.append(path)
+		except OSError as e:
+			if e.errno == errno.EEXIST:
+				pass
+			elif e.errno == errno.ENOENT:
+				# a parent outside of the list is missing
+				os.makedirs(path, FOLDER_MODE)
+				created.append(path)
+			else:
+				raise
+		existing.add(normalized)
+		# write-through to the folder cache of the session
+		fs_cache.get_cache().add(path)
+	return created, existing
+
+
+def process_items(items, preview_mode=False):
+	"""
+	Run the actions of the process_folder_creation core hook.
+
+	:param items:        Action dictionaries built by Toolkit from the schema
+	:param preview_mode: Only report what would be created
+	:returns:            List of the folders and files created
+	"""
+	folders = [i.get("path") for i in items if i.get("action") in FOLDER_ACTIONS]
+	created, existing = make_folders(folders, preview_mode)
+	new_folders = set(os.path.normpath(p) for p in created)
+
+	for i in items:
+		action = i.get("action")
+		if action in FOLDER_ACTIONS:
+			continue
+
+		if action == "symlink":
+			if sys.platform == "win32":
+				continue
+			path = i.get("path")
+			if not os.path.lexists(path):
+				if not preview_mode:
+					os.symlink(i.get("target"), path)
+				created.append(path)
+
+		elif action in ("copy", "create_file"):
+			path = i.get("target_path") if action == "copy" else i.get("path")
+			parent = os.path.normpath(os.path.dirname(path))
+			# nothing can exist in a folder created a moment ago
+			if parent not in new_folders and os.path.exists(path):
+				continue
+			if not preview_mode:
+				if parent not in existing and parent not in new_folders and not os.path.isdir(parent):
+					os.makedirs(parent, FOLDER_MODE)
+				if action == "copy":
+					shutil.copy(i.get("source_path"), path)
+				else:
+					with open(path, "wb") as target:
+						target.write(i.get("content"))
+				os.chmod(path, FILE_MODE)
+			created.append(path)
+
+		else:
+			raise Exception("Unknown folder hook action '%s'" % action)
+
+	return created
@@ -0,0 +1,285 @@
+"""
+Plan of a folder creation, with its cost, before running it.
+
+Create Folders on hundreds of shots is a long and hard to undo operation.
+plan() evaluates the schema compiled by schema_materializer for a list of
+entities, shotgun_step filters included (Caches/step_Ani.yml only gives
+folders to entities with an ani step), and looks at the project root to tell
+apart what exists from what will be created. Nothing is written:
+
+	creation = folder_plan.plan(shots, "W:/RTS", engine="tk-maya")
+	print creation.format()
+	creation.execute(progress_cb=progress_cb)
+
+The estimate gives the number of mkdir and file writes of the execution and
+the number of entity and step folders Toolkit registers in Shotgun when it
+next creates folders for these entities, new folders only.
+
+execute() creates the missing folders one depth after the other, each depth
+in chunks handled by a pool of threads, then writes the files. The progress
+callback is called after every chunk.
+
+From a plain python shell, against a test root:
+
+	python hooks/lib/rts/folder_plan.py /tmp/project --sequence q010 --shots 80 --steps ani lay [--list] [--execute]
+	python hooks/lib/rts/folder_plan.py W:/RTS --entities shots.json
+"""
+
+import errno
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+if __name__ == "__main__":
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import schema_materializer
+
+DEFAULT_CHUNK_SIZE = 200
+DEFAULT_WORKERS = schema_materializer.DEFAULT_WORKERS
+# folder registrations sent to Shotgun per batch call
+REGISTRATION_BATCH_SIZE = 100
+
+# token kinds Toolkit records in the path cache and in Shotgun
+REGISTERED_KINDS = ("entity", "step")
+
+
+class _PlanNode(object):
+	__slots__ = ("folders", "files", "kind")
+
+	def __init__(self):
+		self.folders = {}
+		self.files = {}
+		self.kind = None
+
+
+class FolderPlan(object):
+	"""
+	Folders and files a folder creation would make, and whether they exist.
+
+	:param project_root: Project folder the paths are in
+	"""
+
+	def __init__(self, project_root):
+		self.project_root = project_root
+		# (path, exists, token kind or None), parents first
+		self.folders = []
+		# (path, source, exists)
+		self.files = []
+		self.listings = 0
+		self.seconds = 0.0
+		self.entities = 0
+
+	@property
+	def folders_to_create(self):
+		return [path for path, exists, _ in self.folders if not exists]
+
+	@property
+	def files_to_create(self):
+		return [(path, source) for path, source, exists in self.files if not exists]
+
+	def estimate(self, batch_size=REGISTRATION_BATCH_SIZE):
+		"""
+		Return the counts of the plan and the cost of executing it.
+		"""
+		registrations = sum(1 for _, exists, kind in self.folders if not exists and kind in REGISTERED_KINDS)
+		folders = len(self.folders_to_create)
+		files = len(self.files_to_create)
+		return {"entities": self.entities,
+				"folders": len(self.folders),
+				"folders_existing": len(self.folders) - folders,
+				"folders_to_create": folders,
+				"files": len(self.files),
+				"files_existing": len(self.files) - files,
+				"files_to_create": files,
+				"syscalls": folders + files,
+				"shotgun_registrations": registrations,
+				"shotgun_batch_calls": (registrations + batch_size - 1) // batch_size,
+				"planning_listings": self.listings,
+				"planning_seconds": self.seconds}
+
+	def format(self, list_paths=False):
+		"""
+		Return the plan as text, with every path to create if list_paths is set.
+		"""
+		estimate = self.estimate()
+		lines = ["Folder creation plan for %d entities in %s" % (estimate["entities"], self.project_root),
+				 "  folders: %d to create, %d existing" % (estimate["folders_to_create"], estimate["folders_existing"]),
+				 "  files:   %d to create, %d existing" % (estimate["files_to_create"], estimate["files_existing"]),
+				 "  estimated syscalls: %d" % estimate["syscalls"],
+				 "  estimated Shotgun registrations: %d in %d batch calls" % (estimate["shotgun_registrations"],
+																			  estimate["shotgun_batch_calls"]),
+				 "  planned with %d folder listings in %.2fs" % (estimate["planning_listings"],
+																 estimate["planning_seconds"])]
+		if list_paths:
+			lines.append("")
+			lines += ["mkdir %s" % path for path in self.folders_to_create]
+			lines += ["file  %s" % path for path, _ in self.files_to_create]
+		return "\n".join(lines)
+
+	def execute(self, chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS, progress_cb=None):
+		"""
+		Create the missing folders and files of the plan.
+
+		:param chunk_size:  Folders or files handled per task of the pool
+		:param workers:     Number of threads
+		:param progress_cb: Called as progress_cb(done, total) after every chunk
+		:returns:           Dictionary of counts and the time spent
+		"""
+		started = time.time()
+		stats = {"folders_created": 0, "folders_existing": 0, "files_linked": 0, "files_copied": 0}
+		lock = threading.Lock()
+
+		def make_folders(paths):
+			created = 0
+			for path in paths:
+				try:
+					os.mkdir(path, schema_materializer.FOLDER_MODE)
+					created += 1
+				except OSError as e:
+					if e.errno != errno.EEXIST:
+						raise
+			with lock:
+				stats["folders_created"] += created
+				stats["folders_existing"] += len(paths) - created
+			return len(paths)
+
+		def write_files(items):
+			linked = 0
+			for path, source in items:
+				if schema_materializer.link_or_copy(source, path):
+					linked += 1
+			with lock:
+				stats["files_linked"] += linked
+				stats["files_copied"] += len(items) - linked
+			return len(items)
+
+		folders = self.folders_to_create
+		files = self.files_to_create
+		# parents are created before their children, one depth at a time
+		depth = lambda path: path.count(os.sep)
+		folders.sort(key=depth)
+		work = [(make_folders, list(group)) for _, group in itertools.groupby(folders, key=depth)]
+		work.append((write_files, files))
+
+		total = len(folders) + len(files)
+		done = 0
+		old_umask = os.umask(0)
+		pool = ThreadPool(max(1, workers))
+		try:
+			if not os.path.isdir(self.project_root):
+				os.makedirs(self.project_root, schema_materializer.FOLDER_MODE)
+			for function, items in work:
+				chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+				for count in pool.imap_unordered(function, chunks):
+					done += count
+					if progress_cb:
+						progress_cb(done, total)
+		finally:
+			pool.close()
+			pool.join()
+			os.umask(old_umask)
+		stats["seconds"] = time.time() - started
+		return stats
+
+
+def _tree(compiled, entities):
+	root = _PlanNode()
+	for entity in entities:
+		for relative, files, token in compiled.expand_entries(entity):
+			node = root
+			for name in relative.split(os.sep):
+				child = node.folders.get(name)
+				if child is None:
+					child = node.folders[name] = _PlanNode()
+				node = child
+			if token is not None:
+				node.kind = token.kind
+			for source in files:
+				node.files[os.path.basename(source)] = source
+	return root
+
+
+def plan(entities, project_root, engine=None, schema_root=None, workers=DEFAULT_WORKERS):
+	"""
+	Work out the folders and files the schema gives a list of entities below
+	a project root, and which of them exist. Only folders found on disk are
+	listed, everything below a missing folder is known to be missing.
+
+	:param entities:     Shotgun entity dictionaries, see schema_materializer
+	:param project_root: Project folder
+	:param engine:       Engine the deferred folders are planned for, e.g. "tk-maya"
+	:param schema_root:  Schema folder, the one of this configuration by default
+	:param workers:      Number of threads listing folders
+	:returns:            FolderPlan
+	"""
+	started = time.time()
+	compiled = schema_materializer.compile_schema(schema_root, engine)
+	result = FolderPlan(project_root)
+	result.entities = len(entities)
+	root = _tree(compiled, entities)
+
+	def visit(job):
+		node, path, exists = job
+		present = set()
+		if exists:
+			present = schema_materializer.folder_names(path)
+		for name, source in sorted(node.files.items()):
+			result.files.append((os.path.join(path, name), source, os.path.normcase(name) in present))
+		return [(child, os.path.join(path, name), os.path.normcase(name) in present)
+				for name, child in sorted(node.folders.items())]
+
+	pool = ThreadPool(max(1, workers))
+	try:
+		exists = os.path.isdir(project_root)
+		result.listings += int(exists)
+		jobs = visit((root, project_root, exists))
+		while jobs:
+			for node, path, exists in jobs:
+				result.folders.append((path, exists, node.kind))
+				result.listings += int(exists)
+			jobs = list(itertools.chain.from_iterable(pool.map(visit, jobs)))
+	finally:
+		pool.close()
+		pool.join()
+	result.seconds = time.time() - started
+	return result
+
+
+def main(argv=None):
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Plan, and optionally run, the folder creation of entities.")
+	parser.add_argument("project_root", help="project folder")
+	parser.add_argument("--entities", help="json file holding a list of Shotgun entity dictionaries")
+	parser.add_argument("--sequence", default="q010", help="sequence code of the test entities")
+	parser.add_argument("--shots", type=int, default=80, help="number of test shots")
+	parser.add_argument("--steps", nargs="*", default=[], help="step short names of the test entities")
+	parser.add_argument("--engine", help="engine the deferred folders are planned for, e.g. tk-maya")
+	parser.add_argument("--schema", help="schema folder, the one of this configuration by default")
+	parser.add_argument("--list", action="store_true", help="list every folder and file to create")
+	parser.add_argument("--execute", action="store_true", help="create the folders after planning")
+	parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+	parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+	args = parser.parse_args(argv)
+
+	if args.entities:
+		with open(args.entities) as source:
+			entities = json.load(source)
+	else:
+		entities = schema_materializer.sequence_entities(args.sequence, args.shots, args.steps)
+
+	creation = plan(entities, args.project_root, args.engine, args.schema, args.workers)
+	print(creation.format(args.list))
+	if args.execute:
+		stats = creation.execute(args.chunk_size, args.workers)
+		print("created %d folders and %d files in %.2fs" % (
+			stats["folders_created"], stats["files_linked"] + stats["files_copied"], stats["seconds"]))
+
+
+if __name__ == "__main__":
+	main()
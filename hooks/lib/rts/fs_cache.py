@@ -0,0 +1,136 @@
+"""
+Session cache of the folders known to exist.
+
+The publish hooks test and create the same folders over and over: the camera
+publish checks the four playblast and movie folders of every shot and eye, the
+asset publish the publish and work folders of every asset. On the W: network
+storage every os.path.exists() is a round-trip to the server. The hooks go
+through ensure_folder() instead:
+
+	fs_cache.ensure_folder(os.path.dirname(path), self.parent.ensure_folder_exists)
+
+Only folders seen to exist are cached, together with their parents, and a
+folder created through the cache is added to it right away. A folder missing
+from the cache is always checked on disk. A cached folder deleted by someone
+else stays cached until invalidate() is called for it or one of its parents.
+
+A session is one publish: the secondary publish hooks call reset() before
+their first folder check, so a publish that failed halfway does not leave its
+folders cached for the next one, and the post publish hook calls it again
+after printing the number of stat calls the cache saved.
+"""
+
+import os
+import threading
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _key(path):
+	return os.path.normcase(os.path.normpath(path))
+
+
+class FolderCache(object):
+	"""
+	Positive cache of existing folders, with write-through on creation.
+	"""
+
+	def __init__(self):
+		self._existing = set()
+		self._lock = threading.Lock()
+		self.stats = {"stat_calls": 0, "saved": 0, "created": 0}
+
+	def __contains__(self, path):
+		return _key(path) in self._existing
+
+	def add(self, path):
+		"""
+		Record that a folder exists, and therefore all its parents.
+		"""
+		key = _key(path)
+		with self._lock:
+			while key and key not in self._existing:
+				self._existing.add(key)
+				parent = os.path.dirname(key)
+				if parent == key:
+					break
+				key = parent
+
+	def exists(self, path):
+		"""
+		Return True if a folder exists, from the cache when it is known to.
+		"""
+		if path in self:
+			self.stats["saved"] += 1
+			return True
+		self.stats["stat_calls"] += 1
+		if os.path.isdir(path):
+			self.add(path)
+			return True
+		return False
+
+	def ensure_folder(self, path, create=None):
+		"""
+		Make sure a folder exists, creating it if it does not.
+
+		:param path:   Folder path
+		:param create: Function creating a folder from its path, os.makedirs by
+		               default. Pass self.parent.ensure_folder_exists from a hook
+		               to create it through the Toolkit core hooks.
+		:returns:      True if the folder was created
+		"""
+		if self.exists(path):
+			return False
+		(create or os.makedirs)(path)
+		self.stats["created"] += 1
+		self.add(path)
+		return True
+
+	def invalidate(self, path=None):
+		"""
+		Forget a folder and everything below it, every folder by default.
+		"""
+		with self._lock:
+			if path is None:
+				self._existing.clear()
+				return
+			key = _key(path)
+			prefix = key.rstrip(os.sep) + os.sep
+			self._existing = set(k for k in self._existing if k != key and not k.startswith(prefix))
+
+	def report(self):
+		"""
+		Return the statistics of the cache as text.
+		"""
+		return "%d folders known, %d stat calls made, %d saved, %d folders created" % (
+			len(self._existing), self.stats["stat_calls"], self.stats["saved"], self.stats["created"])
+
+
+def get_cache():
+	"""
+	Return the folder cache of the session.
+	"""
+	global _cache
+	with _cache_lock:
+		if _cache is None:
+			_cache = FolderCache()
+		return _cache
+
+
+def reset():
+	"""
+	End the session, returning its cache or None if it was never used.
+	"""
+	global _cache
+	with _cache_lock:
+		cache, _cache = _cache, None
+	return cache
+
+
+def ensure_folder(path, create=None):
+	"""
+	Make sure a folder exists using the session cache, see
+	FolderCache.ensure_folder().
+	"""
+	return get_cache().ensure_folder(path, create)
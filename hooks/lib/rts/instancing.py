@@ -0,0 +1,76 @@
+"""
+Helpers to remove the instancing of a scene in linear time.
+
+The asset publish replaces the groups holding instances by real copies before
+exporting. Rescanning the whole DAG after every duplicate and testing every
+node with objExists made that quadratic in the number of instances. The
+instanced paths are now collected once, parents first, and a path is known to
+be gone when one of its ancestors was replaced or deleted, without asking
+Maya:
+
+	replaced = set()
+	for path in instancing.instanced_paths():
+		if instancing.is_below(path, replaced):
+			continue
+		...
+		replaced.add(parent)
+
+Paths are full DAG paths ('|group|child'). Only instanced_paths() needs Maya.
+"""
+
+
+def depth(path):
+	return path.count("|")
+
+
+def is_below(path, removed):
+	"""
+	Return True if a path or one of its ancestors is in the removed set.
+	"""
+	while path:
+		if path in removed:
+			return True
+		path = path.rsplit("|", 1)[0]
+	return False
+
+
+def top_most(paths):
+	"""
+	Return the paths which are not below another path of the list, in the
+	order of the list.
+	"""
+	kept = set()
+	for path in sorted(set(paths), key=depth):
+		if not is_below(path, kept):
+			kept.add(path)
+	return [path for path in paths if path in kept]
+
+
+def deepest_first(paths):
+	"""
+	Return paths ordered children first, so renaming one does not change the
+	paths still to rename.
+	"""
+	return sorted(paths, key=depth, reverse=True)
+
+
+def instanced_paths(skip_types=("mesh",)):
+	"""
+	Return the full paths of the instanced DAG nodes of the scene, directly or
+	through an instanced parent, parents first, in one traversal.
+
+	:param skip_types: Node types left out
+	"""
+	import maya.api.OpenMaya as om
+
+	found = []
+	iterator = om.MItDag(om.MItDag.kBreadthFirst)
+	node = om.MFnDagNode()
+	while not iterator.isDone():
+		if iterator.isInstanced(True):
+			path = iterator.getPath()
+			node.setObject(path)
+			if node.typeName not in skip_types:
+				found.append(path.fullPathName())
+		iterator.next()
+	return found
@@ -0,0 +1,131 @@
+"""
+Namespaces and numbered node names handed out from one listing of the scene.
+
+The loader actions give every reference a free namespace, asset_001,
+asset_002, ..., and a locator numbered after the highest one of its asset.
+Probing Maya for every candidate namespace and listing every locator for
+every reference made loading a position list of a few hundred props cost a
+few hundred scans of the scene. NameAllocator lists the namespaces and the
+nodes of a type once, when first needed, and keeps what it hands out:
+
+	allocator = name_allocator.from_maya()
+	number = allocator.next_number("PRP_chair", "rtsAssetRoot")
+	namespace = allocator.next_namespace("chair", number)
+	...
+	allocator.add_name(locator, "rtsAssetRoot")
+
+Every base keeps the first number not known to be taken, so handing out the
+next namespace of a base does not go through the ones given before. The
+namespace handed out is checked once against the scene, in case it was
+created since the listing.
+
+An allocator is meant for one operation, the loader actions make one per
+reference or one per position list. The listing functions are parameters,
+the allocation works the same on plain lists outside of Maya.
+"""
+
+NAMESPACE_FORMAT = "%s_%03d"
+MAX_NUMBER = 10000
+
+
+class NameAllocator(object):
+	"""
+	Free namespaces and node numbers of a scene.
+
+	:param list_namespaces:  Called once for the existing namespaces
+	:param list_names:       Called as list_names(node_type) for the names of
+	                         the nodes of a type, once per type
+	:param namespace_exists: Called to check a namespace before handing it out
+	"""
+
+	def __init__(self, list_namespaces=None, list_names=None, namespace_exists=None):
+		self._list_namespaces = list_namespaces
+		self._list_names = list_names
+		self._namespace_exists = namespace_exists
+		self._namespaces = None
+		self._names = {}
+		# base -> first number not known to be taken
+		self._first_free = {}
+		# (node type, stem) -> highest number of the nodes named stem + number
+		self._highest = {}
+		self.stats = {"namespaces": 0, "probes": 0}
+
+	@property
+	def namespaces(self):
+		if self._namespaces is None:
+			self._namespaces = set(self._list_namespaces() if self._list_namespaces else ())
+		return self._namespaces
+
+	def names(self, node_type):
+		"""
+		Return the names of the nodes of a type, listed once.
+		"""
+		if node_type not in self._names:
+			self._names[node_type] = list(self._list_names(node_type) or []) if self._list_names else []
+		return self._names[node_type]
+
+	def next_namespace(self, base, start=1):
+		"""
+		Return the first free namespace base_001, base_002, ... numbered from
+		start, and reserve it. Returns None when none is free below MAX_NUMBER.
+		"""
+		first = self._first_free.get(base, 1)
+		number = max(start, first)
+		while number < MAX_NUMBER:
+			namespace = NAMESPACE_FORMAT % (base, number)
+			free = namespace not in self.namespaces
+			if free and self._namespace_exists is not None:
+				self.stats["probes"] += 1
+				free = not self._namespace_exists(namespace)
+			self.namespaces.add(namespace)
+			if free:
+				if start <= first:
+					# every number from the first free one up to this one is taken now
+					self._first_free[base] = number + 1
+				self.stats["namespaces"] += 1
+				return namespace
+			number += 1
+		return None
+
+	def next_number(self, stem, node_type):
+		"""
+		Return the number following the highest one of the nodes of a type
+		named stem followed by a number, underscores and 'Shape' left out,
+		1 if there are none.
+		"""
+		key = (node_type, stem)
+		if key not in self._highest:
+			highest = 0
+			for name in self.names(node_type):
+				highest = max(highest, _suffix_number(name, stem))
+			self._highest[key] = highest
+		return self._highest[key] + 1
+
+	def add_name(self, name, node_type):
+		"""
+		Record a node created after the listing.
+		"""
+		self.names(node_type).append(name)
+		for (known_type, stem), highest in self._highest.items():
+			if known_type == node_type:
+				self._highest[(known_type, stem)] = max(highest, _suffix_number(name, stem))
+
+
+def _suffix_number(name, stem):
+	if not name.startswith(stem):
+		return 0
+	suffix = name[len(stem):].replace("Shape", "").replace("_", "")
+	if not suffix.isdigit():
+		return 0
+	return int(suffix)
+
+
+def from_maya():
+	"""
+	Return an allocator listing the namespaces and nodes of the Maya scene.
+	"""
+	import maya.cmds as cmds
+
+	return NameAllocator(lambda: cmds.namespaceInfo(":", listOnlyNamespaces=True, recurse=True) or [],
+						 lambda node_type: cmds.ls(type=node_type) or [],
+						 lambda namespace: cmds.namespace(exists=namespace))
@@ -0,0 +1,190 @@
+"""
+Assembly of a scene from a position list, with the references created
+unloaded and loaded in one pass at the end.
+
+Referencing the items of a position list one at a time, each fully loaded,
+grouped under a temporary group and parented to its locator, makes Maya
+rebuild the scene for every item. The assembly splits the work in passes
+over all the items:
+
+1. the rtsAssetRoot locators are created, named like the position list
+   items, and placed,
+2. every reference is created unloaded (deferReference) and linked to its
+   locator by the locator's reference_node attribute,
+3. the references are loaded, all of them, the ones of one resolution, the
+   ones seen by the shot cameras (see poslist_spatial.py) or none, and the
+   top nodes of each one are parented to its locator. The visible mode
+   always loads the sets, too large to cull by their locator, and the
+   items of the assets without a bounding radius.
+
+	items = poslist_assembly.plan(poslist, existing=cmds.ls(type="rtsAssetRoot"))
+	...
+	for item in poslist_assembly.to_load(items, "lay"):
+		poslist_assembly.load_reference(item.reference, item.locator)
+
+References left unloaded are loaded later with load_deferred(), which does the
+parenting the Reference Editor would not do.
+
+plan(), latest_publishes() and to_load() are plain Python, the functions
+creating and loading references need Maya.
+"""
+
+OBJECT_TYPES = {"SET": "Set", "SUB": "Set", "PRP": "Prop", "CHR": "Character", "VHL": "Vehicle"}
+DEFAULT_RESOLUTION = "lay"
+REFERENCE_ATTRIBUTE = "reference_node"
+# load modes of to_load(), any other value is a resolution
+LOAD_ALL = "all"
+LOAD_NONE = "none"
+LOAD_VISIBLE = "visible"
+
+
+class AssemblyItem(object):
+	"""
+	Position list item being assembled.
+	"""
+	__slots__ = ("name", "asset", "asset_type", "resolution", "position", "rotation", "scale",
+				 "publish", "locator", "reference", "radius")
+
+	def __init__(self, name, entry, asset_type):
+		self.name = name
+		self.asset = asset_code(entry["asset"])
+		self.asset_type = asset_type
+		self.resolution = entry.get("resolution") or DEFAULT_RESOLUTION
+		self.position = entry.get("position", [0, 0, 0])
+		self.rotation = entry.get("rotation", [0, 0, 0])
+		self.scale = entry.get("scale", [1, 1, 1])
+		self.publish = None
+		self.locator = None
+		self.reference = None
+		# bounding radius of the asset, from its Shotgun metadata
+		self.radius = None
+
+
+def asset_code(asset):
+	"""
+	Return the code of the asset of a position list entry, a code or an
+	entity dictionary.
+	"""
+	if isinstance(asset, dict):
+		return asset.get("code") or asset.get("name")
+	return asset
+
+
+def item_number(name):
+	"""
+	Return the number ending an item name, PRP_chair_003 -> 3, 1 if none.
+	"""
+	digits = name[len(name.rstrip("0123456789")):]
+	return int(digits) if digits else 1
+
+
+def plan(poslist, existing=(), types=OBJECT_TYPES):
+	"""
+	Return the AssemblyItems of a position list, sorted by name.
+
+	:param poslist:  Position list content, {type: {item name: entry}}
+	:param existing: Node names already in the scene, items named like one
+	                 are left out
+	:param types:    {position list type: asset type} of the items to assemble
+	"""
+	existing = set(existing)
+	items = []
+	for item_type, entries in poslist.items():
+		if item_type not in types:
+			continue
+		for name, entry in entries.items():
+			if name not in existing:
+				items.append(AssemblyItem(name, entry, types[item_type]))
+	items.sort(key=lambda item: item.name)
+	return items
+
+
+def latest_publishes(publishes, resolution_field="task.Task.sg_short_name"):
+	"""
+	Return {(asset id, resolution): publish} keeping the highest version of
+	every asset and resolution.
+	"""
+	latest = {}
+	for publish in publishes:
+		entity = publish.get("entity")
+		if not entity:
+			continue
+		key = (entity["id"], publish.get(resolution_field))
+		if key not in latest or publish["version_number"] > latest[key]["version_number"]:
+			latest[key] = publish
+	return latest
+
+
+def to_load(items, load=LOAD_ALL, visible=()):
+	"""
+	Return the items with a reference to load: all of them, none, the ones
+	named in visible with the ones that can not be culled, or the ones of a
+	resolution.
+	"""
+	if not load or load == LOAD_NONE:
+		return []
+	if load == LOAD_VISIBLE:
+		visible = set(visible)
+		return [item for item in items
+				if item.reference is not None and (item.name in visible or not cullable(item))]
+	return [item for item in items
+			if item.reference is not None and (load == LOAD_ALL or item.resolution == load)]
+
+
+def cullable(item):
+	"""
+	Return True if an item can be left unloaded out of view: it is not a set
+	and the bounding radius of its asset is known.
+	"""
+	return item.asset_type != "Set" and item.radius is not None
+
+
+def create_reference(path, namespace, locator=None):
+	"""
+	Reference a file unloaded and return the reference node, linked to a
+	locator if given.
+	"""
+	import maya.cmds as cmds
+
+	filename = cmds.file(path, reference=True, deferReference=True, namespace=namespace,
+						 mergeNamespacesOnClash=False)
+	reference = cmds.referenceQuery(filename, referenceNode=True)
+	if locator:
+		if not cmds.attributeQuery(REFERENCE_ATTRIBUTE, node=locator, exists=True):
+			cmds.addAttr(locator, longName=REFERENCE_ATTRIBUTE, dataType="string")
+		cmds.setAttr("%s.%s" % (locator, REFERENCE_ATTRIBUTE), reference, type="string")
+	return reference
+
+
+def load_reference(reference, locator=None):
+	"""
+	Load a reference and parent its top nodes to a locator, keeping their
+	transforms relative to it. Returns the top nodes.
+	"""
+	import maya.cmds as cmds
+
+	cmds.file(loadReference=reference, loadReferenceDepth="all")
+	nodes = cmds.referenceQuery(reference, nodes=True, dagPath=True) or []
+	tops = [node for node in cmds.ls(nodes, long=True, transforms=True) if node.count("|") == 1]
+	if locator and tops:
+		cmds.parent(tops, locator, relative=True)
+	return tops
+
+
+def load_deferred(locators):
+	"""
+	Load the unloaded references linked to locators. Returns the number of
+	references loaded.
+	"""
+	import maya.cmds as cmds
+
+	loaded = 0
+	for locator in locators:
+		if not cmds.attributeQuery(REFERENCE_ATTRIBUTE, node=locator, exists=True):
+			continue
+		reference = cmds.getAttr("%s.%s" % (locator, REFERENCE_ATTRIBUTE))
+		if not reference or not cmds.objExists(reference) or cmds.referenceQuery(reference, isLoaded=True):
+			continue
+		load_reference(reference, locator)
+		loaded += 1
+	return loaded
@@ -0,0 +1,201 @@
+"""
+Position lists published as the changes from the previous version.
+
+A layout iteration usually moves a handful of objects, yet every position
+list publish writes the whole list again. In delta mode, set with
+RTS_POSLIST_DELTA, the publish compares the list to the latest published one
+and writes only what changed, with a pointer to that base:
+
+	{"format": "rts-poslist-delta", "base": "poslist_q010_v004.txt", "depth": 2,
+	 "tolerance": 0.0001,
+	 "added":   {type: {key: item}},
+	 "changed": {type: {key: item}},        moved or otherwise changed, whole items
+	 "removed": {type: [key, ...]}}
+
+Position, rotation and scale values closer than the tolerance to the base
+ones (RTS_POSLIST_DELTA_TOLERANCE, absolute, per component) do not count as
+a change. The rebuilt values are the base ones then, and stay within the
+tolerance of the scene, the next delta being computed against them.
+
+The base path is relative to the delta when both are in the same folder.
+Readers rebuild the full list by applying the chain of deltas to the last
+full list, poslist_format.load() does it for any position list file. A full
+list, a snapshot, is published instead of a delta when the chain reaches
+RTS_POSLIST_SNAPSHOT_INTERVAL deltas, or when more than half of the items
+changed.
+
+diff(), apply() and make_delta() are plain Python.
+"""
+
+import os
+
+FORMAT = "rts-poslist-delta"
+ENABLE_ENV = "RTS_POSLIST_DELTA"
+TOLERANCE_ENV = "RTS_POSLIST_DELTA_TOLERANCE"
+SNAPSHOT_INTERVAL_ENV = "RTS_POSLIST_SNAPSHOT_INTERVAL"
+DEFAULT_TOLERANCE = 1e-4
+DEFAULT_SNAPSHOT_INTERVAL = 10
+# a snapshot is written instead when the delta holds more than this part of the items
+SNAPSHOT_RATIO = 0.5
+VECTOR_FIELDS = ("position", "rotation", "scale")
+
+
+class DeltaError(Exception):
+	"""
+	Raised when the chain of a delta can not be rebuilt.
+	"""
+
+
+def enabled():
+	return os.environ.get(ENABLE_ENV, "0") not in ("0", "false", "False", "")
+
+
+def tolerance():
+	return float(os.environ.get(TOLERANCE_ENV, DEFAULT_TOLERANCE))
+
+
+def snapshot_interval():
+	return int(os.environ.get(SNAPSHOT_INTERVAL_ENV, DEFAULT_SNAPSHOT_INTERVAL))
+
+
+def is_delta(data):
+	"""
+	Return True if the content of a position list file is a delta.
+	"""
+	return isinstance(data, dict) and data.get("format") == FORMAT
+
+
+def _moved(old, new, tolerance):
+	if old is None or new is None or len(old) != len(new):
+		return old != new
+	for a, b in zip(old, new):
+		if abs(a - b) > tolerance:
+			return True
+	return False
+
+
+def changed(old, new, tolerance=DEFAULT_TOLERANCE):
+	"""
+	Return True if an item differs from its previous version.
+	"""
+	for field in set(old) | set(new):
+		if field in VECTOR_FIELDS:
+			if _moved(old.get(field), new.get(field), tolerance):
+				return True
+		elif old.get(field) != new.get(field):
+			return True
+	return False
+
+
+def diff(base, new, tolerance=DEFAULT_TOLERANCE):
+	"""
+	Return (added, changed, removed) between two position lists, the first two
+	{type: {key: item}}, the last {type: [key]}.
+	"""
+	added = {}
+	modified = {}
+	removed = {}
+	for item_type in set(base) | set(new):
+		old_items = base.get(item_type, {})
+		new_items = new.get(item_type, {})
+		for key, item in new_items.items():
+			if key not in old_items:
+				added.setdefault(item_type, {})[key] = item
+			elif changed(old_items[key], item, tolerance):
+				modified.setdefault(item_type, {})[key] = item
+		gone = sorted(key for key in old_items if key not in new_items)
+		if gone:
+			removed[item_type] = gone
+	return added, modified, removed
+
+
+def size(delta):
+	"""
+	Return the number of items a delta adds, changes or removes.
+	"""
+	count = 0
+	for section in ("added", "changed", "removed"):
+		for items in delta.get(section, {}).values():
+			count += len(items)
+	return count
+
+
+def apply(base, delta):
+	"""
+	Return the position list a delta makes of its base. The base is left
+	untouched.
+	"""
+	result = dict((item_type, dict(items)) for item_type, items in base.items())
+	for item_type, keys in delta.get("removed", {}).items():
+		items = result.get(item_type, {})
+		for key in keys:
+			items.pop(key, None)
+	for section in ("changed", "added"):
+		for item_type, items in delta.get(section, {}).items():
+			result.setdefault(item_type, {}).update(items)
+	return dict((item_type, items) for item_type, items in result.items() if items)
+
+
+def base_reference(base_path, path):
+	"""
+	Return the pointer to a base stored in a delta: its file name when both
+	files are in the same folder, its path otherwise.
+	"""
+	if os.path.normcase(os.path.dirname(os.path.abspath(base_path))) == \
+			os.path.normcase(os.path.dirname(os.path.abspath(path))):
+		return os.path.basename(base_path)
+	return base_path
+
+
+def base_path(delta, path):
+	"""
+	Return the path of the base of a delta read from a file.
+	"""
+	return os.path.join(os.path.dirname(path), delta["base"])
+
+
+def make_delta(base, new, base_file, path, base_depth, tolerance=DEFAULT_TOLERANCE,
+			   interval=DEFAULT_SNAPSHOT_INTERVAL):
+	"""
+	Return the delta to publish for a position list, None when a full list
+	should be published instead.
+
+	:param base:       Previous position list, rebuilt
+	:param new:        Position list to publish
+	:param base_file:  Path of the previous position list
+	:param path:       Path the delta is published to
+	:param base_depth: Number of deltas between the previous list and its
+	                   snapshot, 0 for a snapshot
+	"""
+	depth = base_depth + 1
+	if depth > interval:
+		return None
+	added, modified, removed = diff(base, new, tolerance)
+	delta = {"format": FORMAT,
+			 "base": base_reference(base_file, path),
+			 "depth": depth,
+			 "tolerance": tolerance,
+			 "added": added,
+			 "changed": modified,
+			 "removed": removed}
+	count = sum(len(items) for items in new.values())
+	if size(delta) > SNAPSHOT_RATIO * count:
+		return None
+	return delta
+
+
+def rebuild(delta, path, read):
+	"""
+	Return the full position list of a delta read from a file.
+
+	:param delta: Content of the delta file
+	:param path:  Path of the delta file
+	:param read:  Function returning the full position list of a file, itself
+	              rebuilding the chain of a delta base
+	"""
+	base_file = base_path(delta, path)
+	if os.path.normcase(os.path.abspath(base_file)) == os.path.normcase(os.path.abspath(path)):
+		raise DeltaError("position list delta %s is its own base" % path)
+	if not os.path.isfile(base_file):
+		raise DeltaError("base %s of position list delta %s is missing" % (base_file, path))
+	return apply(read(base_file), delta)
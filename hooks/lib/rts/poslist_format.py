@@ -0,0 +1,377 @@
+"""
+Compact binary companion of the position list files.
+
+Position lists are published as indented JSON, every item a dictionary of ten
+keys, which is slow to read and heavy in memory for a set dressed sequence of
+tens of thousands of items. The publish also writes the same list next to
+the JSON file, with the .plb extension, as columns:
+
+	header     magic, item count, string count, string bytes, extra bytes
+	vectors    float64 position, rotation and scale, 3 per item
+	columns    uint32 string indices of type, key, name, longName, asset,
+	           assetType and resolution, one per item
+	strings    uint32 offsets and the UTF-8 bytes of every distinct string
+	extras     JSON of the values differing from set_asset_dict() defaults
+	           (animated, parentAssets, other keys), by item
+
+Little-endian, the vectors first so they are aligned for a memory mapped
+read. open_columns() maps the file and gives the vectors as NumPy arrays
+viewing the mapping, without copying, when NumPy can be imported, or as
+lists otherwise. The strings are only decoded when a column is first asked
+for:
+
+	with poslist_format.open_columns(path) as columns:
+		positions = columns.positions      # (count, 3)
+		names = columns.keys
+
+load() returns the usual {type: {name: item}} dictionary, read from the
+companion when it is there and not older than the JSON file, from the JSON
+file otherwise, and rebuilt from the previous versions when the file is a
+delta (see poslist_delta.py), which has no companion. Lists published before
+the companion existed are converted with:
+
+	python hooks/lib/rts/poslist_format.py poslist_q010_v003.txt [...]
+"""
+
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+if __name__ == "__main__":
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import poslist_delta
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+MAGIC = b"RTSPOSL1"
+EXTENSION = ".plb"
+STRING_FIELDS = ("name", "longName", "asset", "assetType", "resolution")
+VECTOR_FIELDS = ("position", "rotation", "scale")
+VECTOR_DEFAULTS = {"position": (0, 0, 0), "rotation": (0, 0, 0), "scale": (1, 1, 1)}
+# defaults of set_asset_dict() for the fields kept in the extras
+EXTRA_DEFAULTS = {"animated": None, "parentAssets": []}
+NO_STRING = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<8sIIII")
+# index columns: the type and the key of the item, then STRING_FIELDS
+_COLUMNS = 2 + len(STRING_FIELDS)
+
+
+class FormatError(Exception):
+	"""
+	Raised when a file is not a binary position list.
+	"""
+
+
+def companion_path(path):
+	"""
+	Return the path of the binary companion of a position list file.
+	"""
+	return os.path.splitext(path)[0] + EXTENSION
+
+
+def _uint32_array(data):
+	values = array.array("I")
+	if values.itemsize != 4:
+		values = array.array("L")
+	if hasattr(values, "frombytes"):
+		values.frombytes(data)
+	else:
+		values.fromstring(data)
+	if sys.byteorder == "big":
+		values.byteswap()
+	return values
+
+
+def _float64_bytes(values):
+	floats = array.array("d", values)
+	if sys.byteorder == "big":
+		floats.byteswap()
+	return floats.tobytes() if hasattr(floats, "tobytes") else floats.tostring()
+
+
+def encode(poslist):
+	"""
+	Return the binary form of a position list, {type: {key: item}}.
+	"""
+	strings = []
+	indices = {}
+
+	def intern(value):
+		if value is None:
+			return NO_STRING
+		index = indices.get(value)
+		if index is None:
+			index = indices[value] = len(strings)
+			strings.append(value)
+		return index
+
+	columns = [[] for _ in range(_COLUMNS)]
+	vectors = dict((field, []) for field in VECTOR_FIELDS)
+	extras = {}
+	row = 0
+	for item_type in sorted(poslist):
+		for key in sorted(poslist[item_type]):
+			item = poslist[item_type][key]
+			values = [item_type, key] + [item.get(field) for field in STRING_FIELDS]
+			for column, value in zip(columns, values):
+				column.append(intern(value))
+			for field in VECTOR_FIELDS:
+				vectors[field].extend(float(value) for value in item.get(field) or VECTOR_DEFAULTS[field])
+			extra = dict((field, value) for field, value in item.items()
+						 if field not in STRING_FIELDS and field not in VECTOR_FIELDS
+						 and (field not in EXTRA_DEFAULTS or EXTRA_DEFAULTS[field] != value))
+			if extra:
+				extras[str(row)] = extra
+			row += 1
+
+	encoded = [string.encode("utf-8") for string in strings]
+	offsets = [0]
+	for data in encoded:
+		offsets.append(offsets[-1] + len(data))
+	blob = b"".join(encoded)
+	extra_data = json.dumps(extras, sort_keys=True).encode("utf-8") if extras else b""
+
+	flat = []
+	for column in columns:
+		flat.extend(column)
+	flat.extend(offsets)
+	integers = array.array("I", flat) if array.array("I").itemsize == 4 else array.array("L", flat)
+	if sys.byteorder == "big":
+		integers.byteswap()
+
+	parts = [_HEADER.pack(MAGIC, row, len(strings), len(blob), len(extra_data))]
+	parts += [_float64_bytes(vectors[field]) for field in VECTOR_FIELDS]
+	parts.append(integers.tobytes() if hasattr(integers, "tobytes") else integers.tostring())
+	parts.append(blob)
+	return b"".join(parts) + extra_data
+
+
+def write(path, poslist):
+	"""
+	Write the binary form of a position list to a file.
+	"""
+	with open(path, "wb") as target:
+		target.write(encode(poslist))
+
+
+class PositionColumns(object):
+	"""
+	Binary position list read as columns.
+
+	:param buffer: Content of a binary position list, bytes or a mmap
+	"""
+
+	def __init__(self, buffer):
+		self._buffer = buffer
+		if len(buffer) < _HEADER.size:
+			raise FormatError("file too short for a binary position list")
+		magic, count, string_count, blob_size, extra_size = _HEADER.unpack_from(buffer, 0)
+		if magic != MAGIC:
+			raise FormatError("not a binary position list")
+		self.count = count
+		self._vectors_offset = _HEADER.size
+		offset = self._vectors_offset + 8 * 3 * count * len(VECTOR_FIELDS)
+		integer_count = _COLUMNS * count + string_count + 1
+		self._integers_offset = offset
+		self._blob_offset = offset + 4 * integer_count
+		self._string_count = string_count
+		self._blob_size = blob_size
+		extras_offset = self._blob_offset + blob_size
+		if extras_offset + extra_size > len(buffer):
+			raise FormatError("truncated binary position list")
+		self.extras = {}
+		if extra_size:
+			self.extras = dict((int(row), extra) for row, extra in
+							   json.loads(buffer[extras_offset:extras_offset + extra_size].decode("utf-8")).items())
+		# decoded on first use
+		self._integers = None
+		self._strings = None
+		self._columns = {}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def close(self):
+		"""
+		Release the mapping of the file. NumPy arrays handed out keep it alive
+		until they are gone.
+		"""
+		if isinstance(self._buffer, mmap.mmap):
+			try:
+				self._buffer.close()
+			except BufferError:
+				pass
+
+	def _column(self, index):
+		column = self._columns.get(index)
+		if column is None:
+			if self._integers is None:
+				self._integers = _uint32_array(self._buffer[self._integers_offset:self._blob_offset])
+				offsets = self._integers[_COLUMNS * self.count:]
+				blob = self._buffer[self._blob_offset:self._blob_offset + self._blob_size]
+				self._strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self._string_count)]
+			strings = self._strings
+			column = self._columns[index] = [None if i == NO_STRING else strings[i]
+											 for i in self._integers[index * self.count:(index + 1) * self.count]]
+		return column
+
+	@property
+	def types(self):
+		return self._column(0)
+
+	@property
+	def keys(self):
+		return self._column(1)
+
+	def column(self, field):
+		"""
+		Return the values of a string field, name, longName, asset, assetType
+		or resolution, one per item.
+		"""
+		return self._column(2 + STRING_FIELDS.index(field))
+
+	def vectors(self, field):
+		"""
+		Return the position, rotation or scale of every item, a (count, 3)
+		NumPy array viewing the file when NumPy is available, a list of
+		[x, y, z] lists otherwise.
+		"""
+		offset = self._vectors_offset + 8 * 3 * self.count * VECTOR_FIELDS.index(field)
+		if numpy is not None:
+			return numpy.frombuffer(self._buffer, dtype="<f8", count=3 * self.count,
+									offset=offset).reshape((self.count, 3))
+		values = array.array("d")
+		data = self._buffer[offset:offset + 8 * 3 * self.count]
+		if hasattr(values, "frombytes"):
+			values.frombytes(data)
+		else:
+			values.fromstring(data)
+		if sys.byteorder == "big":
+			values.byteswap()
+		return [list(values[i:i + 3]) for i in range(0, len(values), 3)]
+
+	@property
+	def positions(self):
+		return self.vectors("position")
+
+	@property
+	def rotations(self):
+		return self.vectors("rotation")
+
+	@property
+	def scales(self):
+		return self.vectors("scale")
+
+	def to_dict(self):
+		"""
+		Return the position list as {type: {key: item}}, like the JSON file.
+		"""
+		vectors = [self.vectors(field) for field in VECTOR_FIELDS]
+		if numpy is not None:
+			vectors = [values.tolist() for values in vectors]
+		fields = STRING_FIELDS + VECTOR_FIELDS
+		extras = self.extras
+		poslist = {}
+		rows = zip(self.types, self.keys, *([self.column(field) for field in STRING_FIELDS] + vectors))
+		for row, values in enumerate(rows):
+			item = dict(zip(fields, values[2:]))
+			item["animated"] = None
+			item["parentAssets"] = []
+			if row in extras:
+				item.update(extras[row])
+			group = poslist.get(values[0])
+			if group is None:
+				group = poslist[values[0]] = {}
+			group[values[1]] = item
+		return poslist
+
+
+def has_companion(path):
+	"""
+	Return True if a position list file has a binary companion at least as
+	recent as itself.
+	"""
+	binary = companion_path(path)
+	if not os.path.isfile(binary):
+		return False
+	return not os.path.isfile(path) or os.path.getmtime(binary) >= os.path.getmtime(path)
+
+
+def open_columns(path):
+	"""
+	Return the PositionColumns of a position list file: its binary companion
+	memory mapped, or the JSON file converted when there is none.
+	"""
+	if path.endswith(EXTENSION) or has_companion(path):
+		with open(companion_path(path), "rb") as source:
+			return PositionColumns(mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ))
+	return PositionColumns(encode(load(path)))
+
+
+def load(path):
+	"""
+	Return the content of a position list file, {type: {key: item}}, read from
+	the binary companion when there is one, rebuilt from its base when the file
+	is a delta.
+	"""
+	if has_companion(path):
+		try:
+			with open_columns(path) as columns:
+				return columns.to_dict()
+		except (FormatError, ValueError, EnvironmentError):
+			pass
+	with open(path, "r") as source:
+		content = json.load(source)
+	if poslist_delta.is_delta(content):
+		return poslist_delta.rebuild(content, path, load)
+	return content
+
+
+def chain_depth(path):
+	"""
+	Return the number of deltas between a position list file and its full
+	list, 0 for a full list.
+	"""
+	if has_companion(path):
+		return 0
+	with open(path, "r") as source:
+		content = json.load(source)
+	return content["depth"] if poslist_delta.is_delta(content) else 0
+
+
+def main(argv=None):
+	import argparse
+	import time
+
+	parser = argparse.ArgumentParser(description="Write the binary companion of position list files.")
+	parser.add_argument("paths", nargs="+", help="position list JSON files")
+	parser.add_argument("--check", action="store_true", help="read the companion back and compare it to the JSON")
+	args = parser.parse_args(argv)
+
+	for path in args.paths:
+		with open(path, "r") as source:
+			poslist = json.load(source)
+		if poslist_delta.is_delta(poslist):
+			poslist = poslist_delta.rebuild(poslist, path, load)
+		binary = companion_path(path)
+		write(binary, poslist)
+		print("%s: %d bytes -> %s: %d bytes" % (path, os.path.getsize(path), binary, os.path.getsize(binary)))
+		if args.check:
+			started = time.time()
+			same = load(path) == poslist
+			print("  read back in %.3fs, %s" % (time.time() - started, "identical" if same else "DIFFERENT"))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,163 @@
+"""
+Single traversal scan of the locators making a position list.
+
+The position list holds every locator transform named <TYPE>_<asset>_<number>,
+TYPE being one of SET, SUB, PRP, CHR or VHL, with its world position, world
+rotation and scale. Listing the scene once per type and querying every hit
+with listRelatives, objectType and three xform calls takes seconds on a
+layout of a few thousand locators. collect() does it in one pass over the
+transforms of the scene:
+
+	content, errors = poslist_scan.collect(poslist_scan.maya_entries())
+
+The traversal only depends on entries offering name, long_name, is_locator()
+and transform(), maya_entries() yielding them from an OpenMaya DAG iterator.
+Tests can feed collect() entries built from a fake scene graph instead:
+
+	class FakeEntry(object):
+		def __init__(self, long_name, locator=True, trs=([0, 0, 0], [0, 0, 0], [1, 1, 1])):
+			self.long_name = long_name
+			self.name = long_name.rsplit("|", 1)[-1]
+			self.locator = locator
+			self.trs = trs
+		def is_locator(self):
+			return self.locator
+		def transform(self):
+			return self.trs
+
+maya_entries() only builds entries for the transforms named like an item, and
+path_entries() for the DAG paths it is given named like one. In both cases
+is_locator() and transform() are only called for those, so the scene is read
+for the position list items alone.
+"""
+
+POSLIST_TYPES = ("SET", "SUB", "PRP", "CHR", "VHL")
+
+
+def set_asset_dict(name, asset, assetType, longName = None, animated = None, position = [0,0,0], rotation = [0,0,0], scale = [1,1,1], parentAssets = [], resolution = None):
+	"""
+	Return the dictionary describing an item of the position list.
+	"""
+	tempDict = {}
+	tempDict["name"] = name
+	tempDict["longName"] = longName
+	tempDict["asset"] = asset
+	tempDict["assetType"] = assetType
+	tempDict["animated"] = animated
+	tempDict["resolution"] = resolution
+	tempDict["position"] = position
+	tempDict["rotation"] = rotation
+	tempDict["scale"] = scale
+	tempDict["parentAssets"] = parentAssets
+	return tempDict
+
+
+def classify(name, types=POSLIST_TYPES):
+	"""
+	Return (type, name without namespace) for a node name, (None, name) if it
+	is not a position list item name.
+	"""
+	short_name = name[name.rfind(":") + 1:]
+	for item_type in types:
+		if short_name.startswith(item_type + "_"):
+			return item_type, short_name
+	return None, short_name
+
+
+def collect(entries, types=POSLIST_TYPES):
+	"""
+	Build the position list content from scene entries.
+
+	:param entries: Iterable of entries, see the module documentation
+	:param types:   Item type prefixes to collect
+	:returns:       ({type: {item name: set_asset_dict()}}, [error messages]).
+	                Types without items are left out.
+	"""
+	content = {}
+	errors = []
+	for entry in entries:
+		item_type, name = classify(entry.name, types)
+		if item_type is None or not entry.is_locator():
+			continue
+		items = content.setdefault(item_type, {})
+		if name in items:
+			errors.append("DOUBLE '%s' in scene!" % name)
+			continue
+		position, rotation, scale = entry.transform()
+		asset = name[len(item_type) + 1:name.rfind("_")]
+		items[name] = set_asset_dict(name, asset, item_type, longName=entry.long_name,
+									 position=position, rotation=rotation, scale=scale)
+	return content, errors
+
+
+class MayaEntry(object):
+	"""
+	Transform met by the DAG iterator, read only when asked to.
+	"""
+	__slots__ = ("path", "name")
+
+	def __init__(self, path, name):
+		self.path = path
+		self.name = name
+
+	@property
+	def long_name(self):
+		return self.path.fullPathName()
+
+	def is_locator(self):
+		import maya.api.OpenMaya as om
+
+		if self.path.numberOfShapesDirectlyBelow() == 0:
+			return False
+		shape = om.MDagPath(self.path)
+		shape.extendToShape(0)
+		return shape.apiType() == om.MFn.kLocator
+
+	def transform(self):
+		"""
+		Return the world translation and rotation and the local scale, in the
+		units of the scene like cmds.xform returns them.
+		"""
+		import maya.api.OpenMaya as om
+
+		node = om.MFnTransform(self.path)
+		matrix = om.MTransformationMatrix(self.path.inclusiveMatrix())
+		matrix.reorderRotation(node.rotationOrder())
+		translation = matrix.translation(om.MSpace.kWorld)
+		rotation = matrix.rotation()
+		angle_unit = om.MAngle.uiUnit()
+		return ([om.MDistance.internalToUI(value) for value in (translation.x, translation.y, translation.z)],
+				[om.MAngle(value).asUnits(angle_unit) for value in (rotation.x, rotation.y, rotation.z)],
+				list(node.scale()))
+
+
+def maya_entries(types=POSLIST_TYPES):
+	"""
+	Yield a MayaEntry for every transform of the scene named like a position
+	list item, every instance included, in one traversal of the DAG.
+	"""
+	import maya.api.OpenMaya as om
+
+	iterator = om.MItDag(om.MItDag.kDepthFirst, om.MFn.kTransform)
+	node = om.MFnDependencyNode()
+	while not iterator.isDone():
+		node.setObject(iterator.currentItem())
+		name = node.name()
+		if classify(name, types)[0] is not None:
+			yield MayaEntry(iterator.getPath(), name)
+		iterator.next()
+
+
+def path_entries(paths, types=POSLIST_TYPES):
+	"""
+	Yield a MayaEntry for the DAG paths named like a position list item, the
+	locator transforms of the scene inventory for example.
+	"""
+	import maya.api.OpenMaya as om
+
+	node = om.MFnDependencyNode()
+	for path in paths:
+		node.setObject(path.node())
+		name = node.name()
+		if classify(name, types)[0] is not None:
+			yield MayaEntry(path, name)
@@ -0,0 +1,294 @@
+"""
+Spatial index of the items of a position list, queried with the frustum of a
+camera.
+
+A shot scene only needs the objects its camera sees, a fraction of the
+position list of the sequence. The items are bounding spheres, centred on
+their position, of the bounding radius of their asset times their largest
+scale, kept in a uniform grid. A query tests the bounding sphere of every
+occupied cell against the six planes of the camera frustum, then the items
+of the cells passing:
+
+	index = poslist_spatial.SpatialIndex(names, positions, radii)
+	frames = poslist_spatial.camera_frames("shotCam1", 1001, 1096)
+	visible = index.visible(frames)
+
+A Camera is the world matrix of a camera as cmds.xform(query=True,
+worldSpace=True, matrix=True) gives it, row-major, translation last, looking
+down its -Z axis, with its focal length in millimetres, film aperture in
+inches, overscan and clipping planes, all as the camera shape attributes.
+Over a frame range an item is visible when it is in the frustum of any of the
+frames sampled. The film aperture is used whole on both axes, which fits the
+film gate and never leaves out what the resolution gate shows. Orthographic
+cameras and cameras with a film offset or shake have another frustum,
+camera_frames() returns None for them and the caller loads everything.
+
+The radii come from the published metadata of the assets, the Asset field
+named by RTS_BOUNDING_RADIUS_FIELD, which the asset publish fills with
+asset_bounding_radius(). The items are placed on their locator, the radius
+covers the asset from its pivot. from_columns() uses
+RTS_DEFAULT_BOUNDING_RADIUS for the assets without one, the loader does not
+cull them at all.
+
+The index and the queries are plain Python, with NumPy when it can be
+imported, camera_frames() and shot_cameras() need Maya.
+"""
+
+import collections
+import math
+import os
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+RADIUS_FIELD_ENV = "RTS_BOUNDING_RADIUS_FIELD"
+DEFAULT_RADIUS_ENV = "RTS_DEFAULT_BOUNDING_RADIUS"
+DEFAULT_RADIUS_FIELD = "sg_bounding_radius"
+DEFAULT_RADIUS = 500.0
+INCH = 25.4
+
+Camera = collections.namedtuple("Camera", ["matrix", "focal_length", "horizontal_aperture", "vertical_aperture",
+										   "overscan", "near", "far"])
+
+
+def radius_field():
+	return os.environ.get(RADIUS_FIELD_ENV, DEFAULT_RADIUS_FIELD)
+
+
+def default_radius():
+	return float(os.environ.get(DEFAULT_RADIUS_ENV, DEFAULT_RADIUS))
+
+
+def item_radius(radius, scale):
+	"""
+	Return the bounding radius of an item, the radius of its asset times its
+	largest scale.
+	"""
+	if scale is None or len(scale) == 0:
+		return radius
+	return radius * max(abs(value) for value in scale)
+
+
+def bounding_radius(box, center=(0.0, 0.0, 0.0)):
+	"""
+	Return the radius of the sphere around center holding a bounding box,
+	[xmin, ymin, zmin, xmax, ymax, zmax].
+	"""
+	return math.sqrt(sum(max(abs(box[i] - center[i]), abs(box[i + 3] - center[i])) ** 2 for i in range(3)))
+
+
+def asset_bounding_radius(nodes, pivot):
+	"""
+	Return the bounding radius of the Maya nodes of an asset seen from the
+	world position of its locator, None without a node.
+	"""
+	import maya.cmds as cmds
+
+	if not nodes:
+		return None
+	return bounding_radius(cmds.exactWorldBoundingBox(nodes), pivot)
+
+
+def _normalized(vector):
+	length = math.sqrt(sum(value * value for value in vector)) or 1.0
+	return [value / length for value in vector]
+
+
+def frustum_planes(camera):
+	"""
+	Return the six planes of the frustum of a Camera in world space, as
+	(nx, ny, nz, d) with unit normals pointing inside: a point p is inside when
+	n.p + d >= 0 for every plane.
+	"""
+	m = camera.matrix
+	axes = [_normalized(m[0:3]), _normalized(m[4:7]), _normalized(m[8:11])]
+	origin = m[12:15]
+	tan_h = camera.horizontal_aperture * INCH * 0.5 / camera.focal_length * camera.overscan
+	tan_v = camera.vertical_aperture * INCH * 0.5 / camera.focal_length * camera.overscan
+	# camera space, looking down -Z
+	local = [(1.0, 0.0, -tan_h, 0.0),
+			 (-1.0, 0.0, -tan_h, 0.0),
+			 (0.0, 1.0, -tan_v, 0.0),
+			 (0.0, -1.0, -tan_v, 0.0),
+			 (0.0, 0.0, -1.0, -camera.near),
+			 (0.0, 0.0, 1.0, camera.far)]
+	planes = []
+	for nx, ny, nz, d in local:
+		length = math.sqrt(nx * nx + ny * ny + nz * nz)
+		normal = [nx / length, ny / length, nz / length]
+		d /= length
+		world = [normal[0] * axes[0][i] + normal[1] * axes[1][i] + normal[2] * axes[2][i] for i in range(3)]
+		# point of the plane, -d * normal in camera space
+		point = [origin[i] - d * world[i] for i in range(3)]
+		planes.append((world[0], world[1], world[2], -sum(world[i] * point[i] for i in range(3))))
+	return planes
+
+
+def sphere_visible(planes, center, radius):
+	"""
+	Return True if a sphere intersects the frustum given by its planes.
+	"""
+	for nx, ny, nz, d in planes:
+		if nx * center[0] + ny * center[1] + nz * center[2] + d < -radius:
+			return False
+	return True
+
+
+class SpatialIndex(object):
+	"""
+	Uniform grid of bounding spheres.
+
+	:param names:     Item names
+	:param centers:   Item positions, [x, y, z] each, or a (count, 3) array
+	:param radii:     Item bounding radii
+	:param cell_size: Size of the cells, by default the extent of the items
+	                  divided by the cube root of their count
+	"""
+
+	def __init__(self, names, centers, radii, cell_size=None):
+		self.names = list(names)
+		self.centers = [list(center) for center in centers]
+		self.radii = [float(radius) for radius in radii]
+		if not (len(self.names) == len(self.centers) == len(self.radii)):
+			raise ValueError("as many names, centers and radii expected")
+		self.cell_size = cell_size or self._default_cell_size()
+
+		cells = {}
+		for index, center in enumerate(self.centers):
+			key = tuple(int(math.floor(value / self.cell_size)) for value in center)
+			cells.setdefault(key, []).append(index)
+		half_diagonal = self.cell_size * math.sqrt(3) * 0.5
+		self._members = []
+		self._cell_centers = []
+		self._cell_radii = []
+		for key in sorted(cells):
+			members = cells[key]
+			self._members.append(members)
+			self._cell_centers.append([(value + 0.5) * self.cell_size for value in key])
+			self._cell_radii.append(half_diagonal + max(self.radii[index] for index in members))
+		if numpy is not None:
+			self._members = [numpy.array(members, dtype=numpy.intp) for members in self._members]
+			self._cell_centers = numpy.array(self._cell_centers, dtype=float).reshape((-1, 3))
+			self._cell_radii = numpy.array(self._cell_radii, dtype=float)
+			self._centers = numpy.array(self.centers, dtype=float).reshape((-1, 3))
+			self._radii = numpy.array(self.radii, dtype=float)
+
+	def _default_cell_size(self):
+		if not self.centers:
+			return 1.0
+		extent = max(max(center[i] for center in self.centers) - min(center[i] for center in self.centers)
+					 for i in range(3))
+		return max(extent / max(1, round(len(self.centers) ** (1.0 / 3))), 1e-6)
+
+	@property
+	def cell_count(self):
+		return len(self._members)
+
+	def query(self, planes):
+		"""
+		Return the indices of the items intersecting a frustum, sorted.
+		"""
+		if not self.names:
+			return []
+		if numpy is not None:
+			return self._query_numpy(numpy.array(planes, dtype=float)).tolist()
+		found = []
+		for members, center, radius in zip(self._members, self._cell_centers, self._cell_radii):
+			if sphere_visible(planes, center, radius):
+				found.extend(index for index in members
+							 if sphere_visible(planes, self.centers[index], self.radii[index]))
+		return sorted(found)
+
+	def _query_numpy(self, planes):
+		normals = planes[:, :3]
+		cells = numpy.all(self._cell_centers.dot(normals.T) + planes[:, 3] >= -self._cell_radii[:, None], axis=1)
+		candidates = [self._members[cell] for cell in numpy.flatnonzero(cells)]
+		if not candidates:
+			return numpy.array([], dtype=numpy.intp)
+		candidates = numpy.concatenate(candidates)
+		inside = numpy.all(self._centers[candidates].dot(normals.T) + planes[:, 3] >= -self._radii[candidates, None], axis=1)
+		return numpy.sort(candidates[inside])
+
+	def visible(self, cameras):
+		"""
+		Return the names of the items seen by any of the Cameras, the frames
+		of a range, sorted.
+		"""
+		if numpy is not None and self.names:
+			seen = numpy.zeros(len(self.names), dtype=bool)
+			for camera in cameras:
+				seen[self._query_numpy(numpy.array(frustum_planes(camera), dtype=float))] = True
+			found = numpy.flatnonzero(seen).tolist()
+		else:
+			found = set()
+			for camera in cameras:
+				found.update(self.query(frustum_planes(camera)))
+		return sorted(self.names[index] for index in found)
+
+
+def from_columns(columns, radius_of, default=DEFAULT_RADIUS, cell_size=None):
+	"""
+	Return the SpatialIndex of a position list read with
+	poslist_format.open_columns(), named by item key.
+
+	:param radius_of: {asset code: bounding radius}
+	"""
+	radii = [item_radius(radius_of.get(asset) or default, scale)
+			 for asset, scale in zip(columns.column("asset"), columns.scales)]
+	return SpatialIndex(columns.keys, columns.positions, radii, cell_size)
+
+
+def camera_frames(camera, start, end, step=1.0):
+	"""
+	Return the Cameras of a Maya camera, transform or shape, at every step
+	from start to end included, None when the camera is orthographic or
+	offsets its film at any of them.
+	"""
+	import maya.cmds as cmds
+
+	if cmds.nodeType(camera) == "camera":
+		shape = camera
+		camera = cmds.listRelatives(shape, parent=True, fullPath=True)[0]
+	else:
+		shape = cmds.listRelatives(camera, shapes=True, type="camera", fullPath=True)[0]
+	frames = []
+	time = float(start)
+	while time <= end:
+		if cmds.getAttr("%s.orthographic" % shape, time=time):
+			return None
+		if cmds.getAttr("%s.shakeEnabled" % shape, time=time) or \
+				any(cmds.getAttr("%s.%s" % (shape, name), time=time)
+					for name in ("horizontalFilmOffset", "verticalFilmOffset")):
+			return None
+		values = [cmds.getAttr("%s.%s" % (shape, name), time=time)
+				  for name in ("focalLength", "horizontalFilmAperture", "verticalFilmAperture", "overscan",
+							   "nearClipPlane", "farClipPlane")]
+		frames.append(Camera(cmds.getAttr("%s.worldMatrix[0]" % camera, time=time), *values))
+		time += step
+	return frames
+
+
+def shot_cameras():
+	"""
+	Return [(camera, start, end)] of the shots of the Maya scene, or of its
+	cameras other than the default ones over the playback range when it has
+	no shot.
+	"""
+	import maya.cmds as cmds
+
+	cameras = []
+	for shot in cmds.ls(type="shot") or []:
+		camera = cmds.shot(shot, query=True, currentCamera=True)
+		if camera:
+			cameras.append((camera, cmds.shot(shot, query=True, startTime=True),
+							cmds.shot(shot, query=True, endTime=True)))
+	if cameras:
+		return cameras
+	start = cmds.playbackOptions(query=True, minTime=True)
+	end = cmds.playbackOptions(query=True, maxTime=True)
+	for shape in cmds.ls(type="camera", long=True) or []:
+		if not cmds.camera(shape, query=True, startupCamera=True):
+			cameras.append((shape, start, end))
+	return cameras
@@ -0,0 +1,133 @@
+"""
+Position list transforms applied to the scene in bulk.
+
+Updating the locators of a layout from a position list used to go through
+nine setAttr calls per locator. The entries are now matched to the nodes by
+name through a dictionary, and every node is written with set_transform(),
+three compound setAttr calls, all in one undo chunk, so the whole update is
+undone at once:
+
+	matched, unmatched = poslist_transforms.match(entries, cmds.ls(type="rtsAssetRoot"))
+	failed = poslist_transforms.apply(matched)
+
+The values of a position list are in the units of the scene, like
+cmds.xform returns them. The nodes refusing the values, on a locked or
+connected attribute for example, are returned.
+
+apply(pairs, undoable=False) queues the values of all the nodes on a single
+MDGModifier instead, converted to internal units, and executes it once. The
+modifier is not part of the undo queue, an undo after it leaves the scene
+inconsistent: it is meant for batch scripts, never for the actions artists
+run.
+
+match() is plain Python, the names are matched without their namespace and
+DAG path.
+"""
+
+
+def short_name(node):
+	"""
+	Return a node name without its DAG path and namespace.
+	"""
+	return node.rsplit("|", 1)[-1].rsplit(":", 1)[-1]
+
+
+def match(entries, nodes):
+	"""
+	Match position list entries to scene nodes by name.
+
+	:param entries: {item name: entry} of a position list, the entries of all
+	                its types merged
+	:param nodes:   Node names
+	:returns:       ([(node, entry)], [names of the entries without a node]).
+	                Every node named like an entry gets it.
+	"""
+	found = set()
+	matched = []
+	for node in nodes:
+		name = short_name(node)
+		entry = entries.get(name)
+		if entry is not None:
+			matched.append((node, entry))
+			found.add(name)
+	unmatched = sorted(name for name in entries if name not in found)
+	return matched, unmatched
+
+
+def merged_entries(poslist):
+	"""
+	Return the entries of every type of a position list in one dictionary.
+	"""
+	entries = {}
+	for item_type in poslist:
+		entries.update(poslist[item_type])
+	return entries
+
+
+def set_transform(node, position, rotation, scale):
+	"""
+	Set the translate, rotate and scale of a node, one compound setAttr each.
+	"""
+	import maya.cmds as cmds
+
+	cmds.setAttr("%s.translate" % node, position[0], position[1], position[2])
+	cmds.setAttr("%s.rotate" % node, rotation[0], rotation[1], rotation[2])
+	cmds.setAttr("%s.scale" % node, scale[0], scale[1], scale[2])
+
+
+def apply(pairs, undoable=True):
+	"""
+	Set the transforms of nodes from their entries.
+
+	:param pairs:    [(node, entry)], entries holding position, rotation and scale
+	:param undoable: Write with setAttr in one undo chunk, or with one
+	                 MDGModifier left out of the undo queue when False
+	:returns:        Nodes which could not be set
+	"""
+	import maya.cmds as cmds
+
+	if not pairs:
+		return []
+	if not undoable and _apply_modifier(pairs):
+		return []
+
+	failed = []
+	cmds.undoInfo(openChunk=True)
+	try:
+		for name, entry in pairs:
+			try:
+				set_transform(name, entry["position"], entry["rotation"], entry["scale"])
+			except RuntimeError:
+				failed.append(name)
+	finally:
+		cmds.undoInfo(closeChunk=True)
+	return failed
+
+
+def _apply_modifier(pairs):
+	"""
+	Set the transforms of nodes with one MDGModifier. Returns False when the
+	modifier fails, leaving the nodes to set_transform().
+	"""
+	import maya.api.OpenMaya as om
+
+	linear_unit = om.MDistance.uiUnit()
+	angle_unit = om.MAngle.uiUnit()
+	modifier = om.MDGModifier()
+	node = om.MFnDependencyNode()
+	try:
+		for name, entry in pairs:
+			selection = om.MSelectionList()
+			selection.add(name)
+			node.setObject(selection.getDependNode(0))
+			translate = node.findPlug("translate", False)
+			rotate = node.findPlug("rotate", False)
+			scale = node.findPlug("scale", False)
+			for i in range(3):
+				modifier.newPlugValueMDistance(translate.child(i), om.MDistance(entry["position"][i], linear_unit))
+				modifier.newPlugValueMAngle(rotate.child(i), om.MAngle(entry["rotation"][i], angle_unit))
+				modifier.newPlugValueDouble(scale.child(i), entry["scale"][i])
+		modifier.doIt()
+		return True
+	except RuntimeError:
+		return False
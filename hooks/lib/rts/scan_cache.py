@@ -0,0 +1,277 @@
+"""
+Scan results reused while the scene has not changed.
+
+Opening the publish dialog runs the scan hook of the publish, which walks the
+scene. Artists often open the dialog, cancel it and open it again right away.
+The scan hooks go through cached_scan(), which hands back the previous result
+as long as nothing happened to the scene:
+
+	def execute(self, **kwargs):
+		items = scan_cache.cached_scan("assets_Maya_scan_scene", lambda: self._scan(**kwargs))
+		...
+
+Only what is read from the scene is cached. What Shotgun says, whether an
+asset exists or which shots a sequence has, decides what a publish creates
+and is asked again by execute() every time, after the cached part. The
+sequence scan, a comparison of the cuts with Shotgun, does not use the cache.
+
+The state of the scene is its path, its modified flag, the modification time
+of its file and a change counter ChangeTracker increments from Maya callbacks
+(nodes added, removed or renamed, connections, commands, undo and redo). Scans
+depending on the selection also record the selected nodes, scans reading
+animated values, like the transforms of the position list scan, the current
+time. A result is reused when is_unchanged() holds between the state it was
+scanned in and the current one:
+
+- the scene path, the file modification time, the selection and the current
+  time are the same,
+- the scene was not modified since it was opened or saved, or the callbacks
+  are installed and did not see a change since the scan.
+
+Changes Maya makes without going through a command or the DG messages are not
+seen by the tracker, so entries also expire
+after RTS_SCAN_CACHE_MAX_AGE seconds. Unsaved scenes and scans raising an
+error are not cached, and setting RTS_SCAN_CACHE=0 turns the cache off.
+
+is_unchanged() and ScanCache only see SceneState tuples, the probe reading the
+state from Maya can be replaced to test them without Maya.
+"""
+
+import collections
+import copy
+import os
+import threading
+import time
+
+ENABLE_ENV = "RTS_SCAN_CACHE"
+MAX_AGE_ENV = "RTS_SCAN_CACHE_MAX_AGE"
+DEFAULT_MAX_AGE = 300.0
+
+# events of MEventMessage bumping the change counter, the ones missing from
+# the running version of Maya are skipped
+CHANGE_EVENTS = ("NameChanged", "Undo", "Redo", "RecentCommandChanged", "DragRelease",
+				 "SceneOpened", "NewSceneOpened", "SceneSaved", "PostSceneRead")
+
+SceneState = collections.namedtuple("SceneState", "path modified mtime counter tracked selection time")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def enabled():
+	return os.environ.get(ENABLE_ENV, "1") not in ("0", "false", "False", "")
+
+
+def is_unchanged(old, new):
+	"""
+	Return True if a scan made in the old scene state is still valid in the
+	new one.
+	"""
+	if old.path != new.path or old.mtime != new.mtime or old.selection != new.selection or old.time != new.time:
+		return False
+	if not old.modified and not new.modified:
+		# the scene is the file on disk, as it was
+		return True
+	return old.tracked and new.tracked and old.counter == new.counter
+
+
+class ChangeTracker(object):
+	"""
+	Counter of the changes made to the scene, incremented by Maya callbacks
+	once installed.
+	"""
+
+	def __init__(self):
+		self.counter = 0
+		self._callback_ids = []
+
+	@property
+	def installed(self):
+		return bool(self._callback_ids)
+
+	def bump(self, *args):
+		self.counter += 1
+
+	def install(self):
+		"""
+		Register the Maya callbacks. Does nothing outside of Maya or when
+		already installed.
+		"""
+		if self.installed:
+			return
+		try:
+			import maya.api.OpenMaya as om
+		except ImportError:
+			return
+
+		registrations = [lambda: om.MDGMessage.addNodeAddedCallback(self.bump, "dependNode"),
+						 lambda: om.MDGMessage.addNodeRemovedCallback(self.bump, "dependNode"),
+						 lambda: om.MDGMessage.addConnectionCallback(self.bump),
+						 lambda: om.MDagMessage.addAllDagChangesCallback(self.bump)]
+		for event in CHANGE_EVENTS:
+			registrations.append(lambda event=event: om.MEventMessage.addEventCallback(event, self.bump))
+		for register in registrations:
+			try:
+				self._callback_ids.append(register())
+			except (RuntimeError, TypeError, ValueError):
+				pass
+
+	def uninstall(self):
+		if not self._callback_ids:
+			return
+		import maya.api.OpenMaya as om
+
+		for callback_id in self._callback_ids:
+			try:
+				om.MMessage.removeCallback(callback_id)
+			except RuntimeError:
+				pass
+		self._callback_ids = []
+
+
+def maya_state(tracker, selection=False, current_time=False):
+	"""
+	Return the SceneState of the current Maya scene.
+
+	:param tracker:      ChangeTracker of the session
+	:param selection:    Record the selected nodes
+	:param current_time: Record the current time
+	"""
+	import maya.cmds as cmds
+
+	path = cmds.file(query=True, sceneName=True) or None
+	mtime = None
+	if path:
+		try:
+			mtime = os.path.getmtime(path)
+		except OSError:
+			pass
+	selected = None
+	if selection:
+		selected = tuple(cmds.ls(selection=True, long=True) or ())
+	time_value = None
+	if current_time:
+		time_value = cmds.currentTime(query=True)
+	return SceneState(path, bool(cmds.file(query=True, modified=True)), mtime,
+					  tracker.counter, tracker.installed, selected, time_value)
+
+
+class ScanCache(object):
+	"""
+	Last scan result of every scan hook, with the scene state it was made in.
+
+	:param tracker: ChangeTracker, a new one by default
+	:param probe:   Called as probe(tracker, selection, current_time) to read
+	                the SceneState, maya_state() by default
+	:param max_age: Seconds an entry is valid for, RTS_SCAN_CACHE_MAX_AGE or
+	                DEFAULT_MAX_AGE by default
+	:param clock:   Function returning the time in seconds
+	"""
+
+	def __init__(self, tracker=None, probe=None, max_age=None, clock=time.time):
+		self.tracker = tracker or ChangeTracker()
+		self.probe = probe or maya_state
+		if max_age is None:
+			max_age = float(os.environ.get(MAX_AGE_ENV, DEFAULT_MAX_AGE))
+		self.max_age = max_age
+		self.clock = clock
+		self._entries = {}
+		self._lock = threading.Lock()
+		self.stats = {"hits": 0, "misses": 0}
+
+	def get(self, name, state):
+		"""
+		Return a copy of the result of a scan valid in a scene state, None if
+		there is none.
+		"""
+		with self._lock:
+			entry = self._entries.get(name)
+			if entry is not None:
+				scanned, stamp, result = entry
+				if self.clock() - stamp <= self.max_age and is_unchanged(scanned, state):
+					self.stats["hits"] += 1
+					return copy.deepcopy(result)
+				del self._entries[name]
+			self.stats["misses"] += 1
+		return None
+
+	def put(self, name, state, result):
+		"""
+		Store the result of a scan made in a scene state. Scans of unsaved
+		scenes are not stored.
+		"""
+		if not state.path:
+			return
+		with self._lock:
+			self._entries[name] = (state, self.clock(), copy.deepcopy(result))
+
+	def invalidate(self, name=None):
+		"""
+		Forget the result of a scan, of every scan if name is None.
+		"""
+		with self._lock:
+			if name is None:
+				self._entries.clear()
+			else:
+				self._entries.pop(name, None)
+
+	def scan(self, name, function, selection=False, current_time=False):
+		"""
+		Return the result of a scan, running it only if the scene changed since
+		it last ran.
+
+		:param name:         Name of the scan, the hook name
+		:param function:     Function making the scan
+		:param selection:    The result depends on the selection
+		:param current_time: The result depends on the current time
+		"""
+		state = self.probe(self.tracker, selection, current_time)
+		result = self.get(name, state)
+		if result is not None:
+			return result
+		result = function()
+		# Maya is busy while the scan runs, the state it leaves the scene in is
+		# the one the result is valid for, changes the scan made included
+		self.put(name, self.probe(self.tracker, selection, current_time), result)
+		return result
+
+
+def get_cache():
+	"""
+	Return the scan cache of the session, its change tracker installed.
+	"""
+	global _cache
+	with _cache_lock:
+		if _cache is None:
+			_cache = ScanCache()
+			_cache.tracker.install()
+		return _cache
+
+
+def reset():
+	global _cache
+	with _cache_lock:
+		if _cache is not None:
+			_cache.tracker.uninstall()
+		_cache = None
+
+
+def cached_scan(name, function, selection=False, current_time=False):
+	"""
+	Return the result of a scan hook, from the session cache when the scene did
+	not change, see ScanCache.scan().
+	"""
+	if not enabled():
+		return function()
+	return get_cache().scan(name, function, selection, current_time)
+
+
+def invalidate(name=None):
+	"""
+	Forget the result of a scan of the session cache, of every scan if name is
+	None. The post publish hook calls it, a publish changes what the scans
+	find in Shotgun.
+	"""
+	with _cache_lock:
+		if _cache is not None:
+			_cache.invalidate(name)
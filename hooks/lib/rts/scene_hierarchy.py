@@ -0,0 +1,206 @@
+"""
+Parent map and node types of the DAG, read in one traversal.
+
+The asset scan hooks used to find the locator transforms with nested ls and
+listRelatives calls, then select the hierarchy of every candidate and read the
+selection back to know what it holds. That walks the DAG once per object and
+leaves the selection of the artist changed. SceneHierarchy reads the DAG once
+and answers the same questions from memory:
+
+	hierarchy = scene_hierarchy.from_maya()
+	objects = hierarchy.locator_transforms()
+	childrenAndParentsDict, typeDict = hierarchy.parents_and_types(objects)
+	sel = hierarchy.descendants_with_types(objects[0])
+	amount = hierarchy.instance_count(objects[0])
+
+When the scene inventory (scene_inventory.py) already knows the locator
+transforms, from_maya(objects) reads their ancestors and descendants only.
+
+Nodes are known by the shortest unique name Maya gives them, the names
+cmds.ls() returns. An instanced node has one name per DAG path, the paths of
+the same node share its UUID, which instances() groups them by. Building a SceneHierarchy by hand with add() gives a fake
+scene graph to test the scan logic with outside of Maya.
+"""
+
+
+class SceneHierarchy(object):
+	"""
+	DAG nodes with their parent, children and type.
+	"""
+
+	def __init__(self):
+		self.parents = {}
+		self.children = {}
+		self.types = {}
+		# name -> node the path leads to, and the reverse, for instances
+		self.nodes = {}
+		self.paths = {}
+		# insertion order, the one of a depth first traversal for from_maya()
+		self.order = []
+
+	def add(self, name, node_type, parent=None, node=None):
+		"""
+		Add a node below a parent already added, at the root if parent is None.
+
+		:param node: Identity of the node the path leads to, shared by the paths
+		             of an instanced node, the name itself by default
+		"""
+		if name in self.types:
+			return
+		if node is None:
+			node = name
+		self.types[name] = node_type
+		self.parents[name] = parent
+		self.nodes[name] = node
+		self.paths.setdefault(node, []).append(name)
+		self.children.setdefault(name, [])
+		if parent is not None:
+			self.children.setdefault(parent, []).append(name)
+		self.order.append(name)
+
+	def __contains__(self, name):
+		return name in self.types
+
+	def parent(self, name):
+		return self.parents.get(name)
+
+	def instances(self, name):
+		"""
+		Return the names of every DAG path to the node of a name, in traversal
+		order, the name included.
+		"""
+		return list(self.paths.get(self.nodes.get(name), [name]))
+
+	def instance_count(self, name):
+		"""
+		Return the number of DAG paths to the node of a name, 1 for a node
+		that is not instanced.
+		"""
+		return len(self.paths.get(self.nodes.get(name), [name]))
+
+	def first_instances(self, objects):
+		"""
+		Return the objects without the later DAG paths of the same nodes.
+		"""
+		found = []
+		seen = set()
+		for obj in objects:
+			node = self.nodes.get(obj, obj)
+			if node not in seen:
+				seen.add(node)
+				found.append(obj)
+		return found
+
+	def descendants(self, name):
+		"""
+		Return every node below a node, depth first, the node excluded.
+		"""
+		found = []
+		stack = list(reversed(self.children.get(name, [])))
+		while stack:
+			node = stack.pop()
+			found.append(node)
+			stack.extend(reversed(self.children.get(node, [])))
+		return found
+
+	def descendants_with_types(self, name):
+		"""
+		Return the nodes below a node as a flat [name, type, name, type, ...]
+		list, like cmds.ls(selection=True, showType=True) after selecting its
+		children with hierarchy=True.
+		"""
+		flat = []
+		for node in self.descendants(name):
+			flat.extend((node, self.types[node]))
+		return flat
+
+	def locator_transforms(self):
+		"""
+		Return the transforms holding a locator shape, in traversal order.
+		"""
+		found = []
+		seen = set()
+		for name in self.order:
+			parent = self.parents[name]
+			if self.types[name] == "locator" and parent is not None and parent not in seen:
+				seen.add(parent)
+				found.append(parent)
+		return found
+
+	def parents_and_types(self, objects):
+		"""
+		Return ({object: [parent, grand parent, ...]}, {name: "Prop" or "Set"})
+		for a list of objects. Objects are props and their parents sets.
+		"""
+		types = {}
+		parents = {}
+		for obj in objects:
+			if obj not in types:
+				types[str(obj)] = "Prop"
+			parent = self.parents.get(obj)
+			if parent is not None:
+				types[str(parent)] = "Set"
+				parents[str(obj)] = str(parent)
+
+		chains = {}
+		for obj in objects:
+			chain = []
+			child = obj
+			while str(child) in parents:
+				child = parents[str(child)]
+				chain.append(child)
+			chains[str(obj)] = chain
+		return chains, types
+
+
+def from_maya(roots=None):
+	"""
+	Read the DAG of the current Maya scene, every instance path included, or
+	only the nodes above and below some nodes.
+
+	:param roots: Node names to read the ancestors and descendants of, of
+	              every instance of them, the whole DAG if None
+	"""
+	import maya.api.OpenMaya as om
+
+	hierarchy = SceneHierarchy()
+	# full path name -> shortest unique name, to find the parents
+	names = {}
+	node = om.MFnDependencyNode()
+
+	def add(path):
+		full_name = path.fullPathName()
+		name = path.partialPathName()
+		names[full_name] = name
+		node.setObject(path.node())
+		hierarchy.add(name, node.typeName, names.get(full_name.rsplit("|", 1)[0]), node.uuid().asString())
+
+	def walk(iterator):
+		while not iterator.isDone():
+			path = iterator.getPath()
+			if path.length() > 0:
+				add(path)
+			iterator.next()
+
+	if roots is None:
+		walk(om.MItDag(om.MItDag.kDepthFirst))
+		return hierarchy
+
+	selection = om.MSelectionList()
+	for root in roots:
+		selection.add(root)
+	roots = []
+	for i in range(selection.length()):
+		roots.extend(om.MDagPath.getAllPathsTo(selection.getDependNode(i)))
+	for root in roots:
+		# the ancestors first, top down, so the parents are known
+		ancestors = []
+		path = om.MDagPath(root)
+		while path.pop().length() > 0:
+			ancestors.append(om.MDagPath(path))
+		for path in reversed(ancestors):
+			add(path)
+		iterator = om.MItDag()
+		iterator.reset(root, om.MItDag.kDepthFirst)
+		walk(iterator)
+	return hierarchy
@@ -0,0 +1,341 @@
+"""
+Inventory of the publishable nodes of the scene, kept up to date by Maya
+callbacks.
+
+The scan hooks look for the same few kinds of nodes on every publish: the
+transforms holding a locator (the PRP_, SET_, SUB_, CHR_ and VEH_ assets and
+the position list items), the '*:alembic' groups, the shots of the camera
+sequencer, the cameras and the audio nodes. Finding them means walking every
+node of the scene. The inventory keeps them indexed by category instead:
+
+	inventory = scene_inventory.get_inventory()
+	if inventory is not None:
+		objects = inventory.names("locators")
+		groups = inventory.names("alembic", long=True)
+
+Callbacks on nodes added, removed, renamed and reparented only mark the nodes
+they are given as dirty. Dirty nodes are looked at again when the inventory is
+next queried, once they are named and parented, so keeping the index costs a
+little per changed node and nothing per scene node. Opening or creating a
+scene marks the inventory for a rebuild, which is the one full pass over the
+nodes. Nodes are kept as handles and named when queried, renaming a parent
+needs no update.
+
+The inventory is optional: the pick_environment core hook installs it when
+RTS_SCENE_INVENTORY is set and Maya is running, and get_inventory() returns
+None otherwise, the hooks then scan the scene as before.
+
+SceneInventory only talks to Maya through its source, MayaSource. A source
+giving (type, name, shape types) for plain strings is enough to test the
+indexing without Maya.
+"""
+
+import os
+import threading
+
+ENABLE_ENV = "RTS_SCENE_INVENTORY"
+
+CATEGORIES = ("locators", "alembic", "shots", "cameras", "audio")
+# node types the inventory looks at, transforms aside
+TRACKED_TYPES = ("locator", "camera", "shot", "audio")
+SHAPE_TYPES = ("locator", "camera")
+
+_inventory = None
+_inventory_lock = threading.Lock()
+
+
+def enabled():
+	return os.environ.get(ENABLE_ENV, "0") not in ("0", "false", "False", "")
+
+
+def categorize(node_type, name, shape_types=()):
+	"""
+	Return the categories of a node.
+
+	:param node_type:   Maya type of the node
+	:param name:        Name of the node, namespace included
+	:param shape_types: Types of the shapes directly below a transform
+	"""
+	categories = set()
+	if node_type == "transform":
+		if "locator" in shape_types:
+			categories.add("locators")
+		if "camera" in shape_types:
+			categories.add("cameras")
+	elif node_type == "shot":
+		categories.add("shots")
+	elif node_type == "audio":
+		categories.add("audio")
+	# what cmds.ls("*:alembic") finds: a node called alembic in one namespace
+	if name.count(":") == 1 and name.endswith(":alembic"):
+		categories.add("alembic")
+	return categories
+
+
+class SceneInventory(object):
+	"""
+	Nodes of the scene by category, updated from the nodes marked as changed.
+
+	:param source: Object reading the nodes, see MayaSource
+	"""
+
+	def __init__(self, source):
+		self.source = source
+		self._nodes = {}
+		self._categories = {}
+		self._members = dict((category, set()) for category in CATEGORIES)
+		# shape key -> keys of the transforms it was last seen below
+		self._shape_parents = {}
+		self._dirty = {}
+		self._rebuild = True
+		self.paused = False
+		self.stats = {"marked": 0, "resolved": 0, "rebuilds": 0}
+
+	def mark(self, node):
+		"""
+		Record that a node was added or changed.
+		"""
+		if self.paused or not self.source.tracked(node):
+			return
+		self._dirty[self.source.key(node)] = node
+		self.stats["marked"] += 1
+
+	def rebuild(self):
+		"""
+		Forget every node, the next query reads them all again.
+		"""
+		self._rebuild = True
+		self._dirty.clear()
+
+	def refresh(self):
+		"""
+		Look at the nodes changed since the last query.
+		"""
+		if self._rebuild:
+			self._rebuild = False
+			self._nodes.clear()
+			self._categories.clear()
+			self._shape_parents.clear()
+			for members in self._members.values():
+				members.clear()
+			for node in self.source.all_nodes():
+				self._dirty[self.source.key(node)] = node
+			self.stats["rebuilds"] += 1
+		while self._dirty:
+			key, node = self._dirty.popitem()
+			self._resolve(key, node)
+
+	def _resolve(self, key, node):
+		self.stats["resolved"] += 1
+		description = self.source.describe(node)
+		for parent_key in self._shape_parents.pop(key, ()):
+			if parent_key in self._nodes:
+				self._dirty[parent_key] = self._nodes[parent_key]
+		for category in self._categories.pop(key, ()):
+			self._members[category].discard(key)
+		self._nodes.pop(key, None)
+		if description is None:
+			return
+
+		node_type, name, shape_types = description
+		if node_type in SHAPE_TYPES:
+			parents = self.source.parents(node)
+			self._shape_parents[key] = [self.source.key(parent) for parent in parents]
+			for parent in parents:
+				self._dirty.setdefault(self.source.key(parent), parent)
+		categories = categorize(node_type, name, shape_types)
+		self._nodes[key] = node
+		if categories:
+			self._categories[key] = categories
+			for category in categories:
+				self._members[category].add(key)
+
+	def nodes(self, category):
+		"""
+		Return the nodes of a category.
+		"""
+		self.refresh()
+		return [self._nodes[key] for key in self._members[category]]
+
+	def names(self, category, long=False):
+		"""
+		Return the names of the nodes of a category, sorted, one per instance
+		for DAG nodes: the shortest unique names, or the full paths if long.
+		"""
+		names = []
+		for node in self.nodes(category):
+			names.extend(self.source.names(node, long))
+		return sorted(names)
+
+	def report(self):
+		self.refresh()
+		counts = ", ".join("%d %s" % (len(self._members[category]), category) for category in CATEGORIES)
+		return "%s (%d nodes marked, %d resolved, %d rebuilds)" % (
+			counts, self.stats["marked"], self.stats["resolved"], self.stats["rebuilds"])
+
+
+class MayaSource(object):
+	"""
+	Nodes of the running Maya session, as MObjectHandles.
+	"""
+
+	def __init__(self):
+		import maya.api.OpenMaya as om
+		self.om = om
+
+	def handle(self, obj):
+		return self.om.MObjectHandle(obj)
+
+	def key(self, node):
+		return node.hashCode()
+
+	def tracked(self, node):
+		obj = node.object()
+		return obj.hasFn(self.om.MFn.kTransform) or self.om.MFnDependencyNode(obj).typeName in TRACKED_TYPES
+
+	def describe(self, node):
+		"""
+		Return (type, name, shape types) of a node, None if it is gone.
+		"""
+		om = self.om
+		if not node.isValid():
+			return None
+		obj = node.object()
+		fn = om.MFnDependencyNode(obj)
+		node_type = fn.typeName
+		shape_types = []
+		if obj.hasFn(om.MFn.kTransform):
+			# joints and other transform types are plain transforms here
+			node_type = "transform"
+			dag = om.MFnDagNode(obj)
+			for i in range(dag.childCount()):
+				child = dag.child(i)
+				if child.hasFn(om.MFn.kShape):
+					shape_types.append(om.MFnDependencyNode(child).typeName)
+		return node_type, fn.name(), shape_types
+
+	def parents(self, node):
+		om = self.om
+		if not node.isValid():
+			return []
+		dag = om.MFnDagNode(node.object())
+		parents = []
+		for i in range(dag.parentCount()):
+			parent = dag.parent(i)
+			if not parent.hasFn(om.MFn.kWorld):
+				parents.append(om.MObjectHandle(parent))
+		return parents
+
+	def all_nodes(self):
+		om = self.om
+		iterator = om.MItDependencyNodes()
+		while not iterator.isDone():
+			node = om.MObjectHandle(iterator.thisNode())
+			if self.tracked(node):
+				yield node
+			iterator.next()
+
+	def dag_paths(self, node):
+		return list(self.om.MDagPath.getAllPathsTo(node.object()))
+
+	def names(self, node, long=False):
+		om = self.om
+		obj = node.object()
+		if not obj.hasFn(om.MFn.kDagNode):
+			return [om.MFnDependencyNode(obj).name()]
+		if long:
+			return [path.fullPathName() for path in om.MDagPath.getAllPathsTo(obj)]
+		return [path.partialPathName() for path in om.MDagPath.getAllPathsTo(obj)]
+
+
+class MayaInventory(SceneInventory):
+	"""
+	SceneInventory of the running Maya session, fed by its callbacks.
+	"""
+
+	def __init__(self):
+		SceneInventory.__init__(self, MayaSource())
+		self.om = self.source.om
+		self._callback_ids = []
+
+	def install(self):
+		om = self.om
+		handle = self.source.handle
+
+		def added(obj, *args):
+			self.mark(handle(obj))
+
+		def removed(obj, *args):
+			# the node is still alive, its parents are marked through its key
+			self.mark(handle(obj))
+
+		def dag_changed(message, child, parent, *args):
+			for path in (child, parent):
+				if path.isValid() and path.length() > 0:
+					self.mark(handle(path.node()))
+
+		def pause(*args):
+			self.paused = True
+
+		def resume(*args):
+			self.paused = False
+			self.rebuild()
+
+		self._callback_ids = [
+			om.MDGMessage.addNodeAddedCallback(added, "dependNode"),
+			om.MDGMessage.addNodeRemovedCallback(removed, "dependNode"),
+			om.MNodeMessage.addNameChangedCallback(om.MObject.kNullObj, added),
+			om.MDagMessage.addAllDagChangesCallback(dag_changed),
+			om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, pause),
+			om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, resume),
+			om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, pause),
+			om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, resume)]
+
+	def uninstall(self):
+		for callback_id in self._callback_ids:
+			try:
+				self.om.MMessage.removeCallback(callback_id)
+			except RuntimeError:
+				pass
+		self._callback_ids = []
+
+	def dag_paths(self, category):
+		"""
+		Return the MDagPaths of the nodes of a category, every instance.
+		"""
+		paths = []
+		for node in self.nodes(category):
+			paths.extend(self.source.dag_paths(node))
+		return paths
+
+
+def install():
+	"""
+	Start the inventory of the Maya session, once. Returns None outside of
+	Maya.
+	"""
+	global _inventory
+	with _inventory_lock:
+		if _inventory is None:
+			try:
+				import maya.api.OpenMaya
+			except ImportError:
+				return None
+			_inventory = MayaInventory()
+			_inventory.install()
+		return _inventory
+
+
+def uninstall():
+	global _inventory
+	with _inventory_lock:
+		if _inventory is not None:
+			_inventory.uninstall()
+		_inventory = None
+
+
+def get_inventory():
+	"""
+	Return the inventory of the session, None if it is not running.
+	"""
+	return _inventory
@@ -0,0 +1,519 @@
+"""
+Fast creation of the schema folders for many entities at once.
+
+core/schema/project is replicated for every Sequence, Shot, Asset and Step.
+Toolkit walks the whole schema tree and tests every folder for every entity,
+which makes setting up a new sequence of a hundred shots take minutes on the
+network storage. The materializer does the same work in three cheaper steps:
+
+- compile_schema() reads the schema once (folders, yml files and
+  ignore_files) and flattens it, per entity type, into a list of
+  (folder path segments, files to copy). Static segments are plain strings,
+  the folders named after Shotgun data are Token objects. The result is kept
+  for the session.
+- expand() turns the compiled list into the concrete folders of an entity:
+  its own code, the code of its sequence, its asset type and the short names
+  of its steps, the shotgun_step filters of the schema applied.
+- materialize() merges the folders of every entity into one tree and creates
+  it level by level with a pool of threads. A folder already on disk is listed
+  once (os.scandir when available) and only its missing children are
+  created, a new folder is filled without testing anything. Files like
+  workspace.mel are hard linked to the schema copy where the file system
+  allows it and copied otherwise.
+
+Entities are Shotgun dictionaries with the fields the schema names folders
+after, and the short names of their steps:
+
+	shots = [{"type": "Shot", "code": "q010_s010", "sg_sequence": {"type": "Sequence", "name": "q010"},
+			  "steps": ["ani", "lay"]}, ...]
+	schema_materializer.materialize(shots, "W:/RTS", engine="tk-maya")
+
+The folders are not registered in the Toolkit path cache. Running the usual
+folder creation afterwards registers them and only finds existing folders.
+Folder and yml names of the schema are matched without case, like on the
+Windows storage the schema is edited on.
+
+From a plain python shell, to time the creation of a sequence in a test root:
+
+	python hooks/lib/rts/schema_materializer.py /tmp/project --sequence q010 --shots 80 --steps ani lay
+"""
+
+import errno
+import fnmatch
+import itertools
+import os
+import re
+import shutil
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+	import yaml
+except ImportError:
+	from tank_vendor import yaml
+
+# schema folder of this configuration
+SCHEMA_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+	os.path.abspath(__file__))))), "core", "schema")
+
+DEFAULT_WORKERS = 8
+FOLDER_MODE = 0o777
+FILE_MODE = 0o666
+
+# characters Toolkit replaces by a dash in folder names
+_INVALID_CHARACTERS = re.compile(r"[^a-zA-Z0-9_\-\.]")
+_EXPRESSION = re.compile(r"\{([^}]+)\}")
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def folder_names(path):
+	"""
+	Return the names found in a folder, in lower case on Windows.
+	"""
+	scandir = getattr(os, "scandir", None)
+	if scandir is not None:
+		names = [entry.name for entry in scandir(path)]
+	else:
+		names = os.listdir(path)
+	return set(os.path.normcase(name) for name in names)
+
+
+def read_ignore_patterns(schema_root=None):
+	"""
+	Return the file patterns of the ignore_files file of a schema.
+	"""
+	path = os.path.join(schema_root or SCHEMA_ROOT, "ignore_files")
+	patterns = []
+	if os.path.exists(path):
+		with open(path) as source:
+			for line in source:
+				line = line.strip()
+				if line and not line.startswith("#"):
+					patterns.append(line)
+	return patterns
+
+
+class Token(object):
+	"""
+	Folder named after Shotgun data.
+
+	:param kind:        "entity", "list_field" or "step"
+	:param entity_type: Entity type of the folder, Step for steps
+	:param field:       Field or {field} expression naming the folder
+	:param filters:     Filters of the yml file, applied to steps
+	:param link:        Field of the target entity holding this entity, for
+	                    entity folders above the target entity
+	"""
+	__slots__ = ("kind", "entity_type", "field", "filters", "link")
+
+	def __init__(self, kind, entity_type, field, filters=None, link=None):
+		self.kind = kind
+		self.entity_type = entity_type
+		self.field = field
+		self.filters = filters or []
+		self.link = link
+
+	def __repr__(self):
+		return "<%s %s.%s>" % (self.kind, self.entity_type, self.field)
+
+
+class SchemaNode(object):
+	"""
+	Folder of the schema, the folders with the same name in other cases merged.
+	"""
+
+	def __init__(self, name, config=None):
+		self.name = name
+		self.config = config or {}
+		self.children = []
+		self.files = []
+
+	@property
+	def kind(self):
+		return self.config.get("type", "static")
+
+
+def _read_folder(node, folders, ignore):
+	entries = {}
+	configs = {}
+	for folder in folders:
+		for name in sorted(os.listdir(folder)):
+			path = os.path.join(folder, name)
+			if any(fnmatch.fnmatch(name, pattern) for pattern in ignore):
+				continue
+			if os.path.isdir(path):
+				entries.setdefault(name.lower(), (name, []))[1].append(path)
+			elif name.lower().endswith(".yml"):
+				configs[name[:-4].lower()] = path
+			else:
+				node.files.append(path)
+	for key in sorted(entries):
+		name, paths = entries[key]
+		config = None
+		if key in configs:
+			with open(configs[key]) as source:
+				config = yaml.safe_load(source) or {}
+		child = SchemaNode(name, config)
+		_read_folder(child, paths, ignore)
+		node.children.append(child)
+
+
+def load_schema(schema_root=None):
+	"""
+	Read a schema folder into a tree of SchemaNode, the project folder being
+	the root.
+	"""
+	schema_root = schema_root or SCHEMA_ROOT
+	root = SchemaNode("project")
+	_read_folder(root, [os.path.join(schema_root, "project")], read_ignore_patterns(schema_root))
+	return root
+
+
+def _deferred_for(node, engine):
+	"""
+	Return True if a static folder is not created for an engine.
+	"""
+	deferred = node.config.get("defer_creation")
+	if not deferred:
+		return False
+	if isinstance(deferred, (list, tuple)):
+		return engine not in deferred
+	return engine != deferred
+
+
+def _link_field(target, ancestor):
+	"""
+	Return the field of the target entity folder which filters on an ancestor
+	folder, e.g. sg_sequence for a Shot below a sequence folder.
+	"""
+	token = "$%s" % ancestor.name
+	for item in target.config.get("filters") or []:
+		if token in (item.get("values") or []):
+			return item.get("path")
+	return None
+
+
+def _token(node, target=None, entity_type=None):
+	config = node.config
+	kind = node.kind
+	if kind == "shotgun_step":
+		return Token("step", "Step", config.get("name", "short_name"), config.get("filters"))
+	if kind == "shotgun_list_field":
+		return Token("list_field", config.get("entity_type"), config.get("field_name"))
+	if kind == "shotgun_entity":
+		link = None
+		if target is not None and config.get("entity_type") != entity_type:
+			link = _link_field(target, node)
+		return Token("entity", config.get("entity_type"), config.get("name", "code"), config.get("filters"), link)
+	raise ValueError("Folder type %s of %s is not supported" % (kind, node.name))
+
+
+class CompiledSchema(object):
+	"""
+	Flat folder lists of a schema, per entity type.
+
+	:param root:   SchemaNode of the project folder
+	:param engine: Engine the deferred folders are created for, None for none
+	"""
+
+	def __init__(self, root, engine=None):
+		self.engine = engine
+		self.entries = {}
+		self._compile(root, [], [])
+
+	def _static_subtree(self, node, segments, entries):
+		"""
+		Add the folders created with an entity folder: static folders and the
+		steps below it.
+		"""
+		entries.append((tuple(segments), tuple(node.files)))
+		for child in node.children:
+			if child.kind == "static":
+				if not _deferred_for(child, self.engine):
+					self._static_subtree(child, segments + [child.name], entries)
+			elif child.kind == "shotgun_step":
+				self._static_subtree(child, segments + [_token(child)], entries)
+
+	def _compile(self, node, ancestors, segments):
+		"""
+		Walk down to the entity folders. ancestors holds the dynamic node of
+		every segment, None for static ones.
+		"""
+		for child in node.children:
+			if child.kind == "static":
+				if not _deferred_for(child, self.engine):
+					self._compile(child, ancestors + [None], segments + [child.name])
+				continue
+			if child.kind == "shotgun_entity":
+				entity_type = child.config.get("entity_type")
+				path = [segment if ancestor is None else _token(ancestor, child, entity_type)
+						for segment, ancestor in zip(segments, ancestors)]
+				path.append(_token(child, child, entity_type))
+				self._static_subtree(child, path, self.entries.setdefault(entity_type, []))
+			self._compile(child, ancestors + [child], segments + [child.name])
+
+	def entity_types(self):
+		return sorted(self.entries)
+
+	def expand(self, entity):
+		"""
+		Return the (relative folder, files to copy) of an entity, parents
+		first.
+		"""
+		return [(relative, files) for relative, files, _ in self.expand_entries(entity)]
+
+	def expand_entries(self, entity):
+		"""
+		Same as expand(), with the Token naming each folder, None for static
+		folders.
+		"""
+		values = {}
+		expanded = []
+		for segments, files in self.entries.get(entity["type"], []):
+			choices = []
+			for segment in segments:
+				if isinstance(segment, Token):
+					key = id(segment)
+					if key not in values:
+						values[key] = token_values(segment, entity)
+					choices.append(values[key])
+				else:
+					choices.append([segment])
+			last = segments[-1] if isinstance(segments[-1], Token) else None
+			for parts in itertools.product(*choices):
+				expanded.append((os.path.join(*parts), files, last))
+		return expanded
+
+
+def _expression_value(expression, entity):
+	if "{" not in expression:
+		return entity.get(expression)
+	values = []
+
+	def replace(match):
+		value = entity.get(match.group(1))
+		values.append(value)
+		return "" if value is None else str(value)
+	name = _EXPRESSION.sub(replace, expression)
+	return None if None in values else name
+
+
+def _link_name(value):
+	if isinstance(value, dict):
+		return value.get("name") or value.get("code")
+	return value
+
+
+def _matches(step, filters):
+	for item in filters:
+		value = step.get(item.get("path"))
+		wanted = item.get("values") or []
+		relation = item.get("relation")
+		if relation == "is":
+			ok = value == (wanted[0] if wanted else None)
+		elif relation == "is_not":
+			ok = value != (wanted[0] if wanted else None)
+		elif relation == "in":
+			ok = value in wanted
+		elif relation == "not_in":
+			ok = value not in wanted
+		else:
+			raise ValueError("Step filter relation %s is not supported" % relation)
+		if not ok:
+			return False
+	return True
+
+
+def token_values(token, entity):
+	"""
+	Return the folder names a token takes for an entity, sanitized the way
+	Toolkit does. An empty list means the folder is not created.
+	"""
+	if token.kind == "step":
+		names = []
+		for step in entity.get("steps") or []:
+			if not isinstance(step, dict):
+				step = {"short_name": step, "code": step}
+			if _matches(step, token.filters):
+				names.append(step.get(token.field))
+	elif token.kind == "list_field":
+		names = [entity.get(token.field)]
+	elif token.entity_type == entity["type"]:
+		names = [_expression_value(token.field, entity)]
+	elif token.link:
+		names = [_link_name(entity.get(token.link))]
+	else:
+		raise ValueError("No field of %s links it to its %s folder" % (entity["type"], token.entity_type))
+	return [_INVALID_CHARACTERS.sub("-", "%s" % name) for name in names if name not in (None, "")]
+
+
+def compile_schema(schema_root=None, engine=None):
+	"""
+	Return the CompiledSchema of a schema folder, compiled once per session.
+	"""
+	key = (os.path.normcase(os.path.abspath(schema_root or SCHEMA_ROOT)), engine)
+	with _compiled_lock:
+		compiled = _compiled.get(key)
+		if compiled is None:
+			compiled = _compiled[key] = CompiledSchema(load_schema(schema_root), engine)
+		return compiled
+
+
+class _Target(object):
+	__slots__ = ("folders", "files")
+
+	def __init__(self):
+		self.folders = {}
+		self.files = {}
+
+
+def target_tree(compiled, entities):
+	"""
+	Merge the folders of several entities into one tree of _Target nodes.
+	"""
+	root = _Target()
+	for entity in entities:
+		for relative, files in compiled.expand(entity):
+			node = root
+			for name in relative.split(os.sep):
+				child = node.folders.get(name)
+				if child is None:
+					child = node.folders[name] = _Target()
+				node = child
+			for source in files:
+				node.files[os.path.basename(source)] = source
+	return root
+
+
+def link_or_copy(source, target):
+	"""
+	Hard link a file, or copy it with open permissions when linking is not
+	possible. Returns True if the file was linked.
+	"""
+	try:
+		os.link(source, target)
+		return True
+	except (AttributeError, OSError):
+		# no os.link on python 2 for Windows, other volume or file system
+		shutil.copy(source, target)
+		os.chmod(target, FILE_MODE)
+		return False
+
+
+class _Run(object):
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.stats = {"folders_created": 0, "folders_existing": 0, "files_linked": 0, "files_copied": 0,
+					  "files_existing": 0, "listings": 0}
+
+	def count(self, **counts):
+		with self.lock:
+			for name, value in counts.items():
+				self.stats[name] += value
+
+	def process(self, job):
+		"""
+		Create or list one folder and its files, returning the jobs of its
+		sub folders.
+		"""
+		node, path, exists = job
+		present = set()
+		if exists:
+			present = folder_names(path)
+			self.count(listings=1, folders_existing=1)
+		else:
+			try:
+				os.mkdir(path, FOLDER_MODE)
+				self.count(folders_created=1)
+			except OSError as e:
+				# created by another process in the meantime
+				if e.errno != errno.EEXIST:
+					raise
+				present = folder_names(path)
+				self.count(listings=1, folders_existing=1)
+		for name, source in sorted(node.files.items()):
+			if os.path.normcase(name) in present:
+				self.count(files_existing=1)
+			elif link_or_copy(source, os.path.join(path, name)):
+				self.count(files_linked=1)
+			else:
+				self.count(files_copied=1)
+		return [(child, os.path.join(path, name), os.path.normcase(name) in present)
+				for name, child in sorted(node.folders.items())]
+
+
+def materialize(entities, project_root, engine=None, workers=DEFAULT_WORKERS, schema_root=None):
+	"""
+	Create the schema folders of several entities below a project root.
+
+	:param entities:     Shotgun entity dictionaries, see the module documentation
+	:param project_root: Root folder of the project, created if missing
+	:param engine:       Engine the deferred folders are created for, e.g. "tk-maya"
+	:param workers:      Number of threads creating folders
+	:param schema_root:  Schema folder, the one of this configuration by default
+	:returns:            Dictionary of counts and the time spent
+	"""
+	started = time.time()
+	compiled = compile_schema(schema_root, engine)
+	root = target_tree(compiled, entities)
+	run = _Run()
+	old_umask = os.umask(0)
+	pool = ThreadPool(max(1, workers))
+	try:
+		if not os.path.isdir(project_root):
+			os.makedirs(project_root, FOLDER_MODE)
+		jobs = run.process((root, project_root, True))
+		# one level of the tree at a time, the folders of a level in parallel
+		while jobs:
+			jobs = list(itertools.chain.from_iterable(pool.map(run.process, jobs)))
+	finally:
+		pool.close()
+		pool.join()
+		os.umask(old_umask)
+	stats = dict(run.stats)
+	stats["entities"] = len(entities)
+	stats["seconds"] = time.time() - started
+	return stats
+
+
+def sequence_entities(sequence, shots, steps=None):
+	"""
+	Return a Sequence entity and its shots, as test data for a new sequence.
+
+	:param sequence: Sequence code
+	:param shots:    Number of shots, numbered by tens
+	:param steps:    Step short names given to every entity
+	"""
+	steps = list(steps or [])
+	entities = [{"type": "Sequence", "code": sequence, "steps": steps}]
+	for number in range(shots):
+		entities.append({"type": "Shot", "code": "%s_s%03d" % (sequence, (number + 1) * 10),
+						 "sg_sequence": {"type": "Sequence", "name": sequence}, "steps": steps})
+	return entities
+
+
+def main(argv=None):
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Create the schema folders of a sequence of shots.")
+	parser.add_argument("project_root", help="project folder to create the folders in")
+	parser.add_argument("--schema", help="schema folder, the one of this configuration by default")
+	parser.add_argument("--sequence", default="q010", help="sequence code")
+	parser.add_argument("--shots", type=int, default=80, help="number of shots")
+	parser.add_argument("--steps", nargs="*", default=[], help="step short names of every shot")
+	parser.add_argument("--engine", help="engine the deferred folders are created for, e.g. tk-maya")
+	parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+	args = parser.parse_args(argv)
+
+	entities = sequence_entities(args.sequence, args.shots, args.steps)
+	stats = materialize(entities, args.project_root, args.engine, args.workers, args.schema)
+	for name in sorted(stats):
+		print("%-18s %s" % (name, stats[name]))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,331 @@
+"""
+Instrumentation of the Shotgun connection used by the hooks.
+
+The InstrumentedShotgun wraps a Shotgun connection and records every call made
+through it: the method, the entity type, the shape of the filters (field and
+operator, values replaced by their type), the latency, the size of the request
+and response payloads and the hook the call came from.
+
+install() swaps the connection of a Tank instance for an instrumented one, so
+hooks keep using self.parent.shotgun / tk.shotgun without any change. It is
+done from the pick_environment core hook when the RTS_SG_PROFILE environment
+variable is set. At the end of the session a JSON report and a summary table
+are written to RTS_SG_PROFILE_DIR (the temp folder by default):
+
+	sg_calls_<date>_<pid>.json
+	sg_calls_<date>_<pid>.txt
+
+The summary groups the calls per hook, method, entity type and filter shape.
+Groups repeated more often than RTS_SG_PROFILE_REPEAT (20 by default) within
+a session are listed as N+1 suspects: a query issued once per item of a loop
+instead of once for the whole loop.
+"""
+
+import atexit
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ENABLE_ENV = "RTS_SG_PROFILE"
+REPORT_DIR_ENV = "RTS_SG_PROFILE_DIR"
+REPEAT_ENV = "RTS_SG_PROFILE_REPEAT"
+
+DEFAULT_REPEAT_THRESHOLD = 20
+
+# folders holding the hook files, used to attribute calls to a hook
+_LIB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_HOOKS_ROOT = os.path.dirname(_LIB_ROOT)
+_CORE_HOOKS_ROOT = os.path.join(os.path.dirname(_HOOKS_ROOT), "core", "hooks")
+
+# methods taking an entity type as first argument
+_ENTITY_METHODS = set(["find", "find_one", "create", "update", "delete", "revive", "upload",
+					   "upload_thumbnail", "upload_filmstrip_thumbnail", "summarize", "follow",
+					   "unfollow", "followers", "share_thumbnail"])
+
+# methods taking filters as second argument
+_FILTER_METHODS = set(["find", "find_one", "summarize"])
+
+_recorder = None
+
+
+def enabled():
+	"""
+	Return True if Shotgun call profiling was requested for this session.
+	"""
+	return bool(os.environ.get(ENABLE_ENV))
+
+
+def get_recorder():
+	"""
+	Return the session recorder, creating it on first use.
+	"""
+	global _recorder
+	if _recorder is None:
+		_recorder = Recorder()
+		atexit.register(_recorder.write_report)
+	return _recorder
+
+
+def install(tk):
+	"""
+	Replace the Shotgun connection of a Tank instance with an instrumented one.
+	Calling it more than once is harmless.
+
+	:param tk: Tank API instance, e.g. self.parent from a core hook
+	:returns:  The instrumented connection
+	"""
+	sg = tk.shotgun
+	if isinstance(sg, InstrumentedShotgun):
+		return sg
+	wrapped = InstrumentedShotgun(sg, get_recorder())
+	replace_connection(tk, wrapped)
+	return wrapped
+
+
+# name mangled private members the Tank class keeps its connection in
+_CONNECTION_ATTRIBUTES = ("_Tank__sg", "_TankApi__sg", "_Sgtk__sg")
+
+
+def current_connection(tk):
+	"""
+	Return the Shotgun connection a Tank instance holds, None if it did not
+	connect yet. Unlike tk.shotgun, never connects.
+	"""
+	for attribute in _CONNECTION_ATTRIBUTES:
+		if hasattr(tk, attribute):
+			return getattr(tk, attribute)
+	raise AttributeError("Can not find the Shotgun connection of %r" % tk)
+
+
+def replace_connection(tk, sg, connect=True):
+	"""
+	Make a Tank instance hand out another Shotgun connection object, so that
+	self.parent.shotgun and tk.shotgun return it from then on.
+
+	:param tk:      Tank API instance
+	:param sg:      Object to use as the Shotgun connection
+	:param connect: Create the live connection first, so that tk does not
+	                create it again later. False for a connection standing
+	                in for the site altogether.
+	"""
+	if connect:
+		tk.shotgun
+	for attribute in _CONNECTION_ATTRIBUTES:
+		if hasattr(tk, attribute):
+			setattr(tk, attribute, sg)
+			return
+	raise AttributeError("Can not find the Shotgun connection of %r" % tk)
+
+
+def filter_shape(filters):
+	"""
+	Return the filters with every value replaced by a description of its type,
+	so that queries only differing in their values compare equal.
+	"""
+	if filters is None:
+		return None
+	if isinstance(filters, dict):
+		return {"filter_operator": filters.get("filter_operator"),
+				"filters": filter_shape(filters.get("filters", []))}
+	shape = []
+	for flt in filters:
+		if isinstance(flt, dict):
+			shape.append(filter_shape(flt))
+		elif isinstance(flt, (list, tuple)) and len(flt) >= 2:
+			shape.append([flt[0], flt[1]] + [_value_shape(v) for v in flt[2:]])
+		else:
+			shape.append(_value_shape(flt))
+	return shape
+
+
+def _value_shape(value):
+	if isinstance(value, dict):
+		if "type" in value:
+			return "<%s>" % value["type"]
+		return "<dict>"
+	if isinstance(value, (list, tuple)):
+		return "<list>"
+	if value is None:
+		return None
+	return "<%s>" % type(value).__name__
+
+
+def _payload_size(value):
+	try:
+		return len(json.dumps(value, default=str))
+	except (TypeError, ValueError):
+		return 0
+
+
+def calling_hook():
+	"""
+	Return 'hook_file.function' for the innermost hook frame on the stack.
+	"""
+	frame = sys._getframe(1)
+	while frame is not None:
+		filename = os.path.abspath(frame.f_code.co_filename)
+		folder = os.path.dirname(filename)
+		if folder in (_HOOKS_ROOT, _CORE_HOOKS_ROOT):
+			hook = os.path.splitext(os.path.basename(filename))[0]
+			return "%s.%s" % (hook, frame.f_code.co_name)
+		frame = frame.f_back
+	return "<not a hook>"
+
+
+class Recorder(object):
+	"""
+	Collects the calls made through instrumented connections.
+	"""
+
+	def __init__(self):
+		self.calls = []
+		self.started = time.time()
+		self._lock = threading.Lock()
+
+	def record(self, call):
+		with self._lock:
+			self.calls.append(call)
+
+	def groups(self):
+		"""
+		Return the calls grouped by hook, method, entity type and filter shape,
+		most expensive group first.
+		"""
+		groups = {}
+		for call in self.calls:
+			key = (call["hook"], call["method"], call["entity_type"],
+				   json.dumps(call["filter_shape"], sort_keys=True))
+			group = groups.get(key)
+			if group is None:
+				group = groups[key] = {"hook": call["hook"], "method": call["method"],
+									   "entity_type": call["entity_type"],
+									   "filter_shape": call["filter_shape"],
+									   "count": 0, "seconds": 0.0, "response_bytes": 0}
+			group["count"] += 1
+			group["seconds"] += call["seconds"]
+			group["response_bytes"] += call["response_bytes"]
+		return sorted(groups.values(), key=lambda g: g["seconds"], reverse=True)
+
+	def repeated(self, threshold=None):
+		"""
+		Return the groups issued at least threshold times, the N+1 suspects.
+		"""
+		if threshold is None:
+			threshold = int(os.environ.get(REPEAT_ENV, DEFAULT_REPEAT_THRESHOLD))
+		return [g for g in self.groups() if g["method"] in _FILTER_METHODS and g["count"] >= threshold]
+
+	def report(self):
+		"""
+		Return the session report as a JSON serializable dictionary.
+		"""
+		total = sum(c["seconds"] for c in self.calls)
+		return {"started": datetime.datetime.fromtimestamp(self.started).isoformat(),
+				"pid": os.getpid(),
+				"total_calls": len(self.calls),
+				"total_seconds": total,
+				"groups": self.groups(),
+				"n_plus_one_suspects": self.repeated(),
+				"calls": self.calls}
+
+	def summary_table(self, limit=40):
+		"""
+		Return the grouped calls as a plain text table.
+		"""
+		lines = ["%-50s %-10s %-16s %6s %9s %10s" % ("hook", "method", "entity type", "calls", "seconds", "kbytes"),
+				 "-" * 106]
+		for group in self.groups()[:limit]:
+			lines.append("%-50s %-10s %-16s %6d %9.3f %10.1f" % (group["hook"][:50], group["method"],
+																  (group["entity_type"] or "")[:16],
+																  group["count"], group["seconds"],
+																  group["response_bytes"] / 1024.0))
+		suspects = self.repeated()
+		if suspects:
+			lines.append("")
+			lines.append("N+1 suspects (same query shape issued repeatedly):")
+			for group in suspects:
+				lines.append("  %dx %s %s %s in %s" % (group["count"], group["method"], group["entity_type"],
+													   json.dumps(group["filter_shape"]), group["hook"]))
+		return "\n".join(lines)
+
+	def write_report(self, folder=None):
+		"""
+		Write the JSON report and the summary table of this session.
+
+		:param folder: Target folder, RTS_SG_PROFILE_DIR or the temp folder by default
+		:returns:      Path of the JSON report, None if nothing was recorded
+		"""
+		if not self.calls:
+			return None
+		folder = folder or os.environ.get(REPORT_DIR_ENV) or tempfile.gettempdir()
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+		stamp = datetime.datetime.fromtimestamp(self.started).strftime("%Y%m%d_%H%M%S")
+		base = os.path.join(folder, "sg_calls_%s_%d" % (stamp, os.getpid()))
+		with open(base + ".json", "w") as target:
+			json.dump(self.report(), target, indent=1, default=str)
+		with open(base + ".txt", "w") as target:
+			target.write(self.summary_table())
+			target.write("\n")
+		return base + ".json"
+
+
+class InstrumentedShotgun(object):
+	"""
+	Shotgun connection wrapper recording every method call.
+	"""
+
+	def __init__(self, sg, recorder=None):
+		self._sg = sg
+		self._recorder = recorder or get_recorder()
+
+	@property
+	def wrapped(self):
+		"""
+		The connection being instrumented.
+		"""
+		return self._sg
+
+	def __getattr__(self, name):
+		attribute = getattr(self._sg, name)
+		if name.startswith("_") or not callable(attribute):
+			return attribute
+
+		def instrumented(*args, **kwargs):
+			return self._call(name, attribute, args, kwargs)
+		instrumented.__name__ = name
+		return instrumented
+
+	def _call(self, name, method, args, kwargs):
+		entity_type = None
+		if name in _ENTITY_METHODS and args:
+			entity_type = args[0]
+		elif name == "batch" and args:
+			entity_type = ",".join(sorted(set(r.get("entity_type", "") for r in args[0])))
+
+		filters = None
+		if name in _FILTER_METHODS:
+			filters = args[1] if len(args) > 1 else kwargs.get("filters")
+
+		started = time.time()
+		error = None
+		result = None
+		try:
+			result = method(*args, **kwargs)
+			return result
+		except Exception as e:
+			error = str(e)
+			raise
+		finally:
+			self._recorder.record({"method": name,
+								   "entity_type": entity_type,
+								   "filter_shape": filter_shape(filters),
+								   "started": started - self._recorder.started,
+								   "seconds": time.time() - started,
+								   "request_bytes": _payload_size([args, kwargs]),
+								   "response_bytes": _payload_size(result),
+								   "hook": calling_hook(),
+								   "error": error})
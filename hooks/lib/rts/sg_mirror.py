@@ -0,0 +1,640 @@
+"""
+Local SQLite mirror of the project entities the hooks read over and over.
+
+Scans, validations and loader actions keep asking Shotgun for the same data:
+the Shots of a Sequence with their cut fields, Assets by code and type, Tasks
+by entity and step and the latest PublishedFiles. The ShotgunMirror keeps a
+copy of those entity types on local disk and answers find()/find_one() from
+it, so these reads no longer pay the site round-trip.
+
+The mirror is refreshed incrementally. Every entity type keeps an updated_at
+watermark and only records changed since that watermark are pulled. Retired
+entities are picked up from the event log. Anything the mirror can not answer
+(an entity type or field that is not mirrored, an unsupported filter operator)
+is passed on to the live connection untouched, so the mirror can be dropped in
+where a hook uses self.parent.shotgun for reads:
+
+	sg = sg_mirror.get_mirror(self.parent.shotgun, self.parent.context.project)
+	shots = sg.find("Shot", [["sg_sequence", "is", sequence]], ["code", "sg_cut_in"])
+
+Staleness bound: a read never returns data older than max_staleness seconds
+(default 300, see STALENESS_ENV), plus the time one refresh takes. Every
+entity type is refreshed on its own, by the first read of that type after the
+window has passed, or explicitly with refresh(). Writes made through the
+mirror (create/update) go to Shotgun first and are applied to the local copy
+straight away, so the session that made them always sees its own changes.
+
+Writes made by other sessions, or through another connection, show up after
+the staleness window only, except for entities created since: a read finding
+nothing refreshes its entity type once before answering. Reads deciding
+whether to create an entity, or needing values edited minutes ago such as cut
+ranges or the latest publishes, stay on the live connection. The mirror
+answers the lookups of values that do not change once set, the type of an
+asset, the step of a task, the id of a sequence.
+
+The database is kept in a per-user folder (see user_cache.py), or in memory
+for the session when that folder or file is not the user's own.
+"""
+
+import calendar
+import copy
+import datetime
+import json
+import os
+import sqlite3
+import time
+
+from rts import user_cache
+
+# entity types that are mirrored, with the fields kept for each of them.
+# type, id, project and updated_at are always stored.
+MIRRORED_FIELDS = {
+	"Sequence": ["code", "sg_status_list"],
+	"Shot": ["code", "sg_sequence", "sg_cut_order", "sg_cut_in", "sg_cut_out",
+			 "sg_cut_duration", "sg_status_list", "parent_shots"],
+	"Asset": ["code", "sg_asset_type", "sg_status_list", "parents"],
+	"Task": ["content", "entity", "step", "step.Step.short_name", "sg_short_name",
+			 "sg_status_list"],
+	"PublishedFile": ["code", "name", "entity", "task", "task.Task.sg_short_name",
+					  "version_number", "path", "published_file_type",
+					  "published_file_type.PublishedFileType.code", "description",
+					  "created_by", "created_at", "tag_list"],
+}
+
+ALWAYS_STORED = ["project", "updated_at"]
+
+# environment variables used to override the defaults
+DB_DIR_ENV = "RTS_SG_MIRROR_DIR"
+STALENESS_ENV = "RTS_SG_MIRROR_STALENESS"
+
+DEFAULT_MAX_STALENESS = 300.0
+# a read finding nothing refreshes its type when refreshed longer ago than this
+MISS_REFRESH_AGE = 1.0
+
+# updated_at only has a one second resolution in Shotgun, so the incremental
+# query reaches back a little to not miss records changed in the same second
+# as the previous refresh.
+WATERMARK_OVERLAP = 1.0
+
+_SCHEMA = [
+	"CREATE TABLE IF NOT EXISTS entity (type TEXT, id INTEGER, data TEXT, PRIMARY KEY (type, id))",
+	"CREATE TABLE IF NOT EXISTS sync_state (type TEXT PRIMARY KEY, watermark REAL, synced_at REAL)",
+	"CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+]
+
+_mirrors = {}
+
+
+def get_mirror(sg, project, db_path=None, max_staleness=None):
+	"""
+	Return the process wide mirror for a project, creating it on first use.
+
+	:param sg:            Shotgun connection, typically self.parent.shotgun
+	:param project:       Project entity dictionary
+	:param db_path:       Optional path of the SQLite file
+	:param max_staleness: Optional staleness bound in seconds
+	:returns:             ShotgunMirror instance, the connection itself while
+	                      Shotgun calls are recorded or replayed
+	"""
+	from rts import sg_replay
+	if os.environ.get(sg_replay.RECORD_ENV) or os.environ.get(sg_replay.REPLAY_ENV):
+		# the refresh queries depend on the local database, they would not replay
+		return sg
+	mirror = _mirrors.get(project["id"])
+	if mirror is None:
+		mirror = ShotgunMirror(sg, project, db_path=db_path, max_staleness=max_staleness)
+		_mirrors[project["id"]] = mirror
+	return mirror
+
+
+def default_db_path(project_id):
+	"""
+	Return the default location of the mirror database for a project.
+	"""
+	return os.path.join(user_cache.cache_folder("sg_mirror", DB_DIR_ENV), "project_%d.sqlite" % project_id)
+
+
+class ShotgunMirror(object):
+	"""
+	Read-mostly local copy of the mirrored entity types of one project.
+	"""
+
+	def __init__(self, sg, project, db_path=None, max_staleness=None):
+		"""
+		:param sg:            Live Shotgun connection used for refreshes and fallbacks
+		:param project:       Project entity dictionary
+		:param db_path:       Path of the SQLite file, see default_db_path()
+		:param max_staleness: Maximum age in seconds of the data returned by a read
+		"""
+		self._sg = sg
+		self._project = {"type": "Project", "id": project["id"]}
+		if max_staleness is None:
+			max_staleness = float(os.environ.get(STALENESS_ENV, DEFAULT_MAX_STALENESS))
+		self.max_staleness = max_staleness
+		self.db_path = db_path or default_db_path(project["id"])
+
+		if self.db_path != ":memory:":
+			db_folder = os.path.dirname(self.db_path)
+			if not user_cache.ensure_private(db_folder or ".") or \
+					(os.path.exists(self.db_path) and not user_cache.trusted(self.db_path)):
+				# records written by someone else would be answered as Shotgun's
+				self.db_path = ":memory:"
+		self._db = sqlite3.connect(self.db_path, timeout=30)
+		for statement in _SCHEMA:
+			self._db.execute(statement)
+		self._db.commit()
+
+		# entity type -> {id: record}, loaded lazily from the database
+		self._records = {}
+		# (entity type, field) -> {value key: set of ids}
+		self._indexes = {}
+		# entity type -> time of its last refresh
+		self._synced_at = None
+
+		self.stats = {"local": 0, "fallback": 0, "refreshes": 0, "fetched": 0, "retired": 0, "miss_refreshes": 0}
+
+	##############################################################################################################
+	# shotgun api compatible interface
+
+	def find(self, entity_type, filters, fields=None, order=None, filter_operator=None, limit=0, **kwargs):
+		"""
+		Same signature and result as Shotgun.find(). Served from the mirror
+		when possible, from the live connection otherwise.
+		"""
+		if kwargs or not self.can_answer(entity_type, filters, fields, order):
+			self.stats["fallback"] += 1
+			return self._sg.find(entity_type, filters, fields, order=order, filter_operator=filter_operator,
+								 limit=limit, **kwargs)
+
+		self.ensure_fresh([entity_type])
+		self.stats["local"] += 1
+		found = self._find_local(entity_type, filters, fields, order, filter_operator, limit)
+		if not found and self.age(entity_type) > MISS_REFRESH_AGE:
+			# the entity may have been created since the last refresh
+			self.stats["miss_refreshes"] += 1
+			self.refresh([entity_type])
+			found = self._find_local(entity_type, filters, fields, order, filter_operator, limit)
+		return found
+
+	def _find_local(self, entity_type, filters, fields, order, filter_operator, limit):
+		records = self._load(entity_type)
+		candidates = [records[r] for r in self._candidates(entity_type, filters, filter_operator)]
+		return find_in_records(candidates, filters, fields, order=order, filter_operator=filter_operator,
+							   limit=limit)
+
+	def find_one(self, entity_type, filters, fields=None, order=None, filter_operator=None, **kwargs):
+		"""
+		Same signature and result as Shotgun.find_one().
+		"""
+		result = self.find(entity_type, filters, fields, order=order, filter_operator=filter_operator,
+						   limit=1, **kwargs)
+		if result:
+			return result[0]
+		return None
+
+	def create(self, entity_type, data, return_fields=None, **kwargs):
+		"""
+		Create the entity in Shotgun and add it to the mirror.
+		"""
+		result = self._sg.create(entity_type, data, return_fields=self._write_fields(entity_type, return_fields),
+								 **kwargs)
+		self._apply_write(entity_type, result)
+		return result
+
+	def update(self, entity_type, entity_id, data, **kwargs):
+		"""
+		Update the entity in Shotgun and in the mirror.
+		"""
+		result = self._sg.update(entity_type, entity_id, data, **kwargs)
+		self._apply_write(entity_type, result)
+		return result
+
+	def __getattr__(self, name):
+		# everything else (upload, batch, schema calls, ...) goes straight to Shotgun
+		return getattr(self._sg, name)
+
+	##############################################################################################################
+	# mirror specific interface
+
+	def can_answer(self, entity_type, filters, fields=None, order=None):
+		"""
+		Return True if a query only uses mirrored entity types, fields and
+		supported filter operators.
+		"""
+		mirrored = MIRRORED_FIELDS.get(entity_type)
+		if mirrored is None:
+			return False
+		known = set(mirrored + ALWAYS_STORED + ["id", "type"])
+		for field in fields or []:
+			if field not in known:
+				return False
+		for sort in order or []:
+			if sort.get("field_name") not in known:
+				return False
+		return filters_supported(filters, known)
+
+	def ensure_fresh(self, entity_types=None):
+		"""
+		Refresh the entity types whose last refresh is older than the staleness
+		bound.
+
+		:param entity_types: Entity types about to be read, all mirrored types by default
+		"""
+		synced = self._synced()
+		now = time.time()
+		stale = [entity_type for entity_type in entity_types or sorted(MIRRORED_FIELDS)
+				 if synced.get(entity_type) is None or now - synced[entity_type] > self.max_staleness]
+		if stale:
+			self.refresh(stale)
+
+	def refresh(self, entity_types=None):
+		"""
+		Pull everything changed since the last refresh from Shotgun.
+
+		:param entity_types: Optional list of entity types to refresh, all mirrored types by default
+		:returns:            Number of records fetched
+		"""
+		entity_types = sorted(entity_types or MIRRORED_FIELDS)
+		started = time.time()
+		fetched = 0
+		for entity_type in entity_types:
+			fetched += self._refresh_type(entity_type, started)
+		self._process_event_log(entity_types)
+		self._db.commit()
+
+		synced = self._synced()
+		for entity_type in entity_types:
+			synced[entity_type] = started
+		self.stats["refreshes"] += 1
+		self.stats["fetched"] += fetched
+		return fetched
+
+	def age(self, entity_type=None):
+		"""
+		Return the number of seconds since the last refresh of an entity type,
+		of the least recently refreshed one by default, None if never refreshed.
+		"""
+		synced = self._synced()
+		if entity_type is not None:
+			times = [synced.get(entity_type)]
+		else:
+			times = [synced.get(t) for t in MIRRORED_FIELDS]
+		if None in times:
+			return None
+		return time.time() - min(times)
+
+	def latest(self, entity_type, filters, fields=None, version_field="version_number"):
+		"""
+		Return the record with the highest version among the ones matching the
+		filters, the way the hooks look for the latest PublishedFile.
+		"""
+		fields = list(fields or [])
+		if version_field not in fields:
+			fields.append(version_field)
+		order = [{"field_name": version_field, "direction": "desc"}]
+		return self.find_one(entity_type, filters, fields, order=order)
+
+	def close(self):
+		"""
+		Close the database connection.
+		"""
+		self._db.close()
+		if _mirrors.get(self._project["id"]) is self:
+			del _mirrors[self._project["id"]]
+
+	##############################################################################################################
+	# refresh
+
+	def _refresh_type(self, entity_type, started):
+		row = self._db.execute("SELECT watermark FROM sync_state WHERE type = ?", (entity_type,)).fetchone()
+		filters = [["project", "is", self._project]]
+		if row and row[0] is not None:
+			since = datetime.datetime.fromtimestamp(row[0] - WATERMARK_OVERLAP)
+			filters.append(["updated_at", "greater_than", since])
+		watermark = row[0] if row else None
+
+		fields = MIRRORED_FIELDS[entity_type] + ALWAYS_STORED
+		changed = self._sg.find(entity_type, filters, fields)
+		for record in changed:
+			self._store(entity_type, record)
+			updated = _to_epoch(record.get("updated_at"))
+			if updated is not None and (watermark is None or updated > watermark):
+				watermark = updated
+		if watermark is None:
+			# nothing in Shotgun yet, start from now
+			watermark = started
+
+		self._db.execute("INSERT OR REPLACE INTO sync_state (type, watermark, synced_at) VALUES (?, ?, ?)",
+						 (entity_type, watermark, started))
+		return len(changed)
+
+	def _process_event_log(self, entity_types):
+		# every entity type keeps the id of the last event read for it
+		last_events = dict((entity_type, self._get_meta("last_event_id:%s" % entity_type))
+						   for entity_type in entity_types)
+		first = [entity_type for entity_type in entity_types if last_events[entity_type] is None]
+		if first:
+			# first refresh, everything up to now is already in the records fetched
+			newest = self._sg.find_one("EventLogEntry", [], ["id"], order=[{"field_name": "id", "direction": "desc"}])
+			for entity_type in first:
+				self._set_meta("last_event_id:%s" % entity_type, newest["id"] if newest else 0)
+		known = [entity_type for entity_type in entity_types if last_events[entity_type] is not None]
+		if not known:
+			return
+
+		event_types = []
+		for entity_type in known:
+			event_types.append("Shotgun_%s_Retirement" % entity_type)
+			event_types.append("Shotgun_%s_Revival" % entity_type)
+		since = min(int(last_events[entity_type]) for entity_type in known)
+		filters = [["id", "greater_than", since],
+				   ["event_type", "in", event_types],
+				   ["project", "is", self._project]]
+		events = self._sg.find("EventLogEntry", filters, ["event_type", "meta"],
+							   order=[{"field_name": "id", "direction": "asc"}])
+
+		newest_id = since
+		revived = {}
+		for event in events:
+			newest_id = max(newest_id, event["id"])
+			meta = event.get("meta") or {}
+			entity_type = meta.get("entity_type")
+			entity_id = meta.get("entity_id")
+			if entity_type not in known or entity_id is None:
+				continue
+			if event["id"] <= int(last_events[entity_type]):
+				# already read by an earlier refresh of this type
+				continue
+			if event["event_type"].endswith("_Retirement"):
+				self._delete(entity_type, entity_id)
+				revived.get(entity_type, set()).discard(entity_id)
+				self.stats["retired"] += 1
+			else:
+				revived.setdefault(entity_type, set()).add(entity_id)
+
+		for entity_type, ids in revived.items():
+			if ids:
+				fields = MIRRORED_FIELDS[entity_type] + ALWAYS_STORED
+				for record in self._sg.find(entity_type, [["id", "in", sorted(ids)]], fields):
+					self._store(entity_type, record)
+
+		for entity_type in known:
+			self._set_meta("last_event_id:%s" % entity_type, max(newest_id, int(last_events[entity_type])))
+
+	def _apply_write(self, entity_type, result):
+		if entity_type not in MIRRORED_FIELDS or not result:
+			return
+		existing = self._load(entity_type).get(result["id"], {})
+		merged = dict(existing)
+		merged.update(result)
+		self._store(entity_type, merged)
+		self._db.commit()
+
+	def _write_fields(self, entity_type, return_fields):
+		if entity_type not in MIRRORED_FIELDS:
+			return return_fields
+		fields = list(return_fields or [])
+		for field in MIRRORED_FIELDS[entity_type] + ALWAYS_STORED:
+			if field not in fields:
+				fields.append(field)
+		return fields
+
+	##############################################################################################################
+	# storage
+
+	def _load(self, entity_type):
+		records = self._records.get(entity_type)
+		if records is None:
+			records = {}
+			for entity_id, data in self._db.execute("SELECT id, data FROM entity WHERE type = ?", (entity_type,)):
+				records[entity_id] = json.loads(data)
+			self._records[entity_type] = records
+		return records
+
+	def _store(self, entity_type, record):
+		record = json.loads(json.dumps(record, default=_json_default))
+		self._db.execute("INSERT OR REPLACE INTO entity (type, id, data) VALUES (?, ?, ?)",
+						 (entity_type, record["id"], json.dumps(record)))
+		if entity_type in self._records:
+			self._records[entity_type][record["id"]] = record
+		self._drop_indexes(entity_type)
+
+	def _delete(self, entity_type, entity_id):
+		self._db.execute("DELETE FROM entity WHERE type = ? AND id = ?", (entity_type, entity_id))
+		if entity_type in self._records:
+			self._records[entity_type].pop(entity_id, None)
+		self._drop_indexes(entity_type)
+
+	def _synced(self):
+		if self._synced_at is None:
+			self._synced_at = dict(self._db.execute("SELECT type, synced_at FROM sync_state").fetchall())
+		return self._synced_at
+
+	def _get_meta(self, key):
+		row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+		if row:
+			return row[0]
+		return None
+
+	def _set_meta(self, key, value):
+		self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+	##############################################################################################################
+	# indexes
+
+	def _candidates(self, entity_type, filters, filter_operator):
+		"""
+		Return the ids worth testing against the filters. Uses an equality
+		index on the first top level 'is' filter when the filters are and-ed.
+		"""
+		records = self._load(entity_type)
+		if filter_operator in (None, "all", "and"):
+			for flt in filters:
+				if isinstance(flt, (list, tuple)) and len(flt) == 3 and flt[1] == "is":
+					index = self._index(entity_type, flt[0])
+					if index is not None:
+						return sorted(index.get(_value_key(flt[2]), ()))
+		return sorted(records)
+
+	def _index(self, entity_type, field):
+		key = (entity_type, field)
+		if key not in self._indexes:
+			index = {}
+			for entity_id, record in self._load(entity_type).items():
+				value = record.get(field)
+				if isinstance(value, list):
+					# multi-entity fields match on any of their values
+					for v in value:
+						index.setdefault(_value_key(v), set()).add(entity_id)
+				else:
+					index.setdefault(_value_key(value), set()).add(entity_id)
+			self._indexes[key] = index
+		return self._indexes[key]
+
+	def _drop_indexes(self, entity_type):
+		for key in list(self._indexes):
+			if key[0] == entity_type:
+				del self._indexes[key]
+
+
+##############################################################################################################
+# filter evaluation
+
+def find_in_records(records, filters, fields=None, order=None, filter_operator=None, limit=0):
+	"""
+	Evaluate a Shotgun find() query against a list of entity dictionaries.
+
+	:param records:         Entity dictionaries holding at least type, id and the queried fields
+	:param filters:         Shotgun filters, see filters_supported() for the operators handled
+	:param fields:          Fields to return besides type and id
+	:param order:           Shotgun order specification
+	:param filter_operator: 'all' (default) or 'any'
+	:param limit:           Maximum number of records to return, 0 for all
+	:returns:               List of copies of the matching records
+	"""
+	found = [r for r in records if match_filters(r, filters, filter_operator)]
+	if order:
+		for sort in reversed(order):
+			field = sort["field_name"]
+			found.sort(key=lambda r: _sort_key(r.get(field)), reverse=(sort.get("direction") == "desc"))
+	else:
+		found.sort(key=lambda r: r["id"])
+	if limit:
+		found = found[:limit]
+	return [_project_fields(r, fields) for r in found]
+
+
+def match_filters(record, filters, filter_operator=None):
+	"""
+	Return True if an entity dictionary matches Shotgun filters.
+	"""
+	return _match_group(record, {"filter_operator": filter_operator or "all", "filters": filters})
+
+
+_SUPPORTED_OPERATORS = set(["is", "is_not", "in", "not_in", "starts_with", "ends_with", "contains",
+							"not_contains", "greater_than", "less_than"])
+
+
+def filters_supported(filters, known=None):
+	"""
+	Return True if the filters only use operators find_in_records() handles
+	and, when known is given, only fields from that set.
+	"""
+	for flt in filters:
+		if isinstance(flt, dict):
+			if not filters_supported(flt.get("filters", []), known):
+				return False
+		elif len(flt) < 3 or (known is not None and flt[0] not in known) or flt[1] not in _SUPPORTED_OPERATORS:
+			return False
+		elif flt[0] in ("updated_at", "created_at") and flt[1] in ("greater_than", "less_than"):
+			# stored as strings, comparisons against datetimes are left to Shotgun
+			return False
+	return True
+
+
+def _match_group(record, group):
+	operator = group.get("filter_operator", "all")
+	results = (_match_filter(record, flt) for flt in group.get("filters", []))
+	if operator in ("any", "or"):
+		return any(results)
+	return all(results)
+
+
+def _match_filter(record, flt):
+	if isinstance(flt, dict):
+		return _match_group(record, flt)
+
+	field, operator = flt[0], flt[1]
+	values = list(flt[2:])
+	if operator in ("in", "not_in") and len(values) == 1 and isinstance(values[0], (list, tuple)):
+		values = list(values[0])
+	value = values[0] if values else None
+	current = record.get(field)
+
+	if isinstance(current, list) and operator in ("is", "is_not", "in", "not_in"):
+		# multi-entity field: 'is' matches when any linked entity matches
+		keys = set(_value_key(v) for v in current)
+		wanted = set(_value_key(v) for v in values)
+		hit = bool(keys & wanted)
+		return hit if operator in ("is", "in") else not hit
+
+	if operator == "is":
+		return _value_key(current) == _value_key(value)
+	if operator == "is_not":
+		return _value_key(current) != _value_key(value)
+	if operator == "in":
+		return _value_key(current) in set(_value_key(v) for v in values)
+	if operator == "not_in":
+		return _value_key(current) not in set(_value_key(v) for v in values)
+	if current is None:
+		return False
+	if operator == "greater_than":
+		return current > value
+	if operator == "less_than":
+		return current < value
+
+	text = current.get("name") if isinstance(current, dict) else current
+	if not isinstance(text, _string_types):
+		return False
+	text = text.lower()
+	value = (value or "").lower()
+	if operator == "starts_with":
+		return text.startswith(value)
+	if operator == "ends_with":
+		return text.endswith(value)
+	if operator == "contains":
+		return value in text
+	if operator == "not_contains":
+		return value not in text
+	return False
+
+
+def _value_key(value):
+	"""
+	Return a hashable key comparing entities by type and id only.
+	"""
+	if isinstance(value, dict):
+		if "id" in value:
+			return ("entity", value.get("type"), value["id"])
+		return json.dumps(value, sort_keys=True)
+	if isinstance(value, list):
+		return tuple(_value_key(v) for v in value)
+	if isinstance(value, _string_types):
+		return value.lower()
+	return value
+
+
+def _sort_key(value):
+	# None sorts first and mixed types do not raise on python 3
+	if value is None:
+		return (0, 0)
+	if isinstance(value, dict):
+		return (1, value.get("name") or "")
+	return (1, value)
+
+
+def _project_fields(record, fields):
+	result = {"type": record["type"], "id": record["id"]}
+	for field in fields or []:
+		result[field] = copy.deepcopy(record.get(field))
+	return result
+
+
+def _to_epoch(value):
+	if isinstance(value, datetime.datetime):
+		if value.tzinfo is not None:
+			return float(calendar.timegm(value.utctimetuple()))
+		return time.mktime(value.timetuple())
+	return None
+
+
+def _json_default(value):
+	if isinstance(value, (datetime.datetime, datetime.date)):
+		return value.isoformat()
+	raise TypeError("%r is not JSON serializable" % (value,))
+
+
+try:
+	_string_types = (str, unicode)
+except NameError:
+	_string_types = (str,)
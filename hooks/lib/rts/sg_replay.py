@@ -0,0 +1,447 @@
+"""
+Record/replay Shotgun stand-in for running the hooks offline.
+
+RecordingShotgun wraps a live connection for one publish session and writes
+every find/find_one/create/update/delete/batch/upload call, with its result
+and latency, to a JSON fixture file. ReplayShotgun reads such a fixture back
+and answers the same calls without a site:
+
+- A query recorded in the fixture returns the recorded result. A query
+  recorded several times returns the recorded results in order.
+- Writes (create/update/delete/batch) are applied to an in-memory store seeded
+  with every entity seen in the fixture. Queries that were not recorded, or
+  that touch an entity type written during the replay, are evaluated against
+  that store.
+- Uploads are accepted without reading the file.
+- Every call can be given an injected latency: a fixed number of seconds plus
+  a multiple of the latency measured while recording.
+
+Both objects have the interface of a Shotgun connection, so the hooks use
+them unchanged. The local Shotgun mirror is bypassed while recording or
+replaying: its refresh queries depend on the state of its database, which
+would make the recorded calls differ from the replayed ones. install() hands
+one to a tk instance, which is what the pick_environment core hook does when
+RTS_SG_RECORD or RTS_SG_REPLAY holds a fixture path. A benchmark harness can
+also pass one as self.parent.shotgun. stats counts the calls served and the
+latency simulated, once per call, a batch and its requests being one call, so
+two runs of the same fixture show what a batching or caching change saves.
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import os
+import threading
+import time
+
+from rts import sg_instrument
+from rts import sg_mirror
+
+RECORD_ENV = "RTS_SG_RECORD"
+REPLAY_ENV = "RTS_SG_REPLAY"
+LATENCY_ENV = "RTS_SG_REPLAY_LATENCY"
+
+FIXTURE_VERSION = 1
+
+RECORDED_METHODS = set(["find", "find_one", "create", "update", "delete", "revive", "batch",
+						"upload", "upload_thumbnail", "summarize", "schema_field_read"])
+
+# positional parameter names of the api methods, so that calls passing the same
+# values positionally or by keyword are recognised as the same call
+_PARAMETERS = {
+	"find": ["entity_type", "filters", "fields", "order", "filter_operator", "limit", "retired_only", "page"],
+	"find_one": ["entity_type", "filters", "fields", "order", "filter_operator", "retired_only"],
+	"create": ["entity_type", "data", "return_fields"],
+	"update": ["entity_type", "entity_id", "data", "multi_entity_update_modes"],
+	"delete": ["entity_type", "entity_id"],
+	"revive": ["entity_type", "entity_id"],
+	"batch": ["requests"],
+	"upload": ["entity_type", "entity_id", "path", "field_name", "display_name", "tag_list"],
+	"upload_thumbnail": ["entity_type", "entity_id", "path"],
+	"summarize": ["entity_type", "filters", "summary_fields", "filter_operator", "grouping"],
+	"schema_field_read": ["entity_type", "field_name"],
+}
+
+# ids handed out to entities created during a replay that were not recorded
+FIRST_REPLAY_ID = 9000000
+
+
+class ShotgunReplayError(Exception):
+	"""
+	Raised when a replayed call has no recorded answer and can not be simulated.
+	"""
+
+
+def install(tk):
+	"""
+	Record or replay the Shotgun traffic of a tk instance, depending on the
+	RTS_SG_RECORD / RTS_SG_REPLAY environment variables.
+
+	:param tk: Tank API instance
+	:returns:  The recording or replaying connection, None if neither was requested
+	"""
+	if os.environ.get(REPLAY_ENV):
+		# tk.shotgun would connect to the site, the replay stands in for it
+		current = sg_instrument.current_connection(tk)
+		if isinstance(current, ReplayShotgun):
+			return current
+		latency = float(os.environ.get(LATENCY_ENV, 0.0))
+		sg = ReplayShotgun(os.environ[REPLAY_ENV], latency=latency)
+		sg_instrument.replace_connection(tk, sg, connect=False)
+		return sg
+	elif os.environ.get(RECORD_ENV):
+		if isinstance(tk.shotgun, RecordingShotgun):
+			return tk.shotgun
+		sg = RecordingShotgun(tk.shotgun, os.environ[RECORD_ENV])
+		atexit.register(sg.save)
+	else:
+		return None
+	sg_instrument.replace_connection(tk, sg)
+	return sg
+
+
+def call_key(method, args, kwargs):
+	"""
+	Return a string identifying a call by its method and its arguments.
+	"""
+	names = _PARAMETERS.get(method, [])
+	params = {}
+	for index, value in enumerate(args):
+		name = names[index] if index < len(names) else "arg%d" % index
+		params[name] = value
+	params.update(kwargs)
+	# unset optional arguments do not make a call different
+	params = dict((k, v) for k, v in params.items() if v not in (None, 0, False, [], {}))
+	return json.dumps([method, encode(params)], sort_keys=True)
+
+
+def encode(value):
+	"""
+	Return a JSON serializable copy of a Shotgun value, datetimes included.
+	"""
+	if isinstance(value, datetime.datetime):
+		return {"__datetime__": value.replace(tzinfo=None).isoformat()}
+	if isinstance(value, datetime.date):
+		return {"__date__": value.isoformat()}
+	if isinstance(value, dict):
+		return dict((k, encode(v)) for k, v in value.items())
+	if isinstance(value, (list, tuple)):
+		return [encode(v) for v in value]
+	return value
+
+
+def decode(value):
+	"""
+	Reverse of encode().
+	"""
+	if isinstance(value, dict):
+		if "__datetime__" in value:
+			text = value["__datetime__"]
+			fmt = "%Y-%m-%dT%H:%M:%S.%f" if "." in text else "%Y-%m-%dT%H:%M:%S"
+			return datetime.datetime.strptime(text, fmt)
+		if "__date__" in value:
+			return datetime.datetime.strptime(value["__date__"], "%Y-%m-%d").date()
+		return dict((k, decode(v)) for k, v in value.items())
+	if isinstance(value, list):
+		return [decode(v) for v in value]
+	return value
+
+
+class RecordingShotgun(object):
+	"""
+	Shotgun connection wrapper writing the calls it passes on to a fixture.
+	"""
+
+	def __init__(self, sg, fixture_path):
+		"""
+		:param sg:           Live Shotgun connection
+		:param fixture_path: JSON file the session is written to by save()
+		"""
+		self._sg = sg
+		self.fixture_path = fixture_path
+		self.calls = []
+		self._lock = threading.Lock()
+
+	def __getattr__(self, name):
+		attribute = getattr(self._sg, name)
+		if name not in RECORDED_METHODS:
+			return attribute
+
+		def recorded(*args, **kwargs):
+			started = time.time()
+			error = None
+			result = None
+			try:
+				result = attribute(*args, **kwargs)
+				return result
+			except Exception as e:
+				error = "%s: %s" % (type(e).__name__, e)
+				raise
+			finally:
+				call = {"method": name,
+						"key": call_key(name, args, kwargs),
+						"args": encode(list(args)),
+						"kwargs": encode(kwargs),
+						"result": encode(result),
+						"error": error,
+						"seconds": time.time() - started}
+				with self._lock:
+					self.calls.append(call)
+		recorded.__name__ = name
+		return recorded
+
+	def save(self, fixture_path=None):
+		"""
+		Write the recorded calls to the fixture file.
+
+		:returns: Path of the fixture written
+		"""
+		path = fixture_path or self.fixture_path
+		folder = os.path.dirname(path)
+		if folder and not os.path.exists(folder):
+			os.makedirs(folder)
+		with open(path, "w") as target:
+			json.dump({"version": FIXTURE_VERSION, "base_url": getattr(self._sg, "base_url", ""), "calls": self.calls},
+					  target, indent=1, sort_keys=True)
+		return path
+
+
+class ReplayShotgun(object):
+	"""
+	Offline Shotgun stand-in answering calls from a recorded fixture.
+	"""
+
+	def __init__(self, fixture=None, latency=0.0, latency_scale=0.0, strict=False):
+		"""
+		:param fixture:       Path of a fixture file, or an already loaded fixture dictionary.
+							  None starts from an empty store.
+		:param latency:       Seconds added to every call
+		:param latency_scale: Multiple of the recorded latency added to every call
+		:param strict:        Raise ShotgunReplayError for queries that were not recorded
+							  instead of evaluating them against the store
+		"""
+		if isinstance(fixture, dict):
+			data = fixture
+		elif fixture:
+			with open(fixture, "r") as source:
+				data = json.load(source)
+		else:
+			data = {"version": FIXTURE_VERSION, "calls": []}
+		if data.get("version") != FIXTURE_VERSION:
+			raise ShotgunReplayError("Unsupported fixture version %s" % data.get("version"))
+
+		self.base_url = data.get("base_url", "")
+		self.latency = latency
+		self.latency_scale = latency_scale
+		self.strict = strict
+
+		# call key -> recorded calls, consumed in order
+		self._recorded = {}
+		# entity type -> {id: record}
+		self._store = {}
+		# entity types written to during the replay, their queries use the store
+		self._dirty = set()
+		self._next_id = FIRST_REPLAY_ID
+		self._lock = threading.Lock()
+
+		for call in data["calls"]:
+			self._recorded.setdefault(call["key"], []).append(call)
+			self._seed(decode(call.get("result")))
+
+		self.stats = {"calls": 0, "recorded": 0, "simulated": 0, "writes": 0, "simulated_seconds": 0.0,
+					  "by_method": {}}
+
+	##############################################################################################################
+	# shotgun api
+
+	def find(self, entity_type, filters, fields=None, order=None, filter_operator=None, limit=0, **kwargs):
+		key = call_key("find", [entity_type, filters, fields, order, filter_operator, limit], kwargs)
+		recorded = self._take(key, entity_type)
+		if recorded is not None:
+			return self._answer("find", recorded)
+		return self._simulate("find", lambda: self._query(entity_type, filters, fields, order, filter_operator,
+														  limit))
+
+	def find_one(self, entity_type, filters, fields=None, order=None, filter_operator=None, **kwargs):
+		key = call_key("find_one", [entity_type, filters, fields, order, filter_operator], kwargs)
+		recorded = self._take(key, entity_type)
+		if recorded is not None:
+			return self._answer("find_one", recorded)
+
+		def query():
+			found = self._query(entity_type, filters, fields, order, filter_operator, 1)
+			if found:
+				return found[0]
+			return None
+		return self._simulate("find_one", query)
+
+	def create(self, entity_type, data, return_fields=None, **kwargs):
+		recorded = self._take(call_key("create", [entity_type, data, return_fields], kwargs), None)
+		if recorded is not None:
+			result = self._answer("create", recorded)
+			if result:
+				self._write(entity_type, result["id"], data)
+			return result
+		return self._simulate("create", lambda: self._create(entity_type, data, return_fields))
+
+	def update(self, entity_type, entity_id, data, **kwargs):
+		self._take(call_key("update", [entity_type, entity_id, data], kwargs), None)
+		return self._simulate("update", lambda: self._update(entity_type, entity_id, data))
+
+	def delete(self, entity_type, entity_id):
+		self._take(call_key("delete", [entity_type, entity_id], {}), None)
+		return self._simulate("delete", lambda: self._delete(entity_type, entity_id))
+
+	def batch(self, requests):
+		recorded = self._take(call_key("batch", [requests], {}), None)
+		if recorded is not None:
+			results = self._answer("batch", recorded)
+			# the writes are applied to the store, the created entities with their recorded ids
+			for request, result in zip(requests, results or []):
+				if request["request_type"] == "create" and result:
+					self._write(request["entity_type"], result["id"], request["data"])
+				elif request["request_type"] == "update":
+					self._write(request["entity_type"], request["entity_id"], request["data"])
+				elif request["request_type"] == "delete":
+					self._delete(request["entity_type"], request["entity_id"])
+			return results
+		return self._simulate("batch", lambda: [self._batch_request(request) for request in requests])
+
+	def upload(self, entity_type, entity_id, path, field_name=None, display_name=None, tag_list=None):
+		recorded = self._take(call_key("upload", [entity_type, entity_id, path, field_name, display_name, tag_list],
+									   {}), None)
+		if recorded is not None:
+			return self._answer("upload", recorded)
+		return self._simulate("upload", self._new_id)
+
+	def upload_thumbnail(self, entity_type, entity_id, path, **kwargs):
+		recorded = self._take(call_key("upload_thumbnail", [entity_type, entity_id, path], kwargs), None)
+		if recorded is None:
+			# fixtures may hold the thumbnail as an upload to the image field
+			recorded = self._take(call_key("upload", [entity_type, entity_id, path, "image"], {}), None)
+		if recorded is not None:
+			return self._answer("upload_thumbnail", recorded)
+		return self._simulate("upload_thumbnail", self._new_id)
+
+	def __getattr__(self, name):
+		if name.startswith("_"):
+			raise AttributeError(name)
+
+		def replayed(*args, **kwargs):
+			recorded = self._take(call_key(name, args, kwargs), None)
+			if recorded is None:
+				raise ShotgunReplayError("No recorded answer for %s%r" % (name, args))
+			return self._answer(name, recorded)
+		replayed.__name__ = name
+		return replayed
+
+	##############################################################################################################
+	# internals
+
+	def _take(self, key, entity_type):
+		"""
+		Return the next recorded call for a key, None if the call has to be simulated.
+		"""
+		if entity_type is not None and entity_type in self._dirty:
+			# the recorded answer does not know about the writes made since
+			return None
+		with self._lock:
+			calls = self._recorded.get(key)
+			if not calls:
+				return None
+			if len(calls) > 1:
+				return calls.pop(0)
+			# the last answer keeps being replayed for repeated calls
+			return calls[0]
+
+	def _answer(self, method, call):
+		self._count(method, "recorded", self.latency + self.latency_scale * call.get("seconds", 0.0))
+		if call.get("error"):
+			raise ShotgunReplayError("Recorded failure: %s" % call["error"])
+		return decode(call.get("result"))
+
+	def _simulate(self, method, operation):
+		if self.strict and method in ("find", "find_one"):
+			raise ShotgunReplayError("Query not recorded in strict replay")
+		self._count(method, "simulated", self.latency)
+		return operation()
+
+	def _count(self, method, source, latency):
+		if latency:
+			time.sleep(latency)
+		with self._lock:
+			self.stats["calls"] += 1
+			self.stats[source] += 1
+			if method in ("create", "update", "delete", "batch"):
+				self.stats["writes"] += 1
+			self.stats["simulated_seconds"] += latency
+			self.stats["by_method"][method] = self.stats["by_method"].get(method, 0) + 1
+
+	def _new_id(self):
+		with self._lock:
+			new_id = self._next_id
+			self._next_id += 1
+		return new_id
+
+	def _create(self, entity_type, data, return_fields=None):
+		return self._result(entity_type, self._write(entity_type, self._new_id(), data), return_fields, data)
+
+	def _update(self, entity_type, entity_id, data):
+		self._write(entity_type, entity_id, data)
+		result = {"type": entity_type, "id": entity_id}
+		result.update(copy.deepcopy(data))
+		return result
+
+	def _delete(self, entity_type, entity_id):
+		self._dirty.add(entity_type)
+		return self._store.get(entity_type, {}).pop(entity_id, None) is not None
+
+	def _batch_request(self, request):
+		"""
+		Simulate one request of a batch, counted with the batch.
+		"""
+		request_type = request["request_type"]
+		if request_type == "create":
+			return self._create(request["entity_type"], request["data"], request.get("return_fields"))
+		elif request_type == "update":
+			return self._update(request["entity_type"], request["entity_id"], request["data"])
+		elif request_type == "delete":
+			return self._delete(request["entity_type"], request["entity_id"])
+		raise ShotgunReplayError("Unknown batch request type %s" % request_type)
+
+	def _query(self, entity_type, filters, fields, order, filter_operator, limit):
+		if not sg_mirror.filters_supported(filters):
+			raise ShotgunReplayError("Can not evaluate filters %r offline" % (filters,))
+		records = list(self._store.get(entity_type, {}).values())
+		return sg_mirror.find_in_records(records, filters, fields, order=order, filter_operator=filter_operator,
+										 limit=limit)
+
+	def _write(self, entity_type, entity_id, data):
+		self._dirty.add(entity_type)
+		records = self._store.setdefault(entity_type, {})
+		record = records.setdefault(entity_id, {"type": entity_type, "id": entity_id})
+		record.update(copy.deepcopy(data))
+		return record
+
+	def _result(self, entity_type, record, return_fields, data):
+		result = {"type": entity_type, "id": record["id"]}
+		for field in list(data) + list(return_fields or []):
+			result[field] = copy.deepcopy(record.get(field))
+		return result
+
+	def _seed(self, value):
+		"""
+		Add every entity found in a recorded result to the store.
+		"""
+		if isinstance(value, list):
+			for v in value:
+				self._seed(v)
+		elif isinstance(value, dict) and "type" in value and isinstance(value.get("id"), int):
+			record = self._store.setdefault(value["type"], {}).setdefault(value["id"], {})
+			for field, v in value.items():
+				if field not in record or record[field] is None:
+					record[field] = v
+				self._seed(v)
+			if value["id"] >= self._next_id:
+				self._next_id = value["id"] + 1
@@ -0,0 +1,348 @@
+"""
+Timeline of an engine startup in Chrome trace format.
+
+When RTS_STARTUP_TRACE is set, the pick_environment core hook calls install()
+at the very start of the engine startup. From then on the following steps are
+recorded as spans of a timeline:
+
+- the environment choice made by pick_environment.
+- yaml files loaded by the core and the resolution of the environment
+  includes.
+- the creation and init_app() of every app, the loading of every framework.
+- the import of every hook file.
+- every Shotgun call made through the Tank instance, the first one being
+  marked separately.
+- the engine construction as a whole.
+
+When the engine is constructed, or at exit if no engine ever was, the trace is
+written to RTS_STARTUP_TRACE_DIR (the temp folder by default) as
+startup_<environment>_<date>_<pid>.json. It can be opened in chrome://tracing
+or https://ui.perfetto.dev to see which apps are worth deferring or dropping
+from an environment.
+
+The core functions are wrapped where they are looked up at call time. A core
+version lacking one of them simply leaves that step out of the timeline.
+"""
+
+import atexit
+import datetime
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+ENABLE_ENV = "RTS_STARTUP_TRACE"
+TRACE_DIR_ENV = "RTS_STARTUP_TRACE_DIR"
+
+_tracer = None
+_patched = []
+
+
+def enabled():
+	"""
+	Return True if a startup timeline was requested for this session.
+	"""
+	return bool(os.environ.get(ENABLE_ENV))
+
+
+def get_tracer():
+	"""
+	Return the tracer of the session, creating it on first use.
+	"""
+	global _tracer
+	if _tracer is None:
+		_tracer = Tracer()
+	return _tracer
+
+
+class _Span(object):
+
+	def __init__(self, tracer, name, category, args):
+		self.tracer = tracer
+		self.name = name
+		self.category = category
+		self.args = args
+
+	def __enter__(self):
+		self.started = time.time()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		args = dict(self.args or {})
+		if exc_type is not None:
+			args["error"] = "%s: %s" % (exc_type.__name__, exc_value)
+		self.tracer.complete(self.name, self.category, self.started, time.time(), args)
+		return False
+
+
+class Tracer(object):
+	"""
+	Collects timeline events in the Chrome trace event format.
+	"""
+
+	def __init__(self):
+		self.started = time.time()
+		self.events = []
+		self.metadata = {}
+		self.written = None
+		self._lock = threading.Lock()
+
+	def _timestamp(self, seconds):
+		# microseconds since the tracer was created
+		return int((seconds - self.started) * 1e6)
+
+	def complete(self, name, category, started, finished, args=None):
+		"""
+		Record a span which ran from started to finished, both time.time()
+		values.
+		"""
+		event = {"name": name, "cat": category, "ph": "X",
+				 "ts": self._timestamp(started), "dur": max(0, int((finished - started) * 1e6)),
+				 "pid": os.getpid(), "tid": threading.current_thread().ident or 0}
+		if args:
+			event["args"] = args
+		with self._lock:
+			self.events.append(event)
+
+	def instant(self, name, category, args=None):
+		"""
+		Record a point in time.
+		"""
+		event = {"name": name, "cat": category, "ph": "i", "s": "p",
+				 "ts": self._timestamp(time.time()),
+				 "pid": os.getpid(), "tid": threading.current_thread().ident or 0}
+		if args:
+			event["args"] = args
+		with self._lock:
+			self.events.append(event)
+
+	def span(self, name, category, args=None):
+		"""
+		Context manager recording the time spent in its block.
+		"""
+		return _Span(self, name, category, args)
+
+	def trace(self):
+		"""
+		Return the timeline as a Chrome trace dictionary.
+		"""
+		with self._lock:
+			events = sorted(self.events, key=lambda e: e["ts"])
+		return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": dict(self.metadata)}
+
+	def summary(self, limit=20):
+		"""
+		Return the longest spans as text, one per line.
+		"""
+		spans = sorted((e for e in self.events if e["ph"] == "X"), key=lambda e: e["dur"], reverse=True)
+		return "\n".join("%9.1f ms  %-10s %s" % (e["dur"] / 1000.0, e["cat"], e["name"]) for e in spans[:limit])
+
+	def write(self, folder=None):
+		"""
+		Write the timeline as JSON.
+
+		:param folder: Target folder, RTS_STARTUP_TRACE_DIR or the temp folder by default
+		:returns:      Path of the trace file
+		"""
+		folder = folder or os.environ.get(TRACE_DIR_ENV) or tempfile.gettempdir()
+		if not os.path.exists(folder):
+			os.makedirs(folder)
+		stamp = datetime.datetime.fromtimestamp(self.started).strftime("%Y%m%d_%H%M%S")
+		path = os.path.join(folder, "startup_%s_%s_%d.json" % (self.metadata.get("environment") or "unknown",
+															   stamp, os.getpid()))
+		with open(path, "w") as target:
+			json.dump(self.trace(), target, default=str)
+		self.written = path
+		return path
+
+
+def _patch(owner, attribute, make_wrapper):
+	"""
+	Replace owner.attribute with make_wrapper(original), if it exists.
+	"""
+	original = getattr(owner, attribute, None)
+	if original is None or getattr(original, "_rts_traced", False):
+		return False
+	wrapper = make_wrapper(original)
+	wrapper._rts_traced = True
+	setattr(owner, attribute, wrapper)
+	_patched.append((owner, attribute, original))
+	return True
+
+
+def _timed(tracer, category, name_of):
+	"""
+	Return a decorator recording every call in a span named name_of(args).
+	"""
+	def decorate(original):
+		@functools.wraps(original)
+		def wrapper(*args, **kwargs):
+			try:
+				name = name_of(*args, **kwargs)
+			except Exception:
+				name = getattr(original, "__name__", "call")
+			with tracer.span(name, category):
+				return original(*args, **kwargs)
+		return wrapper
+	return decorate
+
+
+def _patch_yaml(tracer):
+	try:
+		from tank_vendor import yaml
+	except ImportError:
+		return
+	for attribute in ("load", "safe_load"):
+		_patch(yaml, attribute, _timed(tracer, "yaml", lambda stream, *a, **k:
+									   "yaml %s" % os.path.basename(getattr(stream, "name", "<string>"))))
+	try:
+		from tank.util import yaml_cache
+	except ImportError:
+		return
+	cache = getattr(yaml_cache, "g_yaml_cache", None)
+	if cache is not None:
+		_patch(cache, "get", _timed(tracer, "yaml", lambda path, *a, **k: "yaml %s" % os.path.basename(path)))
+
+
+def _patch_environment(tracer):
+	try:
+		from tank.platform import environment_includes
+	except ImportError:
+		return
+	_patch(environment_includes, "process_includes",
+		   _timed(tracer, "environment", lambda file_name, *a, **k: "includes %s" % os.path.basename(file_name)))
+
+
+def _patch_apps(tracer):
+	try:
+		from tank.platform import application
+	except ImportError:
+		return
+
+	def make_wrapper(original):
+		@functools.wraps(original)
+		def get_application(engine, app_folder, descriptor, settings, instance_name, *args, **kwargs):
+			with tracer.span("create %s" % instance_name, "app"):
+				app = original(engine, app_folder, descriptor, settings, instance_name, *args, **kwargs)
+			init_app = app.init_app
+
+			def traced_init_app():
+				with tracer.span("init %s" % instance_name, "app"):
+					return init_app()
+			# the engine calls init_app on the instance right after creating it
+			app.init_app = traced_init_app
+			return app
+		return get_application
+	_patch(application, "get_application", make_wrapper)
+
+
+def _patch_frameworks(tracer):
+	try:
+		from tank.platform import framework
+	except ImportError:
+		return
+	_patch(framework, "load_framework",
+		   _timed(tracer, "framework", lambda engine, env, name, *a, **k: "framework %s" % name))
+
+
+def _patch_hooks(tracer):
+	try:
+		import tank
+	except ImportError:
+		return
+	timed = _timed(tracer, "hook", lambda path, *a, **k: "import %s" % os.path.basename(str(path)))
+	try:
+		from tank.util import loader
+		_patch(loader, "load_plugin", timed)
+	except ImportError:
+		pass
+	# the hook module imports the function by name
+	hook_module = getattr(tank, "hook", None)
+	if hook_module is not None:
+		_patch(hook_module, "load_plugin", timed)
+
+
+def _patch_engine(tracer):
+	try:
+		from tank.platform import engine
+	except ImportError:
+		return
+
+	def make_wrapper(original):
+		@functools.wraps(original)
+		def __init__(self, *args, **kwargs):
+			with tracer.span("engine %s" % getattr(self, "__class__", type(self)).__name__, "engine"):
+				original(self, *args, **kwargs)
+			tracer.metadata.setdefault("engine", getattr(self, "name", None))
+			path = tracer.write()
+			print("Startup timeline written to %s\n%s" % (path, tracer.summary()))
+		return __init__
+	_patch(engine.Engine, "__init__", make_wrapper)
+
+
+class TracedShotgun(object):
+	"""
+	Shotgun connection wrapper adding every call to the timeline.
+	"""
+
+	def __init__(self, sg, tracer):
+		self._sg = sg
+		self._tracer = tracer
+		self._first = True
+
+	def __getattr__(self, name):
+		attribute = getattr(self._sg, name)
+		if name.startswith("_") or not callable(attribute):
+			return attribute
+
+		def traced(*args, **kwargs):
+			label = "%s %s" % (name, args[0]) if args and isinstance(args[0], str) else name
+			if self._first:
+				self._first = False
+				self._tracer.instant("first shotgun call: %s" % label, "shotgun")
+			with self._tracer.span(label, "shotgun"):
+				return attribute(*args, **kwargs)
+		traced.__name__ = name
+		return traced
+
+
+def _write_at_exit():
+	if _tracer is not None and _tracer.written is None and _tracer.events:
+		try:
+			_tracer.write()
+		except Exception:
+			pass
+
+
+def install(tk):
+	"""
+	Start recording the startup timeline of the engine. Calling it more than
+	once is harmless.
+
+	:param tk: Tank API instance, e.g. self.parent from a core hook
+	:returns:  The session tracer
+	"""
+	tracer = get_tracer()
+	if not _patched:
+		_patch_yaml(tracer)
+		_patch_environment(tracer)
+		_patch_apps(tracer)
+		_patch_frameworks(tracer)
+		_patch_hooks(tracer)
+		_patch_engine(tracer)
+		atexit.register(_write_at_exit)
+	if not isinstance(tk.shotgun, TracedShotgun):
+		from rts import sg_instrument
+		sg_instrument.replace_connection(tk, TracedShotgun(tk.shotgun, tracer))
+	return tracer
+
+
+def uninstall():
+	"""
+	Restore the core functions wrapped by install().
+	"""
+	while _patched:
+		owner, attribute, original = _patched.pop()
+		setattr(owner, attribute, original)
@@ -0,0 +1,193 @@
+"""
+Tank instances of the pipeline configurations, kept while their templates do
+not change.
+
+sgtk.sgtk_from_path() builds a new Tank instance on every call, and the Tank
+constructor parses core/templates.yml and compiles every template. The scan
+hooks needing the Tank instance of a scene go through tank_from_path()
+instead:
+
+	tk = template_cache.tank_from_path(scene_path)
+
+The first call for a project builds the instance with sgtk.sgtk_from_path()
+and keeps it, per pipeline configuration root, with the content hash of
+templates.yml and of the files it includes. A later call for a path below the
+roots of a kept instance hands it back while that hash is unchanged, and
+builds a new instance when it changed. The files are identified by their
+modification time and size, their content is hashed only when those change,
+so a call with unchanged files costs a few stat calls.
+
+The instances are kept in process only, reset() forgets them.
+"""
+
+import hashlib
+import os
+import re
+import threading
+
+# top level include directive of templates.yml and its list entries
+_INCLUDE_LINE = re.compile(r"^includes?:\s*(.*)$")
+_LIST_ENTRY = re.compile(r"^\s+-\s*['\"]?([^'\"#]+?)['\"]?\s*$")
+
+# pipeline configuration root -> (tk, templates file, content hash)
+_tanks = {}
+_signatures = {}
+_lock = threading.Lock()
+
+stats = {"lookups": 0, "reused": 0, "created": 0}
+
+
+def templates_file(tk):
+	"""
+	Return the path of the templates.yml file of a Tank instance.
+	"""
+	pipeline_configuration = tk.pipeline_configuration
+	if hasattr(pipeline_configuration, "get_core_config_location"):
+		core_folder = pipeline_configuration.get_core_config_location()
+	else:
+		core_folder = os.path.join(pipeline_configuration.get_path(), "config", "core")
+	return os.path.join(core_folder, "templates.yml")
+
+
+def included_files(path):
+	"""
+	Return the files included by a templates file, following nested includes.
+	Relative includes are resolved against the folder of the including file,
+	missing files are ignored the way Toolkit does.
+	"""
+	found = []
+	pending = [path]
+	while pending:
+		current = pending.pop()
+		try:
+			with open(current) as source:
+				lines = source.read().splitlines()
+		except (IOError, OSError):
+			continue
+		in_list = False
+		for line in lines:
+			match = _INCLUDE_LINE.match(line)
+			entry = _LIST_ENTRY.match(line) if in_list else None
+			if match:
+				value = match.group(1).strip().strip("'\"")
+				in_list = not value
+				names = [value] if value else []
+			elif entry:
+				names = [entry.group(1)]
+			else:
+				# the include list ends at the first line which is not an entry
+				if line.strip() and not line.lstrip().startswith("#"):
+					in_list = False
+				continue
+			for name in names:
+				name = os.path.expandvars(os.path.expanduser(name))
+				if not os.path.isabs(name):
+					name = os.path.join(os.path.dirname(current), name)
+				name = os.path.normpath(name)
+				if name not in found and name != path and os.path.exists(name):
+					found.append(name)
+					pending.append(name)
+	return found
+
+
+def file_signature(paths):
+	"""
+	Return a tuple of (path, modification time, size) for a list of files.
+	"""
+	signature = []
+	for path in paths:
+		try:
+			info = os.stat(path)
+			signature.append((path, info.st_mtime, info.st_size))
+		except OSError:
+			signature.append((path, None, None))
+	return tuple(signature)
+
+
+def content_hash(paths):
+	"""
+	Return the sha1 of the content of a list of files.
+	"""
+	digest = hashlib.sha1()
+	for path in paths:
+		digest.update(path.encode("utf-8") if not isinstance(path, bytes) else path)
+		try:
+			with open(path, "rb") as source:
+				digest.update(source.read())
+		except (IOError, OSError):
+			digest.update(b"<missing>")
+	return digest.hexdigest()
+
+
+def _current_hash(main_file):
+	"""
+	Return the content hash of a templates file and its includes, hashing the
+	files only if their modification time or size changed since last time.
+	"""
+	files = [main_file] + included_files(main_file)
+	signature = file_signature(files)
+	known = _signatures.get(main_file)
+	if known is not None and known[0] == signature:
+		return known[1]
+	digest = content_hash(files)
+	_signatures[main_file] = (signature, digest)
+	return digest
+
+
+def config_root(tk):
+	"""
+	Return the root folder of the pipeline configuration of a Tank instance.
+	"""
+	return tk.pipeline_configuration.get_path()
+
+
+def _owns(tk, path):
+	"""
+	Return True if a path is below one of the project roots of a Tank instance.
+	"""
+	path = os.path.normcase(os.path.abspath(path))
+	for root in (getattr(tk, "roots", None) or {}).values():
+		if not root:
+			continue
+		root = os.path.normcase(os.path.abspath(root)).rstrip(os.sep)
+		if path == root or path.startswith(root + os.sep):
+			return True
+	return False
+
+
+def tank_from_path(path, factory=None):
+	"""
+	Return the Tank instance of a path, the kept one when its templates did
+	not change. Drop-in replacement for sgtk.sgtk_from_path().
+
+	:param path:    Path of a file of a project
+	:param factory: Called as factory(path) to build a Tank instance,
+	                sgtk.sgtk_from_path() by default
+	"""
+	with _lock:
+		stats["lookups"] += 1
+		for root, (tk, main_file, digest) in list(_tanks.items()):
+			if _owns(tk, path):
+				if _current_hash(main_file) == digest:
+					stats["reused"] += 1
+					return tk
+				# templates.yml changed, the next instance parses it again
+				del _tanks[root]
+				break
+		if factory is None:
+			import sgtk
+			factory = sgtk.sgtk_from_path
+		tk = factory(path)
+		main_file = templates_file(tk)
+		_tanks[config_root(tk)] = (tk, main_file, _current_hash(main_file))
+		stats["created"] += 1
+		return tk
+
+
+def reset():
+	"""
+	Forget the kept Tank instances.
+	"""
+	with _lock:
+		_tanks.clear()
+		_signatures.clear()
@@ -0,0 +1,279 @@
+"""
+Standalone reader of the templates configuration.
+
+Tools and benchmarks which run from a plain python shell have no Toolkit
+instance to ask for tk.templates. load_templates() reads core/templates.yml and
+core/roots.yml directly and returns light template objects offering the part of
+the Toolkit template API the hooks rely on: name, definition, root_path, keys,
+validate(), get_fields() and apply_fields().
+
+The objects follow the Toolkit rules closely enough for profiling and testing
+lookups, they are not meant to replace the templates of a running engine.
+"""
+
+import os
+import re
+import sys
+
+try:
+	import yaml
+except ImportError:
+	from tank_vendor import yaml
+
+# core folder of this configuration
+CORE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+	os.path.abspath(__file__))))), "core")
+
+_KEY_OR_OPTIONAL = re.compile(r"(\{[^}]+\}|\[|\])")
+
+
+def platform_root_key(platform=None):
+	"""
+	Return the roots.yml entry name for a platform, the current one by default.
+	"""
+	platform = platform or sys.platform
+	if platform.startswith("win"):
+		return "windows_path"
+	if platform == "darwin":
+		return "mac_path"
+	return "linux_path"
+
+
+def read_roots(core_root=None, platform=None):
+	"""
+	Return {root name: path} for the storage roots of the configuration.
+	"""
+	with open(os.path.join(core_root or CORE_ROOT, "roots.yml")) as source:
+		data = yaml.safe_load(source) or {}
+	key = platform_root_key(platform)
+	return dict((name, paths.get(key)) for name, paths in data.items())
+
+
+def load_templates(core_root=None, roots=None, platform=None):
+	"""
+	Read templates.yml and return {name: template} like tk.templates.
+
+	:param core_root: Folder holding templates.yml and roots.yml, the core folder of
+					  this configuration by default
+	:param roots:     {root name: path}, read from roots.yml by default
+	:param platform:  sys.platform value used to pick the root paths and the case
+					  sensitivity of the templates
+	:returns:         Dictionary of Template objects keyed by name
+	"""
+	core_root = core_root or CORE_ROOT
+	platform = platform or sys.platform
+	if roots is None:
+		roots = read_roots(core_root, platform)
+	with open(os.path.join(core_root, "templates.yml")) as source:
+		data = yaml.safe_load(source) or {}
+
+	keys = {}
+	for name, settings in (data.get("keys") or {}).items():
+		keys[name] = TemplateKey(name, **(settings or {}))
+
+	ignore_case = platform.startswith("win")
+	templates = {}
+	path_definitions = data.get("paths") or {}
+	for name in path_definitions:
+		definition, root_name = _resolve(name, path_definitions)
+		root_path = roots.get(root_name or "primary") or ""
+		templates[name] = Template(name, definition, keys, root_path=root_path, ignore_case=ignore_case)
+	string_definitions = data.get("strings") or {}
+	for name in string_definitions:
+		definition, _ = _resolve(name, string_definitions)
+		templates[name] = Template(name, definition, keys, ignore_case=ignore_case)
+	return templates
+
+
+def _resolve(name, definitions, seen=None):
+	"""
+	Return the definition of a template with its @references expanded and its
+	root name.
+	"""
+	seen = seen or set()
+	if name in seen:
+		raise ValueError("Template '%s' references itself" % name)
+	seen.add(name)
+	value = definitions[name]
+	root_name = None
+	if isinstance(value, dict):
+		root_name = value.get("root_name")
+		value = value["definition"]
+	if value.startswith("@"):
+		reference, _, rest = value[1:].partition("/")
+		if reference not in definitions:
+			raise ValueError("Template '%s' references unknown template '%s'" % (name, reference))
+		base, base_root = _resolve(reference, definitions, seen)
+		value = base + "/" + rest if rest else base
+		root_name = root_name or base_root
+	return value, root_name
+
+
+def split_definition(definition):
+	"""
+	Split a template definition into its path segments, ignoring empty ones.
+	"""
+	return [part for part in definition.replace("\\", "/").split("/") if part]
+
+
+class TemplateKey(object):
+	"""
+	Key definition from the keys section of templates.yml.
+	"""
+
+	def __init__(self, name, type="str", format_spec=None, alias=None, filter_by=None, choices=None,
+				 default=None, **kwargs):
+		self.name = name
+		self.type = type
+		self.format_spec = format_spec
+		self.alias = alias
+		self.filter_by = filter_by
+		self.choices = choices
+		self.default = default
+
+	@property
+	def field_name(self):
+		"""
+		Name of the field the key reads and writes, its alias if it has one.
+		"""
+		return self.alias or self.name
+
+	@property
+	def pattern(self):
+		if self.choices:
+			values = self.choices.keys() if isinstance(self.choices, dict) else self.choices
+			return "(?:%s)" % "|".join(re.escape(str(v)) for v in values)
+		if self.type == "int":
+			return r"-?\d+"
+		if self.type == "sequence":
+			return r"(?:\d+|%0\dd|%d|#+|@+|\$F\d?|FORMAT: [^/]+)"
+		if self.filter_by == "alphanumeric":
+			return "[A-Za-z0-9]+"
+		if self.filter_by == "alpha":
+			return "[A-Za-z]+"
+		return "[^/]+"
+
+	def to_value(self, text):
+		if self.type in ("int", "sequence"):
+			try:
+				return int(text)
+			except ValueError:
+				return text
+		return text
+
+	def to_string(self, value):
+		if self.type in ("int", "sequence") and isinstance(value, int):
+			if self.format_spec:
+				return format(value, self.format_spec)
+			return str(value)
+		return str(value)
+
+
+class Template(object):
+	"""
+	Template read from templates.yml. Path templates have a root_path, string
+	templates have None.
+	"""
+
+	def __init__(self, name, definition, keys, root_path=None, ignore_case=False):
+		self.name = name
+		self.root_path = root_path
+		self.definition = "/".join(split_definition(definition)) if root_path is not None else definition
+		self.keys = {}
+		for token in _KEY_OR_OPTIONAL.findall(self.definition):
+			if token.startswith("{"):
+				key_name = token[1:-1]
+				if key_name not in keys:
+					raise ValueError("Template '%s' uses undefined key '%s'" % (name, key_name))
+				self.keys[key_name] = keys[key_name]
+		self._regex = re.compile(self._make_pattern(), re.IGNORECASE if ignore_case else 0)
+
+	def __repr__(self):
+		return "<Template %s: %s>" % (self.name, self.definition)
+
+	@property
+	def full_definition(self):
+		"""
+		Definition prefixed with the root path for path templates.
+		"""
+		if self.root_path is None:
+			return self.definition
+		return self.root_path.replace("\\", "/").rstrip("/") + "/" + self.definition
+
+	def _make_pattern(self):
+		pattern = []
+		used = set()
+		for token in _KEY_OR_OPTIONAL.split(self.full_definition):
+			if not token:
+				continue
+			if token == "[":
+				pattern.append("(?:")
+			elif token == "]":
+				pattern.append(")?")
+			elif token.startswith("{"):
+				key = self.keys[token[1:-1]]
+				group = key.name
+				if group in used:
+					pattern.append("(?P=%s)" % group)
+				else:
+					used.add(group)
+					pattern.append("(?P<%s>%s)" % (group, key.pattern))
+			else:
+				pattern.append(re.escape(token))
+		return "^" + "".join(pattern) + "$"
+
+	def _normalize(self, path):
+		if self.root_path is None:
+			return path
+		return path.replace("\\", "/").rstrip("/")
+
+	def validate(self, path, skip_keys=None):
+		"""
+		Return True if the path matches the template.
+		"""
+		return self._regex.match(self._normalize(path)) is not None
+
+	def get_fields(self, path):
+		"""
+		Return the fields extracted from a path matching the template.
+
+		:raises ValueError: If the path does not match
+		"""
+		match = self._regex.match(self._normalize(path))
+		if match is None:
+			raise ValueError("Path '%s' does not match template %s" % (path, self))
+		fields = {}
+		for key_name, text in match.groupdict().items():
+			if text is not None:
+				key = self.keys[key_name]
+				fields[key.field_name] = key.to_value(text)
+		return fields
+
+	def apply_fields(self, fields):
+		"""
+		Build a path or string from fields. Optional sections are kept when all
+		of their keys have a value.
+
+		:raises ValueError: If a required key has no value
+		"""
+		result = []
+		section = None
+		for token in _KEY_OR_OPTIONAL.split(self.full_definition):
+			if not token:
+				continue
+			if token == "[":
+				section = []
+			elif token == "]":
+				if section is not None and None not in section:
+					result.extend(section)
+				section = None
+			elif token.startswith("{"):
+				key = self.keys[token[1:-1]]
+				value = fields.get(key.field_name)
+				if value is None and section is None:
+					raise ValueError("Missing value for key '%s' of template %s" % (key.name, self))
+				text = None if value is None else key.to_string(value)
+				(result if section is None else section).append(text)
+			else:
+				(result if section is None else section).append(token)
+		return "".join(result)
@@ -0,0 +1,323 @@
+"""
+Lookup of the templates matching a path.
+
+Finding which template a path belongs to is usually done by calling validate()
+on every template of the configuration until one accepts the path. With two
+hundred templates and a few hundred references or read nodes in a scene this
+adds up to tens of thousands of regular expression evaluations per publish.
+
+TemplateIndex narrows the search down before validating anything:
+
+- every path template is filed in a trie under the static leading segments
+  of its definition (root path included), e.g. /srv/projects/rts/Sequences
+  for '@sequence_root/...' templates. A lookup only walks the segments of the
+  path and collects the templates of the nodes it passes through.
+- within a node the templates are bucketed by their static file extension.
+- each candidate is checked against a compiled pattern of its definition in
+  which every key matches anything, which rejects most of them cheaply.
+
+The candidates left are validated with the template itself, in the order of
+the template dictionary the index was built from, so the result is the same
+as the linear scan it replaces:
+
+	index = template_index.get_index(self.parent.tank)
+	template = index.match(path)
+
+Running this module compares both approaches on synthetic paths generated
+from core/templates.yml:
+
+	python hooks/lib/rts/template_index.py [count]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+# characters opening keys and optional sections in template definitions
+_DYNAMIC = re.compile(r"[\[\]{}]")
+_TOKENS = re.compile(r"(\{[^}]+\}|\[|\])")
+_SEPARATORS = re.compile(r"[/\\]+")
+
+_indexes = {}
+
+
+def get_index(tk):
+	"""
+	Return the index of the templates of a Tank instance. It is built on first
+	use and again when the templates of the instance have been reloaded.
+
+	:param tk: Tank API instance
+	"""
+	templates = tk.templates
+	cached = _indexes.get(id(tk))
+	if cached is None or cached.templates is not templates:
+		cached = _indexes[id(tk)] = TemplateIndex(templates)
+	return cached
+
+
+def normalize_path(path):
+	"""
+	Return a path with forward slashes, no repeated or trailing separators.
+	"""
+	return _SEPARATORS.sub("/", path).rstrip("/")
+
+
+def full_definition(template):
+	"""
+	Return the definition of a template prefixed with its root path, if any.
+	"""
+	definition = template.definition
+	root_path = getattr(template, "root_path", None)
+	if root_path:
+		definition = root_path.rstrip("/\\") + "/" + definition.lstrip("/\\")
+	return definition
+
+
+def static_prefix(template):
+	"""
+	Return the lower case path segments of a template definition preceding the
+	first segment holding a key or an optional section. String templates have
+	no static prefix.
+	"""
+	if getattr(template, "root_path", None) is None:
+		return []
+	prefix = []
+	for segment in normalize_path(full_definition(template)).split("/"):
+		if _DYNAMIC.search(segment):
+			break
+		prefix.append(segment.lower())
+	return prefix
+
+
+def static_extension(template):
+	"""
+	Return the lower case extension ending a template definition, None if the
+	end of the definition is not static.
+	"""
+	tail = normalize_path(template.definition).rsplit("/", 1)[-1]
+	extension = os.path.splitext(tail)[1]
+	if not extension or _DYNAMIC.search(extension):
+		return None
+	return extension.lower()
+
+
+def definition_pattern(template):
+	"""
+	Compile a case insensitive pattern of the template definition in which
+	every key matches any text. It accepts every path the template validates
+	and is used to rule candidates out before validating them.
+	"""
+	parts = []
+	for token in _TOKENS.split(normalize_path(full_definition(template))):
+		if token == "[":
+			parts.append("(?:")
+		elif token == "]":
+			parts.append(")?")
+		elif token.startswith("{"):
+			parts.append(".*")
+		elif token:
+			parts.append(re.escape(token))
+	return re.compile("^" + "".join(parts) + "$", re.IGNORECASE | re.DOTALL)
+
+
+class _Node(object):
+	__slots__ = ("children", "by_extension", "any_extension")
+
+	def __init__(self):
+		self.children = {}
+		self.by_extension = {}
+		self.any_extension = []
+
+
+class TemplateIndex(object):
+	"""
+	Index of templates by static path prefix and extension.
+
+	:param templates: Dictionary of templates like tk.templates
+	"""
+
+	def __init__(self, templates):
+		self.templates = templates
+		self._root = _Node()
+		self._entries = []
+		self.stats = {"lookups": 0, "candidates": 0, "validations": 0}
+		for order, (name, template) in enumerate(templates.items()):
+			try:
+				pattern = definition_pattern(template)
+				prefix = static_prefix(template)
+			except (AttributeError, re.error):
+				# unknown kind of template, always validate it
+				pattern = None
+				prefix = []
+			entry = (order, name, template, pattern)
+			self._entries.append(entry)
+			node = self._root
+			for segment in prefix:
+				node = node.children.setdefault(segment, _Node())
+			extension = static_extension(template) if pattern is not None else None
+			if extension is None:
+				node.any_extension.append(entry)
+			else:
+				node.by_extension.setdefault(extension, []).append(entry)
+
+	def __len__(self):
+		return len(self._entries)
+
+	def candidates(self, path):
+		"""
+		Return (name, template) for the templates which may validate a path,
+		before they are validated, in the order of the template dictionary.
+		"""
+		normalized = normalize_path(path)
+		extension = os.path.splitext(normalized.rsplit("/", 1)[-1])[1].lower()
+		found = []
+		node = self._root
+		segments = normalized.split("/")
+		for depth in range(len(segments) + 1):
+			found.extend(node.any_extension)
+			found.extend(node.by_extension.get(extension, ()))
+			if depth == len(segments):
+				break
+			node = node.children.get(segments[depth].lower())
+			if node is None:
+				break
+		found.sort(key=lambda entry: entry[0])
+		self.stats["lookups"] += 1
+		result = []
+		for order, name, template, pattern in found:
+			self.stats["candidates"] += 1
+			if pattern is None or pattern.match(normalized):
+				result.append((name, template))
+		return result
+
+	def match_all(self, path):
+		"""
+		Return the templates validating a path, in the order of the template
+		dictionary.
+		"""
+		matches = []
+		for name, template in self.candidates(path):
+			self.stats["validations"] += 1
+			if template.validate(path):
+				matches.append(template)
+		return matches
+
+	def match(self, path):
+		"""
+		Return the first template validating a path, None if there is none.
+		This is the template the linear scan over the template dictionary would
+		find.
+		"""
+		for name, template in self.candidates(path):
+			self.stats["validations"] += 1
+			if template.validate(path):
+				return template
+		return None
+
+
+def fake_value(key, rng):
+	"""
+	Return a plausible random value for a template key.
+	"""
+	kind = getattr(key, "type", None) or type(key).__name__
+	choices = getattr(key, "choices", None) or getattr(key, "labelled_choices", None)
+	if choices:
+		return rng.choice(sorted(choices))
+	if kind in ("int", "sequence", "IntegerKey", "SequenceKey"):
+		return rng.randint(1, 120)
+	return "%s%03d" % (rng.choice(["abc", "Hero", "q", "base", "Main"]), rng.randint(0, 999))
+
+
+def synthetic_paths(templates, count=10000, noise=0.3, seed=0):
+	"""
+	Generate paths from the path templates of a configuration, mixed with a
+	share of paths no template matches, like textures from a library outside
+	of the project.
+
+	:param templates: Dictionary of templates like tk.templates
+	:param count:     Number of paths to generate
+	:param noise:     Share of paths which match no template
+	:param seed:      Seed of the random generator, for repeatable runs
+	"""
+	rng = random.Random(seed)
+	path_templates = [t for n, t in sorted(templates.items()) if getattr(t, "root_path", None) is not None]
+	paths = []
+	while len(paths) < count:
+		if rng.random() < noise:
+			paths.append("/mnt/library/textures/%s/tex_%04d.%s" % (rng.choice(["wood", "metal", "sky"]),
+																   rng.randint(0, 9999),
+																   rng.choice(["tif", "exr", "png"])))
+			continue
+		while True:
+			template = rng.choice(path_templates)
+			fields = {}
+			for key in template.keys.values():
+				if rng.random() < 0.8:
+					fields[getattr(key, "alias", None) or key.name] = fake_value(key, rng)
+			try:
+				paths.append(template.apply_fields(fields))
+				break
+			except Exception:
+				# a required key was left out
+				continue
+	return paths
+
+
+def benchmark(templates, paths=None, count=10000):
+	"""
+	Time the linear validate() scan against the index for a list of paths and
+	check both find the same templates.
+
+	:param templates: Dictionary of templates like tk.templates
+	:param paths:     Paths to look up, synthetic_paths(templates, count) by default
+	:returns:         Dictionary of timings and counters
+	"""
+	if paths is None:
+		paths = synthetic_paths(templates, count)
+	values = list(templates.values())
+
+	started = time.time()
+	linear = []
+	linear_validations = 0
+	for path in paths:
+		found = None
+		for template in values:
+			linear_validations += 1
+			if template.validate(path):
+				found = template
+				break
+		linear.append(found)
+	linear_seconds = time.time() - started
+
+	started = time.time()
+	index = TemplateIndex(templates)
+	build_seconds = time.time() - started
+
+	started = time.time()
+	indexed = [index.match(path) for path in paths]
+	index_seconds = time.time() - started
+
+	mismatches = sum(1 for a, b in zip(linear, indexed) if a is not b)
+	return {"templates": len(values),
+			"paths": len(paths),
+			"matched": sum(1 for t in linear if t is not None),
+			"linear_seconds": linear_seconds,
+			"build_seconds": build_seconds,
+			"index_seconds": index_seconds,
+			"speedup": linear_seconds / index_seconds if index_seconds else None,
+			"linear_validations_per_path": linear_validations / float(len(paths) or 1),
+			"validations_per_path": index.stats["validations"] / float(len(paths) or 1),
+			"mismatches": mismatches}
+
+
+if __name__ == "__main__":
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	from rts import template_config
+
+	result = benchmark(template_config.load_templates(),
+					   count=int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+	for name in ("templates", "paths", "matched", "linear_seconds", "build_seconds", "index_seconds",
+				 "speedup", "linear_validations_per_path", "validations_per_path", "mismatches"):
+		print("%-28s %s" % (name, result[name]))
@@ -0,0 +1,212 @@
+"""
+Memoized template resolution for the duration of a publish.
+
+A publish resolves the same paths and builds the same paths from the same
+fields over and over: the scene path is turned into fields in several places
+of the camera publish, and paths are rebuilt per shot and per eye from fields
+differing in a single value. TemplateMemo sits in front of those calls:
+
+	memo = template_memo.get_session(self.parent.tank)
+	scene_template = memo.template_from_path(scene_path)
+	flds = memo.get_fields(scene_template, scene_path)
+	path = memo.apply_fields(audio_template, flds)
+
+Resolving a path or applying fields only depends on the templates, so the
+results can be reused safely as long as the templates are not reloaded. Field
+dictionaries are handed out as copies, callers are free to modify them.
+
+A session lasts for one publish: the primary publish hook starts it with
+begin_session() and the post publish hook closes it with end_session(), which
+prints the hit rates of the caches. Both caches are bounded and drop the least
+recently used entries first.
+"""
+
+import collections
+import threading
+
+DEFAULT_MAX_SIZE = 1024
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+class LRUCache(object):
+	"""
+	Bounded mapping dropping its least recently used entry when full, and
+	counting hits and misses.
+
+	:param max_size: Maximum number of entries
+	"""
+
+	def __init__(self, max_size=DEFAULT_MAX_SIZE):
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		self._data = collections.OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._data)
+
+	def __contains__(self, key):
+		return key in self._data
+
+	def get(self, key, default=None):
+		"""
+		Return the value cached for a key, default if there is none.
+		"""
+		with self._lock:
+			try:
+				value = self._data.pop(key)
+			except KeyError:
+				self.misses += 1
+				return default
+			# reinsert so the entry becomes the most recently used one
+			self._data[key] = value
+			self.hits += 1
+			return value
+
+	def put(self, key, value):
+		with self._lock:
+			self._data.pop(key, None)
+			self._data[key] = value
+			while len(self._data) > self.max_size:
+				self._data.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+
+	@property
+	def hit_rate(self):
+		"""
+		Share of the lookups answered from the cache, 0.0 before any lookup.
+		"""
+		lookups = self.hits + self.misses
+		return self.hits / float(lookups) if lookups else 0.0
+
+
+_MISSING = object()
+
+
+def _fields_key(fields):
+	"""
+	Return a hashable key for a fields dictionary, None if a value can not be
+	hashed.
+	"""
+	try:
+		return frozenset(fields.items())
+	except TypeError:
+		return None
+
+
+class TemplateMemo(object):
+	"""
+	Caches in front of template_from_path, get_fields and apply_fields.
+
+	:param tk:       Tank API instance the templates belong to
+	:param max_size: Maximum number of entries of each cache
+	"""
+
+	def __init__(self, tk, max_size=DEFAULT_MAX_SIZE):
+		self.tk = tk
+		self.templates = tk.templates
+		self.path_cache = LRUCache(max_size)
+		self.fields_cache = LRUCache(max_size)
+		self.apply_cache = LRUCache(max_size)
+
+	def template_from_path(self, path):
+		"""
+		Same as tk.template_from_path(path). Errors raised for ambiguous paths
+		are not cached.
+		"""
+		template = self.path_cache.get(path, _MISSING)
+		if template is _MISSING:
+			template = self.tk.template_from_path(path)
+			self.path_cache.put(path, template)
+		return template
+
+	def get_fields(self, template, path):
+		"""
+		Same as template.get_fields(path), returning a copy the caller may
+		modify.
+		"""
+		key = (id(template), path)
+		fields = self.fields_cache.get(key)
+		if fields is None:
+			fields = template.get_fields(path)
+			self.fields_cache.put(key, fields)
+		return dict(fields)
+
+	def resolve(self, path):
+		"""
+		Return (template, fields) for a path, (None, None) if no template
+		matches it.
+		"""
+		template = self.template_from_path(path)
+		if template is None:
+			return None, None
+		return template, self.get_fields(template, path)
+
+	def apply_fields(self, template, fields):
+		"""
+		Same as template.apply_fields(fields).
+		"""
+		fields_key = _fields_key(fields)
+		if fields_key is None:
+			return template.apply_fields(fields)
+		key = (id(template), fields_key)
+		path = self.apply_cache.get(key)
+		if path is None:
+			path = template.apply_fields(fields)
+			self.apply_cache.put(key, path)
+		return path
+
+	def stats(self):
+		"""
+		Return {cache name: (hits, misses, hit rate)}.
+		"""
+		return dict((name, (cache.hits, cache.misses, cache.hit_rate))
+					for name, cache in (("template_from_path", self.path_cache),
+										("get_fields", self.fields_cache),
+										("apply_fields", self.apply_cache)))
+
+	def report(self):
+		"""
+		Return the hit rates of the caches as text.
+		"""
+		lines = []
+		for name, (hits, misses, rate) in sorted(self.stats().items()):
+			lines.append("%-20s %6d hits %6d misses %5.1f%%" % (name, hits, misses, rate * 100))
+		return "\n".join(lines)
+
+
+def begin_session(tk, max_size=DEFAULT_MAX_SIZE):
+	"""
+	Start a new publish session for a Tank instance, dropping the caches of the
+	previous one.
+	"""
+	with _lock:
+		memo = _sessions[id(tk)] = TemplateMemo(tk, max_size)
+	return memo
+
+
+def get_session(tk):
+	"""
+	Return the memo of the current publish session of a Tank instance. A new
+	session is started if there is none or if the templates were reloaded.
+	"""
+	memo = _sessions.get(id(tk))
+	if memo is None or memo.tk is not tk or memo.templates is not tk.templates:
+		memo = begin_session(tk)
+	return memo
+
+
+def end_session(tk):
+	"""
+	Close the publish session of a Tank instance.
+
+	:returns: The memo of the session, None if there was no session
+	"""
+	with _lock:
+		return _sessions.pop(id(tk), None)
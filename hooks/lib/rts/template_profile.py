@@ -0,0 +1,216 @@
+"""
+Profiler and ambiguity report for the templates of the configuration.
+
+tk.template_from_path() validates a path against every template and fails
+when more than one accepts it. Templates sharing a prefix and differing only
+in optional sections, like maya_shot_work and maya_shot_positionlist or the
+maya_*_mesh_*_cache family, make that both slow and fragile. This tool gives
+the data needed to restructure templates.yml:
+
+- representative paths are generated for every path template, one set per
+  combination of its optional sections.
+- every template validates every generated path, which is what
+  template_from_path pays for each lookup. The time spent per template and
+  the number of optional section combinations it expands to are reported.
+- paths accepted by another template than the one they were generated from
+  are reported as ambiguous pairs, with an example path.
+
+From a plain python shell, reading core/templates.yml directly:
+
+	python hooks/lib/rts/template_profile.py [--samples 2] [--top 25] [--json report.json]
+
+From an engine, with the real Toolkit templates:
+
+	from rts import template_profile
+	print template_profile.format_report(template_profile.profile(tk.templates))
+"""
+
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import time
+
+_TOKENS = re.compile(r"(\{[^}]+\}|\[|\])")
+
+
+def optional_sections(template):
+	"""
+	Return (required key names, [key names of each optional section]) of a
+	template definition.
+	"""
+	required = set()
+	sections = []
+	current = None
+	for token in _TOKENS.split(template.definition):
+		if token == "[":
+			current = set()
+		elif token == "]":
+			if current is not None:
+				sections.append(current)
+			current = None
+		elif token.startswith("{"):
+			(required if current is None else current).add(token[1:-1])
+	return required, sections
+
+
+def _field_name(template, key_name):
+	key = template.keys.get(key_name)
+	return getattr(key, "alias", None) or key_name
+
+
+def representative_paths(template, samples=2, seed=0):
+	"""
+	Generate paths for a template: samples paths for every combination of its
+	optional sections.
+
+	:returns: List of (optional sections used, path)
+	"""
+	from rts import template_index
+
+	rng = random.Random("%s:%d" % (getattr(template, "name", template.definition), seed))
+	required, sections = optional_sections(template)
+	paths = []
+	for count in range(len(sections) + 1):
+		for used in itertools.combinations(range(len(sections)), count):
+			names = set(required)
+			for position in used:
+				names.update(sections[position])
+			for _ in range(samples):
+				fields = {}
+				for name in names:
+					key = template.keys.get(name)
+					if key is not None:
+						fields[_field_name(template, name)] = template_index.fake_value(key, rng)
+				try:
+					paths.append((used, template.apply_fields(fields)))
+				except Exception:
+					continue
+	return paths
+
+
+def profile(templates, samples=2, seed=0):
+	"""
+	Validate the representative paths of every path template against every
+	template.
+
+	:param templates: Dictionary of templates like tk.templates
+	:param samples:   Paths generated per combination of optional sections
+	:returns:         Dictionary report, see format_report()
+	"""
+	names = sorted(templates)
+	path_names = [n for n in names if getattr(templates[n], "root_path", None) is not None]
+
+	corpus = []
+	for name in path_names:
+		for used, path in representative_paths(templates[name], samples, seed):
+			corpus.append((name, path))
+
+	per_template = {}
+	accepted = dict((i, []) for i in range(len(corpus)))
+	for name in names:
+		template = templates[name]
+		_, sections = optional_sections(template)
+		hits = 0
+		started = time.time()
+		for position, (source, path) in enumerate(corpus):
+			if template.validate(path):
+				hits += 1
+				accepted[position].append(name)
+		seconds = time.time() - started
+		per_template[name] = {"name": name,
+							  "definition": template.definition,
+							  "optional_sections": len(sections),
+							  "variations": 2 ** len(sections),
+							  "validate_seconds": seconds,
+							  "validate_us": seconds / float(len(corpus) or 1) * 1e6,
+							  "paths_accepted": hits}
+
+	pairs = {}
+	unmatched = []
+	for position, (source, path) in enumerate(corpus):
+		matches = accepted[position]
+		if source not in matches:
+			unmatched.append({"template": source, "path": path})
+		for other in matches:
+			if other == source:
+				continue
+			pair = pairs.get((source, other))
+			if pair is None:
+				pair = pairs[(source, other)] = {"generated_by": source, "also_matched_by": other,
+												 "count": 0, "example": path}
+			pair["count"] += 1
+
+	lookup_seconds = sum(t["validate_seconds"] for t in per_template.values())
+	return {"templates": len(names),
+			"paths": len(corpus),
+			"lookup_us": lookup_seconds / float(len(corpus) or 1) * 1e6,
+			"ambiguous_paths": sum(1 for matches in accepted.values() if len(matches) > 1),
+			"per_template": sorted(per_template.values(), key=lambda t: t["validate_seconds"], reverse=True),
+			"ambiguous_pairs": sorted(pairs.values(), key=lambda p: p["count"], reverse=True),
+			"unmatched": unmatched}
+
+
+def format_report(report, top=25):
+	"""
+	Return a profile() report as text.
+	"""
+	lines = ["%d templates, %d generated paths" % (report["templates"], report["paths"]),
+			 "cost of validating one path against every template: %.1f us" % report["lookup_us"],
+			 "paths accepted by more than one template: %d" % report["ambiguous_paths"],
+			 "",
+			 "Most expensive templates:",
+			 "%-45s %10s %10s %10s" % ("template", "us/path", "variations", "accepted"),
+			 "-" * 78]
+	for entry in report["per_template"][:top]:
+		lines.append("%-45s %10.2f %10d %10d" % (entry["name"][:45], entry["validate_us"],
+												 entry["variations"], entry["paths_accepted"]))
+
+	lines += ["", "Most optional section combinations:"]
+	by_variations = sorted(report["per_template"], key=lambda t: (t["variations"], t["validate_seconds"]),
+						   reverse=True)
+	for entry in by_variations[:top]:
+		if entry["variations"] < 2:
+			break
+		lines.append("  %3d  %-45s %s" % (entry["variations"], entry["name"][:45], entry["definition"]))
+
+	lines += ["", "Templates matching the paths of another template:"]
+	if not report["ambiguous_pairs"]:
+		lines.append("  none")
+	for pair in report["ambiguous_pairs"][:top * 2]:
+		lines.append("  %4dx %s -> %s" % (pair["count"], pair["generated_by"], pair["also_matched_by"]))
+		lines.append("         e.g. %s" % pair["example"])
+
+	if report["unmatched"]:
+		lines += ["", "Generated paths their own template rejects (check the key definitions):"]
+		for entry in report["unmatched"][:top]:
+			lines.append("  %s: %s" % (entry["template"], entry["path"]))
+	return "\n".join(lines)
+
+
+def main(argv=None):
+	import argparse
+
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	from rts import template_config
+
+	parser = argparse.ArgumentParser(description="Profile the templates of the configuration.")
+	parser.add_argument("--core", help="core folder holding templates.yml, this configuration by default")
+	parser.add_argument("--platform", help="sys.platform value to resolve the roots for")
+	parser.add_argument("--samples", type=int, default=2, help="paths per optional section combination")
+	parser.add_argument("--top", type=int, default=25, help="entries listed per section")
+	parser.add_argument("--json", help="also write the full report to this file")
+	args = parser.parse_args(argv)
+
+	templates = template_config.load_templates(args.core, platform=args.platform)
+	report = profile(templates, samples=args.samples)
+	print(format_report(report, top=args.top))
+	if args.json:
+		with open(args.json, "w") as target:
+			json.dump(report, target, indent=1)
+
+
+if __name__ == "__main__":
+	main()
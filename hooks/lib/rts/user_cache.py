@@ -0,0 +1,75 @@
+"""
+Per-user folders for the caches kept on disk.
+
+A cache read back from a folder other users can write to lets any of them
+feed files to every artist's Maya or tank process, code when the entries are
+pickled. The caches of this package therefore live in a folder of the user's
+own:
+
+	folder = user_cache.cache_folder("env_cache", "RTS_ENV_CACHE_DIR")
+	if user_cache.ensure_private(folder):
+		...
+	if user_cache.trusted(path):
+		...
+
+- cache_folder() is the folder named by the environment variable when it is
+  set, a folder of $XDG_CACHE_HOME (~/.cache) or %LOCALAPPDATA% otherwise.
+- ensure_private() creates the folder readable by its owner only, and refuses
+  a folder owned by another user or writable by others.
+- trusted() refuses a file owned by another user or writable by others.
+
+The owner checks are done on posix systems, on Windows the profile folders
+are private to their user already.
+"""
+
+import os
+import stat
+import sys
+
+ROOT_NAME = "rts"
+
+
+def _user_root():
+	if sys.platform == "win32":
+		base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+	else:
+		base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+	return os.path.join(base, ROOT_NAME)
+
+
+def cache_folder(name, override_env=None):
+	"""
+	Return the folder of a cache, the one named by override_env when it is set.
+	"""
+	if override_env and os.environ.get(override_env):
+		return os.environ[override_env]
+	return os.path.join(_user_root(), name)
+
+
+def _owned(info):
+	if not hasattr(os, "getuid"):
+		return True
+	return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def ensure_private(folder):
+	"""
+	Create a cache folder readable by its owner only. Returns False when the
+	folder can not be created or is not the user's own.
+	"""
+	try:
+		if not os.path.isdir(folder):
+			os.makedirs(folder, 0o700)
+		return _owned(os.stat(folder))
+	except OSError:
+		return False
+
+
+def trusted(path):
+	"""
+	Return True if a cache file belongs to the user and only they can write it.
+	"""
+	try:
+		return _owned(os.stat(path))
+	except OSError:
+		return False
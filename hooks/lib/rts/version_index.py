@@ -0,0 +1,224 @@
+"""
+Index of the versions present on disk for a template.
+
+Finding the next version of a file used to mean globbing the file system with
+tk.paths_from_template() or listing a folder and picking the last name in
+string order, which puts v1000 before v999. VersionIndex lists each folder
+holding versions once, parses the names with the template and keeps the
+version numbers sorted numerically, grouped by the other fields of the names:
+
+	versions = version_index.get_index()
+	latest = versions.latest_version(audio_template, flds)
+	flds["version"] = versions.next_version(audio_template, flds)
+
+The folder is the one containing the part of the template holding {version}.
+It may be the file itself ('.../{Shot}_{Step}_v{version}.wav') or a version
+folder ('.../publish/v{version}/playblast'), in which case the rest of the
+template must be static. A folder is listed again when its modification time
+changes; code writing a new version can also call invalidate() to make sure
+the next query sees it.
+
+Fields missing from a query or named in skip_keys match any value, like with
+tk.paths_from_template().
+"""
+
+import os
+import re
+import threading
+
+VERSION_KEY = "version"
+
+_DYNAMIC = re.compile(r"[\[\]{}]")
+_NUMBER = re.compile(r"\d+")
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+	"""
+	Return the version index of the session.
+	"""
+	global _index
+	with _index_lock:
+		if _index is None:
+			_index = VersionIndex()
+		return _index
+
+
+def _field_names(template):
+	"""
+	Return the names of the fields of a template, the aliases of keys included.
+	"""
+	return set(getattr(key, "alias", None) or name for name, key in template.keys.items())
+
+
+def _same_value(a, b):
+	return a == b or str(a) == str(b)
+
+
+class _Folder(object):
+	"""
+	Versions parsed from one folder for one template.
+	"""
+	__slots__ = ("mtime", "groups")
+
+	def __init__(self, mtime, groups):
+		self.mtime = mtime
+		# {((field, value), ...): [(version, path), ...] sorted by version}
+		self.groups = groups
+
+
+class VersionIndex(object):
+	"""
+	Numerically sorted versions per folder and per non-version fields,
+	refreshed when the modification time of a folder changes.
+
+	:param version_key: Name of the version field
+	"""
+
+	def __init__(self, version_key=VERSION_KEY):
+		self.version_key = version_key
+		self._folders = {}
+		self._lock = threading.Lock()
+		self.stats = {"queries": 0, "listings": 0}
+
+	def _layout(self, template):
+		"""
+		Return (number of folders above the version part, static segments
+		following it) for a template.
+		"""
+		segments = [s for s in template.definition.replace("\\", "/").split("/") if s]
+		token = "{%s}" % self.version_key
+		for position, segment in enumerate(segments):
+			if token in segment:
+				trailing = segments[position + 1:]
+				if any(_DYNAMIC.search(s) for s in trailing):
+					raise ValueError("Template %s has keys after its version, only static folders may follow "
+									 "{%s}" % (getattr(template, "name", template), self.version_key))
+				return len(trailing) + 1, trailing
+		raise ValueError("Template %s has no {%s} key" % (getattr(template, "name", template), self.version_key))
+
+	def folder(self, template, fields):
+		"""
+		Return the folder holding the versions of a template for some fields.
+		"""
+		depth, _ = self._layout(template)
+		fields = dict(fields)
+		if fields.get(self.version_key) is None:
+			fields[self.version_key] = 1
+		path = template.apply_fields(fields)
+		for _ in range(depth):
+			path = os.path.dirname(path)
+		return path
+
+	def _listing(self, template, folder):
+		key = (id(template), os.path.normcase(os.path.normpath(folder)))
+		try:
+			mtime = os.stat(folder).st_mtime
+		except OSError:
+			mtime = None
+		with self._lock:
+			cached = self._folders.get(key)
+			if cached is not None and cached.mtime == mtime:
+				return cached
+
+		groups = {}
+		if mtime is not None:
+			self.stats["listings"] += 1
+			_, trailing = self._layout(template)
+			for name in os.listdir(folder):
+				path = os.path.join(folder, name, *trailing)
+				if not template.validate(path):
+					continue
+				fields = template.get_fields(path)
+				version = fields.pop(self.version_key, None)
+				if not isinstance(version, int):
+					continue
+				group = tuple(sorted(fields.items()))
+				groups.setdefault(group, []).append((version, path))
+			for versions in groups.values():
+				versions.sort()
+		cached = _Folder(mtime, groups)
+		with self._lock:
+			self._folders[key] = cached
+		return cached
+
+	def _matches(self, template, fields, skip_keys=None):
+		"""
+		Return the sorted (version, path) entries matching the fields.
+		"""
+		self.stats["queries"] += 1
+		skip = set(skip_keys or [])
+		skip.add(self.version_key)
+		names = _field_names(template)
+		wanted = [(k, v) for k, v in fields.items() if k in names and k not in skip and v is not None]
+		folder = self.folder(template, fields)
+		found = []
+		for group, versions in self._listing(template, folder).groups.items():
+			values = dict(group)
+			if all(k in values and _same_value(values[k], v) for k, v in wanted):
+				found.extend(versions)
+		found.sort()
+		return found
+
+	def versions(self, template, fields, skip_keys=None):
+		"""
+		Return the sorted version numbers existing on disk for a template and
+		fields, the version field being ignored.
+		"""
+		return sorted(set(version for version, _ in self._matches(template, fields, skip_keys)))
+
+	def latest_version(self, template, fields, skip_keys=None):
+		"""
+		Return the highest version on disk, 0 if there is none.
+		"""
+		found = self._matches(template, fields, skip_keys)
+		return found[-1][0] if found else 0
+
+	def next_version(self, template, fields, skip_keys=None):
+		"""
+		Return the version following the highest one on disk, 1 if there is none.
+		"""
+		return self.latest_version(template, fields, skip_keys) + 1
+
+	def latest_path(self, template, fields, skip_keys=None):
+		"""
+		Return the path of the highest version on disk, None if there is none.
+		"""
+		found = self._matches(template, fields, skip_keys)
+		return found[-1][1] if found else None
+
+	def invalidate(self, folder=None):
+		"""
+		Forget the listing of a folder, of every folder by default.
+		"""
+		with self._lock:
+			if folder is None:
+				self._folders.clear()
+				return
+			folder = os.path.normcase(os.path.normpath(folder))
+			for key in [k for k in self._folders if k[1] == folder]:
+				del self._folders[key]
+
+
+def numeric_sort_key(name):
+	"""
+	Sort key ordering names on the last number they contain, then on the name,
+	so that v1000 comes after v999.
+	"""
+	numbers = _NUMBER.findall(name)
+	return (int(numbers[-1]) if numbers else -1, name)
+
+
+def last_in_folder(folder):
+	"""
+	Return the name in a folder with the highest last number, None if the
+	folder is missing or empty. For folders without a template to parse them.
+	"""
+	if not os.path.isdir(folder):
+		return None
+	names = os.listdir(folder)
+	if not names:
+		return None
+	return max(names, key=numeric_sort_key)
@@ -0,0 +1,56 @@
+"""
+Tests of the process_folder_creation actions run by folder_batch, against a
+temporary project root.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import folder_batch
+from rts import fs_cache
+
+
+class ProcessItemsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+		fs_cache.reset()
+
+	def tearDown(self):
+		shutil.rmtree(self.root)
+		fs_cache.reset()
+
+	def path(self, *names):
+		return os.path.join(self.root, *names)
+
+	def test_remote_entity_folders_missing_locally_are_created(self):
+		items = [{"action": "entity_folder", "path": self.path("sequences", "q010")},
+				 {"action": "remote_entity_folder", "path": self.path("sequences", "q010", "q010_s010")},
+				 {"action": "folder", "path": self.path("sequences", "q010", "q010_s010", "ani")}]
+		created = folder_batch.process_items(items)
+		self.assertEqual(created, [self.path("sequences", "q010"), self.path("sequences", "q010", "q010_s010"),
+								   self.path("sequences", "q010", "q010_s010", "ani")])
+		self.assertTrue(os.path.isdir(self.path("sequences", "q010", "q010_s010", "ani")))
+
+	def test_remote_entity_folders_present_locally_are_left_alone(self):
+		os.makedirs(self.path("assets", "Prop", "lamp"))
+		items = [{"action": "remote_entity_folder", "path": self.path("assets", "Prop", "lamp")}]
+		self.assertEqual(folder_batch.process_items(items), [])
+
+	def test_preview_mode_reports_without_writing(self):
+		items = [{"action": "remote_entity_folder", "path": self.path("assets", "Prop", "lamp")},
+				 {"action": "create_file", "path": self.path("assets", "Prop", "lamp", "notes.txt"), "content": b"lamp"}]
+		created = folder_batch.process_items(items, preview_mode=True)
+		self.assertEqual(created, [self.path("assets", "Prop", "lamp"), self.path("assets", "Prop", "lamp", "notes.txt")])
+		self.assertFalse(os.path.exists(self.path("assets")))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests of the folder creation plan: a plan of the config schema is made for a
+temporary project root, estimated, executed, and the created tree checked
+against it.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+	from rts import folder_plan
+	from rts import schema_materializer
+except ImportError:
+	# the schema is read with yaml, from PyYAML or from Toolkit
+	folder_plan = None
+
+
+@unittest.skipIf(folder_plan is None, "yaml is not installed")
+class FolderPlanTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.root = os.path.join(self.folder, "RTS")
+		self.entities = schema_materializer.sequence_entities("q010", 3, ["ani"])
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def plan(self):
+		return folder_plan.plan(self.entities, self.root, engine="tk-maya", workers=2)
+
+	def test_plan_writes_nothing(self):
+		creation = self.plan()
+		self.assertTrue(creation.folders)
+		self.assertFalse(os.path.exists(self.root))
+		self.assertEqual(len(creation.folders_to_create), len(creation.folders))
+
+	def test_estimate_counts_the_plan(self):
+		creation = self.plan()
+		estimate = creation.estimate()
+		self.assertEqual(estimate["entities"], len(self.entities))
+		self.assertEqual(estimate["folders_to_create"], len(creation.folders))
+		self.assertEqual(estimate["files_to_create"], len(creation.files))
+		self.assertEqual(estimate["syscalls"], len(creation.folders) + len(creation.files))
+		registered = [path for path, _, kind in creation.folders if kind in folder_plan.REGISTERED_KINDS]
+		self.assertEqual(estimate["shotgun_registrations"], len(registered))
+		for code in ["q010", "q010_s010", "q010_s020", "q010_s030"]:
+			self.assertTrue([path for path in registered if os.path.basename(path) == code], code)
+
+	def test_execute_creates_the_planned_tree(self):
+		creation = self.plan()
+		estimate = creation.estimate()
+		progress = []
+		stats = creation.execute(chunk_size=5, workers=2, progress_cb=lambda done, total: progress.append((done, total)))
+
+		self.assertEqual(stats["folders_created"], estimate["folders_to_create"])
+		self.assertEqual(stats["folders_existing"], 0)
+		self.assertEqual(stats["files_linked"] + stats["files_copied"], estimate["files_to_create"])
+		self.assertEqual(progress[-1], (estimate["syscalls"], estimate["syscalls"]))
+
+		for path, _, _ in creation.folders:
+			self.assertTrue(os.path.isdir(path), path)
+		for path, source, _ in creation.files:
+			self.assertTrue(os.path.isfile(path), path)
+			with open(path, "rb") as created, open(source, "rb") as original:
+				self.assertEqual(created.read(), original.read())
+
+		created = set()
+		for folder, names, files in os.walk(self.root):
+			created.update(os.path.join(folder, name) for name in names + files)
+		planned = set(path for path, _, _ in creation.folders) | set(path for path, _, _ in creation.files)
+		self.assertEqual(created, planned - set([self.root]))
+
+	def test_existing_folders_are_left_out(self):
+		self.plan().execute(workers=2)
+		creation = self.plan()
+		self.assertEqual(creation.folders_to_create, [])
+		self.assertEqual(creation.files_to_create, [])
+		self.assertEqual(creation.estimate()["syscalls"], 0)
+
+	def test_partial_tree_is_completed(self):
+		first = self.plan()
+		shot = [path for path, _, _ in first.folders if os.path.basename(path) == "q010_s010"][0]
+		os.makedirs(shot)
+		creation = self.plan()
+		self.assertNotIn(shot, creation.folders_to_create)
+		made = [path for path in first.folders_to_create if (shot + os.sep).startswith(path + os.sep)]
+		self.assertEqual(len(creation.folders_to_create), len(first.folders_to_create) - len(made))
+		creation.execute(workers=2)
+		for path, _, _ in first.folders:
+			self.assertTrue(os.path.isdir(path), path)
+
+
+if __name__ == "__main__":
+	unittest.main()
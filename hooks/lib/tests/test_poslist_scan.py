@@ -0,0 +1,133 @@
+"""
+Tests of the position list scan on a fake scene graph.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import poslist_scan
+
+MOVED = ([10.0, 0.0, -5.0], [0.0, 90.0, 0.0], [2.0, 2.0, 2.0])
+
+
+class FakeEntry(object):
+	"""
+	Transform of the fake scene graph, as documented in poslist_scan.py.
+	"""
+
+	def __init__(self, long_name, locator=True, trs=([0, 0, 0], [0, 0, 0], [1, 1, 1])):
+		self.long_name = long_name
+		self.name = long_name.rsplit("|", 1)[-1]
+		self.locator = locator
+		self.trs = trs
+		self.read = False
+
+	def is_locator(self):
+		return self.locator
+
+	def transform(self):
+		self.read = True
+		return self.trs
+
+
+class CollectTest(unittest.TestCase):
+
+	def test_locators_named_like_items_are_collected_by_type(self):
+		content, errors = poslist_scan.collect([FakeEntry("|SET_kitchen_001"),
+												FakeEntry("|SET_kitchen_001|PRP_chair_001", trs=MOVED),
+												FakeEntry("|SET_kitchen_001|PRP_chair_002"),
+												FakeEntry("|layout:CHR_bob_001")])
+		self.assertEqual(errors, [])
+		self.assertEqual(sorted(content), ["CHR", "PRP", "SET"])
+		self.assertEqual(sorted(content["PRP"]), ["PRP_chair_001", "PRP_chair_002"])
+		chair = content["PRP"]["PRP_chair_001"]
+		self.assertEqual((chair["asset"], chair["assetType"], chair["longName"]),
+						 ("chair", "PRP", "|SET_kitchen_001|PRP_chair_001"))
+		self.assertEqual((chair["position"], chair["rotation"], chair["scale"]), MOVED)
+		self.assertEqual(list(content["CHR"]), ["CHR_bob_001"])
+
+	def test_other_transforms_are_not_read(self):
+		group = FakeEntry("|GRP_props")
+		mesh = FakeEntry("|PRP_chair_001_geo", locator=False)
+		content, errors = poslist_scan.collect([group, mesh])
+		self.assertEqual(content, {})
+		self.assertFalse(group.read or mesh.read)
+
+	def test_doubles_are_reported(self):
+		content, errors = poslist_scan.collect([FakeEntry("|SET_a|PRP_chair_001"), FakeEntry("|SET_b|PRP_chair_001")])
+		self.assertEqual(list(content["PRP"]), ["PRP_chair_001"])
+		self.assertEqual(errors, ["DOUBLE 'PRP_chair_001' in scene!"])
+
+	def test_types_can_be_restricted(self):
+		content, errors = poslist_scan.collect([FakeEntry("|SET_kitchen_001"), FakeEntry("|PRP_chair_001")],
+											   types=("PRP",))
+		self.assertEqual(list(content), ["PRP"])
+
+
+class FakeNode(object):
+
+	def __init__(self, name):
+		self.name = name
+
+
+class FakePath(object):
+
+	def __init__(self, long_name):
+		self.long_name = long_name
+
+	def node(self):
+		return FakeNode(self.long_name.rsplit("|", 1)[-1])
+
+	def fullPathName(self):
+		return self.long_name
+
+
+class FakeDependencyNode(object):
+
+	def setObject(self, node):
+		self._node = node
+
+	def name(self):
+		return self._node.name
+
+
+class PathEntriesTest(unittest.TestCase):
+	"""
+	path_entries() on DAG paths of the fake scene graph, maya.api.OpenMaya
+	standing in for the node names only.
+	"""
+
+	def setUp(self):
+		self.modules = dict((name, sys.modules.get(name)) for name in ("maya", "maya.api", "maya.api.OpenMaya"))
+		open_maya = types.ModuleType("maya.api.OpenMaya")
+		open_maya.MFnDependencyNode = FakeDependencyNode
+		api = types.ModuleType("maya.api")
+		api.OpenMaya = open_maya
+		maya = types.ModuleType("maya")
+		maya.api = api
+		sys.modules.update({"maya": maya, "maya.api": api, "maya.api.OpenMaya": open_maya})
+
+	def tearDown(self):
+		for name, module in self.modules.items():
+			if module is None:
+				sys.modules.pop(name, None)
+			else:
+				sys.modules[name] = module
+
+	def test_only_paths_named_like_items_are_entries(self):
+		paths = [FakePath("|SET_kitchen_001"), FakePath("|SET_kitchen_001|GRP_props"),
+				 FakePath("|SET_kitchen_001|layout:PRP_chair_001")]
+		entries = list(poslist_scan.path_entries(paths))
+		self.assertEqual([entry.name for entry in entries], ["SET_kitchen_001", "layout:PRP_chair_001"])
+		self.assertEqual(entries[1].long_name, "|SET_kitchen_001|layout:PRP_chair_001")
+		self.assertEqual(list(poslist_scan.path_entries(paths, types=("PRP",)))[0].path, paths[2])
+
+
+if __name__ == "__main__":
+	unittest.main()
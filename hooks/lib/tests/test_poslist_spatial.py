@@ -0,0 +1,137 @@
+"""
+Tests of the frustum queries of the position list spatial index, with NumPy
+and in plain Python.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import poslist_spatial
+
+IDENTITY = [1.0, 0.0, 0.0, 0.0,
+			0.0, 1.0, 0.0, 0.0,
+			0.0, 0.0, 1.0, 0.0,
+			0.0, 0.0, 0.0, 1.0]
+# 35mm focal length on a 1.417 x 0.945 inch film back, about 54 by 38 degrees
+CAMERA = poslist_spatial.Camera(IDENTITY, 35.0, 1.417, 0.945, 1.0, 1.0, 1000.0)
+HALF_WIDTH = 1.417 * poslist_spatial.INCH * 0.5 / 35.0
+
+# name, center, radius; the camera sits at the origin looking down -Z
+ITEMS = [("inside", [0.0, 0.0, -100.0], 1.0),
+		 ("behind", [0.0, 0.0, 100.0], 1.0),
+		 ("left", [-100.0, 0.0, -50.0], 1.0),
+		 ("above", [0.0, 100.0, -50.0], 1.0),
+		 ("beyond_far", [0.0, 0.0, -1100.0], 1.0),
+		 ("straddling_far", [0.0, 0.0, -1005.0], 10.0),
+		 ("straddling_near", [0.0, 0.0, 3.0], 5.0),
+		 ("straddling_right", [HALF_WIDTH * 100.0 + 2.0, 0.0, -100.0], 5.0),
+		 ("outside_right", [HALF_WIDTH * 100.0 + 20.0, 0.0, -100.0], 5.0)]
+
+VISIBLE = ["inside", "straddling_far", "straddling_near", "straddling_right"]
+
+
+def _turned(angle):
+	"""
+	Return the world matrix of a camera at (0, 0, 10) turned by angle degrees
+	about Y, looking down -X for 90.
+	"""
+	import math
+	c = math.cos(math.radians(angle))
+	s = math.sin(math.radians(angle))
+	return [c, 0.0, -s, 0.0,
+			0.0, 1.0, 0.0, 0.0,
+			s, 0.0, c, 0.0,
+			0.0, 0.0, 10.0, 1.0]
+
+
+class SpatialTestCase(unittest.TestCase):
+	numpy = poslist_spatial.numpy
+
+	def setUp(self):
+		self._numpy = poslist_spatial.numpy
+		poslist_spatial.numpy = self.numpy
+
+	def tearDown(self):
+		poslist_spatial.numpy = self._numpy
+
+	def index(self, cell_size=None):
+		return poslist_spatial.SpatialIndex([name for name, center, radius in ITEMS],
+											[center for name, center, radius in ITEMS],
+											[radius for name, center, radius in ITEMS], cell_size)
+
+
+class PlanesTest(SpatialTestCase):
+
+	def test_planes_point_inside(self):
+		planes = poslist_spatial.frustum_planes(CAMERA)
+		self.assertEqual(len(planes), 6)
+		for name, center, radius in ITEMS:
+			self.assertEqual(poslist_spatial.sphere_visible(planes, center, radius), name in VISIBLE, name)
+
+	def test_planes_follow_the_camera(self):
+		camera = CAMERA._replace(matrix=_turned(90))
+		planes = poslist_spatial.frustum_planes(camera)
+		self.assertTrue(poslist_spatial.sphere_visible(planes, [-100.0, 0.0, 10.0], 1.0))
+		self.assertFalse(poslist_spatial.sphere_visible(planes, [0.0, 0.0, -100.0], 1.0))
+
+	def test_overscan_widens_the_frustum(self):
+		center = [HALF_WIDTH * 100.0 + 3.0, 0.0, -100.0]
+		self.assertFalse(poslist_spatial.sphere_visible(poslist_spatial.frustum_planes(CAMERA), center, 1.0))
+		wider = poslist_spatial.frustum_planes(CAMERA._replace(overscan=1.1))
+		self.assertTrue(poslist_spatial.sphere_visible(wider, center, 1.0))
+
+
+class PurePythonIndexTest(SpatialTestCase):
+	numpy = None
+
+	def test_query_returns_the_items_in_the_frustum(self):
+		index = self.index()
+		names = [index.names[i] for i in index.query(poslist_spatial.frustum_planes(CAMERA))]
+		self.assertEqual(sorted(names), VISIBLE)
+
+	def test_result_does_not_depend_on_the_cell_size(self):
+		for cell_size in (1.0, 37.0, 5000.0):
+			self.assertEqual(self.index(cell_size).visible([CAMERA]), VISIBLE)
+
+	def test_visible_unites_the_frames(self):
+		frames = [CAMERA, CAMERA._replace(matrix=_turned(180))]
+		self.assertEqual(self.index().visible(frames), sorted(VISIBLE + ["behind"]))
+
+	def test_empty_index(self):
+		self.assertEqual(poslist_spatial.SpatialIndex([], [], []).visible([CAMERA]), [])
+
+
+@unittest.skipIf(poslist_spatial.numpy is None, "NumPy is not installed")
+class NumpyIndexTest(PurePythonIndexTest):
+	numpy = poslist_spatial.numpy
+
+	def test_same_result_as_pure_python(self):
+		import random
+		generator = random.Random(7)
+		names = ["item%d" % i for i in range(2000)]
+		centers = [[generator.uniform(-2000, 2000) for _ in range(3)] for _ in names]
+		radii = [generator.uniform(0.1, 50.0) for _ in names]
+		frames = [CAMERA._replace(matrix=_turned(angle)) for angle in range(0, 360, 45)]
+		with_numpy = poslist_spatial.SpatialIndex(names, centers, radii).visible(frames)
+		poslist_spatial.numpy = None
+		self.assertEqual(poslist_spatial.SpatialIndex(names, centers, radii).visible(frames), with_numpy)
+
+
+class RadiusTest(unittest.TestCase):
+
+	def test_item_radius_scales_with_the_largest_axis(self):
+		self.assertEqual(poslist_spatial.item_radius(2.0, [1.0, -3.0, 0.5]), 6.0)
+		self.assertEqual(poslist_spatial.item_radius(2.0, None), 2.0)
+
+	def test_bounding_radius_from_the_pivot(self):
+		self.assertEqual(poslist_spatial.bounding_radius([-1.0, 0.0, -2.0, 3.0, 4.0, 2.0]), 5.385164807134504)
+		self.assertEqual(poslist_spatial.bounding_radius([0.0, 0.0, 0.0, 2.0, 2.0, 1.0], [1.0, 1.0, 0.5]), 1.5)
+
+
+if __name__ == "__main__":
+	unittest.main()
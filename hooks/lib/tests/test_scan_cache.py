@@ -0,0 +1,77 @@
+"""
+Tests of the reuse of scan results by the scan cache, with the scene state
+read from a stand-in instead of Maya.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import scan_cache
+
+
+class StandInScene(object):
+	"""
+	Scene state changed by the tests, read like maya_state() reads Maya.
+	"""
+
+	def __init__(self):
+		self.path = "/W/RTS/q010/layout/q010_layout_v003.ma"
+		self.modified = False
+		self.selection = ("|chair_001",)
+		self.time = 1001.0
+
+	def probe(self, tracker, selection=False, current_time=False):
+		return scan_cache.SceneState(self.path, self.modified, 1.0, tracker.counter, tracker.installed,
+									 self.selection if selection else None, self.time if current_time else None)
+
+
+class ScanCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.scene = StandInScene()
+		self.cache = scan_cache.ScanCache(probe=self.scene.probe, max_age=60)
+		self.scans = 0
+
+	def scan(self, **kwargs):
+		def function():
+			self.scans += 1
+			return [{"name": "positionlist", "time": self.scene.time}]
+		return self.cache.scan("scan", function, **kwargs)
+
+	def test_unchanged_scene_reuses_the_result(self):
+		self.scan()
+		self.assertEqual(self.scan(), [{"name": "positionlist", "time": 1001.0}])
+		self.assertEqual(self.scans, 1)
+
+	def test_time_change_scans_again_when_the_scan_reads_the_time(self):
+		self.scan(current_time=True)
+		self.scene.time = 1040.0
+		self.assertEqual(self.scan(current_time=True), [{"name": "positionlist", "time": 1040.0}])
+		self.assertEqual(self.scans, 2)
+
+	def test_time_change_is_ignored_by_other_scans(self):
+		self.scan()
+		self.scene.time = 1040.0
+		self.scan()
+		self.assertEqual(self.scans, 1)
+
+	def test_selection_change_scans_again(self):
+		self.scan(selection=True)
+		self.scene.selection = ("|table_001",)
+		self.scan(selection=True)
+		self.assertEqual(self.scans, 2)
+
+	def test_modified_scene_without_tracker_scans_again(self):
+		self.scene.modified = True
+		self.scan()
+		self.scan()
+		self.assertEqual(self.scans, 2)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,71 @@
+"""
+Tests of the scene graph answers the asset scans use, on a scene graph built
+by hand.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import scene_hierarchy
+
+
+def _layout():
+	"""
+	SET_kitchen holding PRP_chair_001, instanced below SET_kitchen and
+	SET_garden, and PRP_table_001.
+	"""
+	hierarchy = scene_hierarchy.SceneHierarchy()
+	hierarchy.add("SET_kitchen", "transform")
+	hierarchy.add("SET_kitchenShape", "locator", "SET_kitchen")
+	hierarchy.add("SET_kitchen|PRP_chair_001", "transform", "SET_kitchen", node="chair")
+	hierarchy.add("SET_kitchen|PRP_chair_001|PRP_chair_001Shape", "locator", "SET_kitchen|PRP_chair_001",
+				  node="chairShape")
+	hierarchy.add("SET_kitchen|PRP_chair_001|chair_geo", "mesh", "SET_kitchen|PRP_chair_001", node="chairGeo")
+	hierarchy.add("PRP_table_001", "transform", "SET_kitchen")
+	hierarchy.add("PRP_table_001Shape", "locator", "PRP_table_001")
+	hierarchy.add("SET_garden", "transform")
+	hierarchy.add("SET_garden|PRP_chair_001", "transform", "SET_garden", node="chair")
+	hierarchy.add("SET_garden|PRP_chair_001|PRP_chair_001Shape", "locator", "SET_garden|PRP_chair_001",
+				  node="chairShape")
+	hierarchy.add("SET_garden|PRP_chair_001|chair_geo", "mesh", "SET_garden|PRP_chair_001", node="chairGeo")
+	return hierarchy
+
+
+class SceneHierarchyTest(unittest.TestCase):
+
+	def setUp(self):
+		self.hierarchy = _layout()
+
+	def test_locator_transforms_list_every_instance_path(self):
+		self.assertEqual(self.hierarchy.locator_transforms(),
+						 ["SET_kitchen", "SET_kitchen|PRP_chair_001", "PRP_table_001", "SET_garden|PRP_chair_001"])
+
+	def test_instances_are_counted_by_node(self):
+		self.assertEqual(self.hierarchy.instance_count("SET_kitchen|PRP_chair_001"), 2)
+		self.assertEqual(self.hierarchy.instances("SET_garden|PRP_chair_001"),
+						 ["SET_kitchen|PRP_chair_001", "SET_garden|PRP_chair_001"])
+		self.assertEqual(self.hierarchy.instance_count("PRP_table_001"), 1)
+		self.assertEqual(self.hierarchy.instance_count("not_in_scene"), 1)
+
+	def test_first_instances_keep_one_path_per_node(self):
+		objects = self.hierarchy.first_instances(self.hierarchy.locator_transforms())
+		self.assertEqual(objects, ["SET_kitchen", "SET_kitchen|PRP_chair_001", "PRP_table_001"])
+
+	def test_parents_and_types(self):
+		chains, types = self.hierarchy.parents_and_types(["SET_kitchen|PRP_chair_001", "PRP_table_001"])
+		self.assertEqual(chains["PRP_table_001"], ["SET_kitchen"])
+		self.assertEqual(types, {"SET_kitchen|PRP_chair_001": "Prop", "PRP_table_001": "Prop", "SET_kitchen": "Set"})
+
+	def test_descendants_with_types(self):
+		self.assertEqual(self.hierarchy.descendants_with_types("SET_garden|PRP_chair_001"),
+						 ["SET_garden|PRP_chair_001|PRP_chair_001Shape", "locator",
+						  "SET_garden|PRP_chair_001|chair_geo", "mesh"])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,267 @@
+"""
+Tests of the find()/find_one() semantics of the Shotgun mirror, refreshed from
+a local Shotgun stand-in.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import sg_mirror
+
+PROJECT = {"type": "Project", "id": 66, "name": "stork"}
+UPDATED = datetime.datetime(2015, 3, 2, 10, 0, 0)
+
+
+class StandInShotgun(object):
+	"""
+	Local Shotgun answering the queries the mirror makes to refresh itself,
+	and recording every call. Entity types and fields the mirror does not
+	keep are answered with a marker, to check what falls back.
+	"""
+
+	def __init__(self, records, events=()):
+		self.records = records
+		self.events = list(events)
+		self.calls = []
+
+	def find(self, entity_type, filters, fields=None, order=None, filter_operator=None, limit=0, **kwargs):
+		self.calls.append((entity_type, filters))
+		if entity_type == "EventLogEntry":
+			since = [f[2] for f in filters if f[0] == "id"][0]
+			types = [f[2] for f in filters if f[0] == "event_type"][0]
+			return [event for event in self.events if event["id"] > since and event["event_type"] in types]
+		# the mirror refreshes by project and updated_at, and revives by id
+		refresh = filters and (filters[0][0] == "project" or (len(filters) == 1 and filters[0][:2] == ["id", "in"]))
+		if entity_type not in sg_mirror.MIRRORED_FIELDS or not refresh:
+			return [{"type": entity_type, "id": -1, "live": True}]
+		found = []
+		for record in self.records.get(entity_type, []):
+			keep = True
+			for field, operator, value in filters:
+				if field == "project":
+					keep = keep and record["project"]["id"] == value["id"]
+				elif field == "updated_at":
+					keep = keep and record["updated_at"] > value
+				elif field == "id":
+					keep = keep and record["id"] in value
+			if keep:
+				found.append(dict(record))
+		return found
+
+	def find_one(self, entity_type, filters, fields=None, order=None, filter_operator=None, **kwargs):
+		if entity_type == "EventLogEntry":
+			self.calls.append((entity_type, filters))
+			return {"type": "EventLogEntry", "id": 100}
+		found = self.find(entity_type, filters, fields, order=order, filter_operator=filter_operator)
+		if found:
+			return found[0]
+		return None
+
+
+def _record(entity_type, entity_id, **fields):
+	record = {"type": entity_type, "id": entity_id, "project": PROJECT, "updated_at": UPDATED}
+	record.update(fields)
+	return record
+
+
+SEQUENCE = {"type": "Sequence", "id": 3, "name": "q010"}
+OTHER_SEQUENCE = {"type": "Sequence", "id": 4, "name": "q020"}
+
+RECORDS = {
+	"Sequence": [_record("Sequence", 3, code="q010"), _record("Sequence", 4, code="q020")],
+	"Shot": [_record("Shot", 11, code="q010_s010", sg_sequence=SEQUENCE, sg_cut_in=1001, sg_cut_out=1040,
+					 sg_status_list="ip"),
+			 _record("Shot", 12, code="q010_s020", sg_sequence=SEQUENCE, sg_cut_in=1001, sg_cut_out=1096,
+					 sg_status_list="omt"),
+			 _record("Shot", 13, code="Q020_S010", sg_sequence=OTHER_SEQUENCE, sg_cut_in=995, sg_cut_out=None,
+					 sg_status_list="ip")],
+	"Asset": [_record("Asset", 21, code="chair", sg_asset_type="Prop", parents=[]),
+			  _record("Asset", 22, code="chairLeg", sg_asset_type="Prop",
+					  parents=[{"type": "Asset", "id": 21, "name": "chair"}]),
+			  _record("Asset", 23, code="kitchen", sg_asset_type="Set",
+					  parents=[{"type": "Asset", "id": 24, "name": "house"},
+							   {"type": "Asset", "id": 21, "name": "chair"}])],
+}
+
+
+class MirrorTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.sg = StandInShotgun(RECORDS)
+		self.mirror = sg_mirror.ShotgunMirror(self.sg, PROJECT, db_path=":memory:")
+
+	def tearDown(self):
+		self.mirror.close()
+
+	def ids(self, entity_type, filters, **kwargs):
+		return [record["id"] for record in self.mirror.find(entity_type, filters, ["code"], **kwargs)]
+
+
+class FindTest(MirrorTestCase):
+
+	def test_is_compares_entities_by_type_and_id(self):
+		self.assertEqual(self.ids("Shot", [["sg_sequence", "is", {"type": "Sequence", "id": 3}]]), [11, 12])
+		self.assertEqual(self.ids("Shot", [["sg_sequence", "is", {"type": "Asset", "id": 3}]]), [])
+
+	def test_is_on_text_ignores_case(self):
+		self.assertEqual(self.ids("Shot", [["code", "is", "q020_s010"]]), [13])
+
+	def test_is_not_and_not_in(self):
+		self.assertEqual(self.ids("Shot", [["sg_status_list", "is_not", "omt"]]), [11, 13])
+		self.assertEqual(self.ids("Shot", [["code", "not_in", ["q010_s010", "q010_s020"]]]), [13])
+
+	def test_in_takes_a_list_or_several_values(self):
+		self.assertEqual(self.ids("Asset", [["code", "in", ["chair", "kitchen"]]]), [21, 23])
+		self.assertEqual(self.ids("Asset", [["code", "in", "chair", "kitchen"]]), [21, 23])
+
+	def test_multi_entity_is_matches_any_linked_entity(self):
+		chair = {"type": "Asset", "id": 21}
+		self.assertEqual(self.ids("Asset", [["parents", "is", chair]]), [22, 23])
+		self.assertEqual(self.ids("Asset", [["parents", "is_not", chair]]), [21])
+
+	def test_text_operators(self):
+		self.assertEqual(self.ids("Shot", [["code", "starts_with", "Q010"]]), [11, 12])
+		self.assertEqual(self.ids("Shot", [["code", "ends_with", "s010"]]), [11, 13])
+		self.assertEqual(self.ids("Asset", [["code", "contains", "LEG"]]), [22])
+		self.assertEqual(self.ids("Asset", [["code", "not_contains", "chair"]]), [23])
+		self.assertEqual(self.ids("Shot", [["sg_sequence", "starts_with", "q02"]]), [13])
+
+	def test_comparisons_leave_out_empty_values(self):
+		self.assertEqual(self.ids("Shot", [["sg_cut_in", "greater_than", 1000]]), [11, 12])
+		self.assertEqual(self.ids("Shot", [["sg_cut_out", "less_than", 1050]]), [11])
+
+	def test_filters_are_and_ed_by_default(self):
+		filters = [["sg_sequence", "is", SEQUENCE], ["sg_status_list", "is", "ip"]]
+		self.assertEqual(self.ids("Shot", filters), [11])
+
+	def test_any_operator_and_nested_groups(self):
+		filters = [["code", "is", "chair"], ["sg_asset_type", "is", "Set"]]
+		self.assertEqual(self.ids("Asset", filters, filter_operator="any"), [21, 23])
+		nested = [["sg_status_list", "is", "ip"],
+				  {"filter_operator": "any", "filters": [["sg_cut_in", "less_than", 1000],
+														 ["code", "is", "q010_s020"]]}]
+		self.assertEqual(self.ids("Shot", nested), [13])
+
+	def test_order_and_limit(self):
+		order = [{"field_name": "sg_cut_out", "direction": "desc"}]
+		self.assertEqual(self.ids("Shot", [], order=order), [12, 11, 13])
+		self.assertEqual(self.ids("Shot", [], order=order, limit=2), [12, 11])
+		order = [{"field_name": "sg_cut_in", "direction": "asc"}, {"field_name": "code", "direction": "desc"}]
+		self.assertEqual(self.ids("Shot", [], order=order), [13, 12, 11])
+
+	def test_only_requested_fields_are_returned(self):
+		shot = self.mirror.find_one("Shot", [["id", "is", 11]], ["code", "sg_cut_in"])
+		self.assertEqual(shot, {"type": "Shot", "id": 11, "code": "q010_s010", "sg_cut_in": 1001})
+		shot["code"] = "changed"
+		self.assertEqual(self.mirror.find_one("Shot", [["id", "is", 11]], ["code"])["code"], "q010_s010")
+
+	def test_find_one_returns_none_without_match(self):
+		self.assertEqual(self.mirror.find_one("Asset", [["code", "is", "table"]]), None)
+		self.assertEqual(self.mirror.find_one("Asset", [["code", "is", "chair"]], ["sg_asset_type"]),
+						 {"type": "Asset", "id": 21, "sg_asset_type": "Prop"})
+
+	def test_queries_the_mirror_can_not_answer_go_to_shotgun(self):
+		live = [{"type": "Asset", "id": -1, "live": True}]
+		self.assertEqual(self.mirror.find("Asset", [["code", "is", "chair"]], ["description"]), live)
+		self.assertEqual(self.mirror.find("Asset", [["updated_at", "greater_than", UPDATED]]), live)
+		self.assertEqual(self.mirror.find("Version", [["code", "is", "chair"]]), [{"type": "Version", "id": -1,
+																				   "live": True}])
+		self.assertEqual(self.mirror.stats["fallback"], 3)
+
+
+class RefreshTest(MirrorTestCase):
+
+	def refreshed(self):
+		return sorted(set(entity_type for entity_type, filters in self.sg.calls if entity_type != "EventLogEntry"))
+
+	def test_only_the_entity_types_read_are_refreshed(self):
+		self.mirror.find("Shot", [["sg_sequence", "is", SEQUENCE]], ["code"])
+		self.assertEqual(self.refreshed(), ["Shot"])
+		self.assertEqual(len(self.sg.calls), 2)
+
+		del self.sg.calls[:]
+		self.mirror.find("Shot", [["code", "is", "q010_s010"]], ["code"])
+		self.assertEqual(self.sg.calls, [])
+
+		self.mirror.find_one("Sequence", [["code", "is", "q010"]])
+		self.assertEqual(self.refreshed(), ["Sequence"])
+
+	def test_stale_types_are_refreshed_incrementally(self):
+		self.mirror.max_staleness = 0
+		self.mirror.find("Asset", [], ["code"])
+		del self.sg.calls[:]
+		self.mirror.find("Asset", [], ["code"])
+		asset_queries = [filters for entity_type, filters in self.sg.calls if entity_type == "Asset"]
+		self.assertEqual(len(asset_queries), 1)
+		self.assertEqual([f[0] for f in asset_queries[0]], ["project", "updated_at"])
+
+	def test_retired_entities_are_dropped(self):
+		self.mirror.max_staleness = 0
+		self.assertEqual(self.ids("Asset", [["sg_asset_type", "is", "Prop"]]), [21, 22])
+		self.sg.events.append({"type": "EventLogEntry", "id": 101, "event_type": "Shotgun_Asset_Retirement",
+							   "meta": {"entity_type": "Asset", "entity_id": 22}})
+		self.assertEqual(self.ids("Asset", [["sg_asset_type", "is", "Prop"]]), [21])
+		self.assertEqual(self.mirror.stats["retired"], 1)
+
+	def test_a_miss_refreshes_its_type_once(self):
+		self.assertEqual(self.ids("Asset", [["code", "is", "table"]]), [])
+		self.sg.records = dict(RECORDS, Asset=RECORDS["Asset"] + [_record("Asset", 25, code="table")])
+		self.assertEqual(self.ids("Asset", [["code", "is", "table"]]), [])
+		self.assertEqual(self.mirror.stats["miss_refreshes"], 0)
+
+		self.mirror._synced()["Asset"] -= 10
+		self.assertEqual(self.ids("Asset", [["code", "is", "table"]]), [25])
+		self.assertEqual(self.mirror.stats["miss_refreshes"], 1)
+
+	def test_writes_through_the_mirror_are_read_back(self):
+		class Writer(StandInShotgun):
+			def create(self, entity_type, data, return_fields=None, **kwargs):
+				record = _record(entity_type, 25, **data)
+				self.records.setdefault(entity_type, []).append(record)
+				return dict(record)
+
+		self.mirror._sg = Writer(dict((t, list(r)) for t, r in RECORDS.items()))
+		self.mirror.find("Asset", [], ["code"])
+		self.mirror.create("Asset", {"code": "table", "sg_asset_type": "Prop"})
+		self.assertEqual(self.ids("Asset", [["code", "is", "table"]]), [25])
+
+
+class DatabaseTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.environ = dict(os.environ)
+		os.environ[sg_mirror.DB_DIR_ENV] = os.path.join(self.folder, "sg_mirror")
+
+	def tearDown(self):
+		os.environ.clear()
+		os.environ.update(self.environ)
+		shutil.rmtree(self.folder)
+
+	def test_database_is_kept_in_a_private_folder(self):
+		mirror = sg_mirror.ShotgunMirror(StandInShotgun(RECORDS), PROJECT)
+		mirror.close()
+		self.assertEqual(mirror.db_path, os.path.join(self.folder, "sg_mirror", "project_66.sqlite"))
+		if hasattr(os, "getuid"):
+			self.assertEqual(os.stat(os.path.dirname(mirror.db_path)).st_mode & 0o077, 0)
+
+	@unittest.skipUnless(hasattr(os, "getuid"), "owner checks are done on posix systems")
+	def test_database_others_can_write_is_not_used(self):
+		folder = os.path.join(self.folder, "sg_mirror")
+		os.makedirs(folder)
+		os.chmod(folder, 0o777)
+		mirror = sg_mirror.ShotgunMirror(StandInShotgun(RECORDS), PROJECT)
+		mirror.close()
+		self.assertEqual(mirror.db_path, ":memory:")
+
+
+if __name__ == "__main__":
+	unittest.main()
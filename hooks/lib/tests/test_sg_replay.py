@@ -0,0 +1,127 @@
+"""
+Tests of the record/replay Shotgun stand-in: a session recorded against a
+local Shotgun is replayed from its fixture file.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import sg_replay
+
+PROJECT = {"type": "Project", "id": 66}
+CREATED = datetime.datetime(2015, 3, 2, 10, 0, 0)
+
+
+class LiveShotgun(object):
+	"""
+	Local Shotgun the session is recorded against.
+	"""
+
+	def __init__(self):
+		self.records = {"Shot": {11: {"type": "Shot", "id": 11, "code": "q010_s010", "sg_cut_in": 1001,
+									  "project": PROJECT, "created_at": CREATED}}}
+		self.next_id = 100
+
+	def find(self, entity_type, filters, fields=None, **kwargs):
+		found = []
+		for record in self.records.get(entity_type, {}).values():
+			if all(record.get(field) == value for field, operator, value in filters):
+				found.append(dict((k, v) for k, v in record.items() if k in ["type", "id"] + list(fields or [])))
+		return found
+
+	def create(self, entity_type, data, return_fields=None):
+		record = dict(data, type=entity_type, id=self.next_id)
+		self.next_id += 1
+		self.records.setdefault(entity_type, {})[record["id"]] = record
+		return dict(record)
+
+	def update(self, entity_type, entity_id, data):
+		self.records[entity_type][entity_id].update(data)
+		return dict(data, type=entity_type, id=entity_id)
+
+	def batch(self, requests):
+		results = []
+		for request in requests:
+			if request["request_type"] == "create":
+				results.append(self.create(request["entity_type"], request["data"]))
+			else:
+				results.append(self.update(request["entity_type"], request["entity_id"], request["data"]))
+		return results
+
+	def upload_thumbnail(self, entity_type, entity_id, path, **kwargs):
+		return 500
+
+
+class RecordReplayTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.fixture = os.path.join(self.folder, "publish.json")
+		self.recording = sg_replay.RecordingShotgun(LiveShotgun(), self.fixture)
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def replay(self, **kwargs):
+		self.recording.save()
+		return sg_replay.ReplayShotgun(self.fixture, **kwargs)
+
+	def test_recorded_queries_are_answered_from_the_fixture(self):
+		recorded = self.recording.find("Shot", [["code", "is", "q010_s010"]], ["code", "created_at"])
+		sg = self.replay()
+		self.assertEqual(sg.find("Shot", [["code", "is", "q010_s010"]], fields=["code", "created_at"]), recorded)
+		self.assertEqual(recorded[0]["created_at"], CREATED)
+		self.assertEqual(sg.stats["recorded"], 1)
+
+	def test_queries_not_recorded_are_evaluated_against_the_seen_entities(self):
+		self.recording.find("Shot", [["code", "is", "q010_s010"]], ["code", "sg_cut_in"])
+		sg = self.replay()
+		self.assertEqual(sg.find("Shot", [["sg_cut_in", "greater_than", 1000]], ["code"]),
+						 [{"type": "Shot", "id": 11, "code": "q010_s010"}])
+		self.assertEqual(sg.stats["simulated"], 1)
+		self.assertRaises(sg_replay.ShotgunReplayError, self.replay(strict=True).find, "Shot", [], ["code"])
+
+	def test_batch_replays_its_recorded_results_as_one_write(self):
+		requests = [{"request_type": "create", "entity_type": "Version", "data": {"code": "q010_s010_v001"}},
+					{"request_type": "update", "entity_type": "Shot", "entity_id": 11, "data": {"sg_cut_in": 995}}]
+		recorded = self.recording.batch(requests)
+		self.recording.create("Version", {"code": "unrelated"})
+		sg = self.replay()
+		self.assertEqual(sg.batch(requests), recorded)
+		self.assertEqual((sg.stats["calls"], sg.stats["writes"], sg.stats["by_method"]), (1, 1, {"batch": 1}))
+		# the recorded create answer is left for the create it belongs to
+		self.assertEqual(sg.create("Version", {"code": "unrelated"})["id"], 101)
+		self.assertEqual(sg.find_one("Version", [["code", "is", "q010_s010_v001"]], ["code"])["id"], 100)
+
+	def test_batch_not_recorded_is_simulated_as_one_write(self):
+		sg = self.replay()
+		results = sg.batch([{"request_type": "create", "entity_type": "Version", "data": {"code": "v001"}},
+							{"request_type": "delete", "entity_type": "Version", "entity_id": 1}])
+		self.assertEqual(results, [{"type": "Version", "id": sg_replay.FIRST_REPLAY_ID, "code": "v001"}, False])
+		self.assertEqual((sg.stats["calls"], sg.stats["writes"]), (1, 1))
+
+	def test_types_written_during_the_replay_are_read_from_the_store(self):
+		self.recording.find("Shot", [["code", "is", "q010_s010"]], ["code", "sg_cut_in"])
+		sg = self.replay()
+		sg.update("Shot", 11, {"sg_cut_in": 1009})
+		self.assertEqual(sg.find("Shot", [["code", "is", "q010_s010"]], ["code", "sg_cut_in"]),
+						 [{"type": "Shot", "id": 11, "code": "q010_s010", "sg_cut_in": 1009}])
+		self.assertEqual(sg.stats["recorded"], 0)
+
+	def test_recorded_thumbnail_upload_is_matched(self):
+		self.recording.upload_thumbnail("Version", 100, "/tmp/q010_s010.png")
+		sg = self.replay()
+		self.assertEqual(sg.upload_thumbnail("Version", 100, "/tmp/q010_s010.png"), 500)
+		self.assertEqual(sg.stats["by_method"], {"upload_thumbnail": 1})
+
+
+if __name__ == "__main__":
+	unittest.main()
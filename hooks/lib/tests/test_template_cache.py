@@ -0,0 +1,87 @@
+"""
+Tests of the reuse of the Tank instances of a pipeline configuration, with a
+stand-in Tank built on a temporary configuration.
+
+	python -m pytest hooks/lib/tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rts import template_cache
+
+
+class StandInConfiguration(object):
+
+	def __init__(self, path):
+		self.path = path
+
+	def get_path(self):
+		return self.path
+
+
+class StandInTank(object):
+	"""
+	Tank instance of a project folder, its configuration in config/core.
+	"""
+
+	def __init__(self, project, configuration):
+		self.roots = {"primary": project}
+		self.pipeline_configuration = StandInConfiguration(configuration)
+
+
+class TankFromPathTest(unittest.TestCase):
+
+	def setUp(self):
+		template_cache.reset()
+		self.folder = tempfile.mkdtemp()
+		self.project = os.path.join(self.folder, "stork")
+		self.configuration = os.path.join(self.folder, "config_stork")
+		os.makedirs(os.path.join(self.configuration, "config", "core"))
+		os.makedirs(os.path.join(self.project, "sequences"))
+		self.write_templates("keys: {}\n")
+		self.built = []
+
+	def tearDown(self):
+		template_cache.reset()
+		shutil.rmtree(self.folder)
+
+	def write_templates(self, content):
+		path = os.path.join(self.configuration, "config", "core", "templates.yml")
+		with open(path, "w") as target:
+			target.write(content)
+		# a new size, the modification time may not have moved
+		template_cache._signatures.clear()
+
+	def factory(self, path):
+		tk = StandInTank(self.project, self.configuration)
+		self.built.append(path)
+		return tk
+
+	def tank(self, *names):
+		return template_cache.tank_from_path(os.path.join(self.project, *names), self.factory)
+
+	def test_instance_is_kept_for_the_paths_of_the_project(self):
+		tk = self.tank("sequences", "q010", "q010_layout_v001.ma")
+		self.assertTrue(self.tank("sequences", "q020", "q020_anim_v004.ma") is tk)
+		self.assertEqual(len(self.built), 1)
+
+	def test_changed_templates_build_a_new_instance(self):
+		tk = self.tank("scene.ma")
+		self.write_templates("keys: {Shot: {type: str}}\n")
+		self.assertFalse(self.tank("scene.ma") is tk)
+		self.assertEqual(len(self.built), 2)
+
+	def test_paths_of_other_projects_build_their_own_instance(self):
+		self.tank("scene.ma")
+		template_cache.tank_from_path(os.path.join(self.folder, "storkling", "scene.ma"), self.factory)
+		self.assertEqual(len(self.built), 2)
+
+
+if __name__ == "__main__":
+	unittest.main()
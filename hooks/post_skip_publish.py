@@ -15,6 +15,15 @@ import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import fs_cache
+from rts import scan_cache
+from rts import template_memo
+from rts import version_index
+
 class PostPublishHook(Hook):
 	"""
 	Single hook that implements post-publish functionality
@@ -64,6 +73,16 @@ class PostPublishHook(Hook):
 		# else:
 			# raise TankError("Unable to perform post publish for unhandled engine %s" % engine_name)
 		self._do_nothing(progress_cb)
+
+		# the publish is over, drop the memoized template lookups
+		memo = template_memo.end_session(self.parent.tank)
+		if memo:
+			print "template lookups of this publish:\n%s" % memo.report()
+		folders = fs_cache.reset()
+		if folders:
+			print "folder checks of this publish: %s" % folders.report()
+		# the scans report what is published, the next one has to look again
+		scan_cache.invalidate()
 		
 	def _do_maya_post_publish(self, work_template, progress_cb):
 		"""
@@ -305,10 +324,8 @@ class PostPublishHook(Hook):
 		"""
 		Find the next available version for the specified work_file
 		"""
-		existing_versions = self.parent.tank.paths_from_template(work_template, fields, ["version"])
-		version_numbers = [work_template.get_fields(v).get("version") for v in existing_versions]
+		max_v_no = version_index.get_index().latest_version(work_template, fields)
 		curr_v_no = fields["version"]
-		max_v_no = max(version_numbers)
 		return max(curr_v_no, max_v_no) + 1
 
 	def _do_nothing(self, progress_cb):
@@ -9,6 +9,7 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 import uuid
 import tempfile
 
@@ -16,6 +17,13 @@ import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import template_index
+from rts import template_memo
+
 class PrimaryPublishHook(Hook):
 	"""
 	Single hook that implements publish of the primary task
@@ -72,6 +80,10 @@ class PrimaryPublishHook(Hook):
 		:raises:                Hook should raise a TankError if publish of the 
 								primary task fails
 		"""
+		# the primary publish starts the publish session, template lookups
+		# are memoized until the post publish hook ends it
+		template_memo.begin_session(self.parent.tank)
+
 		# get the engine name from the parent object (app/engine/etc.)
 		engine_name = self.parent.engine.name
 		
@@ -163,12 +175,11 @@ class PrimaryPublishHook(Hook):
 		# now, for each reference found, build a list of the ones
 		# that resolve against a template:
 		dependency_paths = []
+		index = template_index.get_index(self.parent.tank)
 		for ref_path in ref_paths:
 			# see if there is a template that is valid for this path:
-			for template in self.parent.tank.templates.values():
-				if template.validate(ref_path):
-					dependency_paths.append(ref_path)
-					break
+			if index.match(ref_path):
+				dependency_paths.append(ref_path)
 
 		return dependency_paths
 	
@@ -393,19 +404,19 @@ class PrimaryPublishHook(Hook):
 		
 		# figure out all the inputs to the scene and pass them as dependency candidates
 		dependency_paths = []
+		index = template_index.get_index(self.parent.tank)
 		for read_node in nuke.allNodes("Read"):
 			# make sure we normalize file paths
 			file_name = read_node.knob("file").evaluate().replace('/', os.path.sep)
 			# validate against all our templates
-			for template in self.parent.tank.templates.values():
-				if template.validate(file_name):
-					fields = template.get_fields(file_name)
-					# translate into a form that represents the general
-					# tank write node path.
-					fields["SEQ"] = "FORMAT: %d"
-					fields["eye"] = "%V"
-					dependency_paths.append(template.apply_fields(fields))
-					break
+			template = index.match(file_name)
+			if template:
+				fields = template.get_fields(file_name)
+				# translate into a form that represents the general
+				# tank write node path.
+				fields["SEQ"] = "FORMAT: %d"
+				fields["eye"] = "%V"
+				dependency_paths.append(template.apply_fields(fields))
 
 		return dependency_paths
 
@@ -652,8 +663,9 @@ class PrimaryPublishHook(Hook):
 		Return the 'name' to be used for the file - if possible
 		this will return a 'versionless' name
 		"""
+		memo = template_memo.get_session(self.parent.tank)
 		# first, extract the fields from the path using the template:
-		fields = fields.copy() if fields else template.get_fields(path)
+		fields = fields.copy() if fields else memo.get_fields(template, path)
 		if "name" in fields and fields["name"]:
 			# well, that was easy!
 			name = fields["name"]
@@ -680,7 +692,7 @@ class PrimaryPublishHook(Hook):
 				
 				# now use this dummy version and rebuild the path
 				fields["version"] = dummy_version
-				path = template.apply_fields(fields)
+				path = memo.apply_fields(template, fields)
 				name, _ = os.path.splitext(os.path.basename(path))
 				
 				# we can now locate the version in the name and remove it
@@ -9,6 +9,7 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 import maya.cmds as cmds
 
 import tank
@@ -18,6 +19,12 @@ from tank import TankError
 import sgtk
 from sgtk.platform import Application
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import template_cache
+
 class ScanSceneHook(Hook):
 	"""
 	Hook to scan scene for items to publish
@@ -67,8 +74,9 @@ class ScanSceneHook(Hook):
 		scene_path = os.path.abspath(scene_name)
 		name = os.path.basename(scene_path)
 		# tk = self.parent.tank
-		tk = sgtk.sgtk_from_path(scene_path)
-		tk.reload_templates()
+		# the scene may belong to another pipeline configuration than the engine,
+		# its Tank instance is kept and only built again when templates.yml changed
+		tk = template_cache.tank_from_path(scene_path)
 
 		scene_template = tk.template_from_path(scene_path)
 		flds = scene_template.get_fields(scene_path)
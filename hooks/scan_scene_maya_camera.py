@@ -9,12 +9,21 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 import maya.cmds as cmds
 
 import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+    sys.path.append(_lib_path)
+
+from rts import scan_cache
+from rts import scene_inventory
+from rts import sg_mirror
+
 class ScanSceneHook(Hook):
     """
     Hook to scan scene for items to publish
@@ -22,7 +31,69 @@ class ScanSceneHook(Hook):
     
     def execute(self, **kwargs):
         """
-        Main hook entry point
+        Main hook entry point, returns the items of the shots found by
+        _scan_scene(), reused while the scene did not change, see
+        hooks/lib/rts/scan_cache.py. The shots of the sequence are read from
+        Shotgun every time.
+        """
+        scene = scan_cache.cached_scan("scan_scene_maya_camera", lambda: self._scan_scene(**kwargs), selection=True)
+        return self._items(scene)
+
+    def _scan_scene(self, **kwargs):
+        """
+        Read the shots of the scene, their camera and whether it is selected
+        :returns:       {"name": scene file name, "fields": work template fields,
+                         "shots": [[shot, camera, selected], ...]}
+        """
+
+        def isCamSelected(shotName):
+            camList = []
+            selectetShots = []
+            for cam in cmds.ls(sl=True):
+                par = cmds.listRelatives(cam,parent=True,fullPath=True)
+                if par != None:
+                    cam = str.split(str(par[0]),'|')[1]
+                if cam not in camList:
+                    camList += [cam]
+                    noNamespace = str.split(str(cam),':')[0]
+                    selectetShots += [str.split(noNamespace,'_')[-1]]
+            result = False
+            if shotName in selectetShots:
+                result = True
+            return (result)
+        
+        # get the main scene:
+        scene_name = cmds.file(query=True, sn=True)
+        if not scene_name:
+            raise TankError("Please Save your file before Publishing")
+        
+        scene_path = os.path.abspath(scene_name)
+        name = os.path.basename(scene_path)
+
+        tk = self.parent.tank
+        scenePath = cmds.file(q=True,sceneName=True)
+        scene_template = tk.template_from_path(scenePath)
+        flds = scene_template.get_fields(scenePath)
+
+        # define used cameras and shots in the camera sequencer
+        inventory = scene_inventory.get_inventory()
+        if inventory is not None:
+            shots = inventory.names("shots")
+        else:
+            shots = cmds.ls(type="shot")
+        sceneShots = []
+        for sht in shots:
+            shotCam = cmds.shot(sht, q=True, currentCamera=True)
+            select = True
+            if cmds.ls(sl=True) != []:
+                select = isCamSelected(sht)
+            sceneShots.append([sht, shotCam, select])
+
+        return {"name": name, "fields": flds, "shots": sceneShots}
+
+    def _items(self, scene):
+        """
+        Return the items of the shots of the scene
         :returns:       A list of any items that were found to be published.  
                         Each item in the list should be a dictionary containing 
                         the following keys:
@@ -53,43 +124,18 @@ class ScanSceneHook(Hook):
                                             pre-publish and publish hooks
                         }
         """   
-
-        def isCamSelected(shotName):
-            camList = []
-            selectetShots = []
-            for cam in cmds.ls(sl=True):
-                par = cmds.listRelatives(cam,parent=True,fullPath=True)
-                if par != None:
-                    cam = str.split(str(par[0]),'|')[1]
-                if cam not in camList:
-                    camList += [cam]
-                    noNamespace = str.split(str(cam),':')[0]
-                    selectetShots += [str.split(noNamespace,'_')[-1]]
-            result = False
-            if shotName in selectetShots:
-                result = True
-            return (result)
         items = []
-        
-        # get the main scene:
-        scene_name = cmds.file(query=True, sn=True)
-        if not scene_name:
-            raise TankError("Please Save your file before Publishing")
-        
-        scene_path = os.path.abspath(scene_name)
-        name = os.path.basename(scene_path)
+        name = scene["name"]
+        flds = scene["fields"]
 
         # create the primary item - this will match the primary output 'scene_item_type':            
         items.append({"type": "work_file", "name": name})
 
-        tk = self.parent.tank
-        scenePath = cmds.file(q=True,sceneName=True)
-        scene_template = tk.template_from_path(scenePath)
-        flds = scene_template.get_fields(scenePath)
-
-        # get shotgun info about what shot are needed in this sequence
+        # get shotgun info about what shot are needed in this sequence, the id
+        # of the sequence from the local mirror, the shots live
         fields = ['id']
-        sequence_id = self.parent.shotgun.find('Sequence',[['code', 'is',flds['Sequence']]], fields)[0]['id']
+        sg = sg_mirror.get_mirror(self.parent.shotgun, self.parent.context.project)
+        sequence_id = sg.find('Sequence',[['code', 'is',flds['Sequence']]], fields)[0]['id']
         fields = ['id', 'code', 'sg_asset_type','sg_cut_in','sg_cut_out','sg_status_list']
         filters = [['sg_sequence', 'is', {'type':'Sequence','id':sequence_id}]]
         assets= self.parent.shotgun.find("Shot",filters,fields)
@@ -98,21 +144,12 @@ class ScanSceneHook(Hook):
             if sht['sg_status_list'] != 'omt':
                 sg_shots += [str.split(sht['code'],"_")[1]]
 
-        # define used cameras and shots in the camera sequencer
-        shots = cmds.ls(type="shot")
-        shotCams = []
-        unUsedCams = []
+        shots = [sht for sht, shotCam, select in scene["shots"]]
         items.append({"type": "setting","name": "NO overscan","description": "set overscan Value to 1(no extra space used)","selected":False})
         items.append({"type": "setting","name": "set Cut in","description": "set Cut in to 1001 for each individual shot","selected":False})
         if flds['Step'] == 's3d':
             items.append({"type": "setting","name": "Only render LEFT(main) cam","description": "set Cut in to 1001 for each individual shot","selected":False})
-        for sht in shots:
-            shotCam = cmds.shot(sht, q=True, currentCamera=True)
-            shotCams += [shotCam]
-            select = True
-            if cmds.ls(sl=True) != []:
-                select = isCamSelected(sht)
-
+        for sht, shotCam, select in scene["shots"]:
             if sht not in sg_shots:
                 items.append({"type": "shot","name": sht,"description":"!!! shot not in shotgun  ->  "+shotCam,"selected":select})
             else:
@@ -9,12 +9,21 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 import maya.cmds as cmds
 
 import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import poslist_scan
+from rts import scan_cache
+from rts import scene_inventory
+
 class ScanSceneHook(Hook):
 	"""
 	Hook to scan scene for items to publish
@@ -22,7 +31,15 @@ class ScanSceneHook(Hook):
 	
 	def execute(self, **kwargs):
 		"""
-		Main hook entry point
+		Main hook entry point, returns the items found by _scan(), reused
+		while the scene did not change, see hooks/lib/rts/scan_cache.py. The
+		transforms are read at the current frame, a time change scans again.
+		"""
+		return scan_cache.cached_scan("scan_scene_tk-maya_poslist", lambda: self._scan(**kwargs), current_time=True)
+
+	def _scan(self, **kwargs):
+		"""
+		Scan the scene
 		:returns:       A list of any items that were found to be published.  
 						Each item in the list should be a dictionary containing 
 						the following keys:
@@ -81,65 +98,20 @@ class ScanSceneHook(Hook):
 		return items
 
 	def getAllObjects(self):
-		objectTypes = {"SET":"Set", "SUB":"Set", "PRP":"Prop", "CHR":"Character", "VHL":"Vehicle"}
-		self.content = {}
-		for t in objectTypes:
-			tempDict = getAllFromType(t)
-			if tempDict == {}:
-				continue
-			self.content[t] = tempDict
-		# print self.content
+		# one pass over the DAG for every type, see hooks/lib/rts/poslist_scan.py,
+		# or over the locators of the scene inventory when it is running
+		inventory = scene_inventory.get_inventory()
+		if inventory is not None:
+			entries = poslist_scan.path_entries(inventory.dag_paths("locators"))
+		else:
+			entries = poslist_scan.maya_entries()
+		self.content, errorList = poslist_scan.collect(entries)
 
-		
-def getAllFromType(type):
-	temp = cmds.ls("%s*" %type, long = True, recursive = True)
-	resultDict = {}
-	errorList = []
-	for i in temp:
-		propName = i
-		separatorCheck = str(i).rfind("|")
-		if separatorCheck != -1:
-			propName = i[ separatorCheck+1: ]
-		separatorCheck = str(propName).rfind(":")
-		if separatorCheck != -1:
-			propName = propName[ separatorCheck+1: ]
-		if propName.startswith("%s_"%type):
-			if checkIfLocator(i):
-				if resultDict.has_key(propName):
-					errorList.append("DOUBLE '%s' in scene!" %propName)
-					continue
-				position = cmds.xform(i, ws=True, q=True, t=True)
-				rotation = cmds.xform(i, ws=True, q=True, ro=True)
-				scale = cmds.xform(i, r=True, q=True, s=True)
-				asset = propName[ len("%s_"%type): propName.rfind("_")]
-				resultDict[propName] = setAssetDict(propName, asset, type, longName = i, position = position, rotation = rotation, scale = scale)
-	
-	errorMessage = ""
-	for i in errorList:
-		errorMessage += "%s\n"%i
-	if errorMessage != "":
-		errorMessage += "\nPlease run Sanity Check or fix the naming."
-		raise TankError(errorMessage)
+		errorMessage = ""
+		for i in errorList:
+			errorMessage += "%s\n"%i
+		if errorMessage != "":
+			errorMessage += "\nPlease run Sanity Check or fix the naming."
+			raise TankError(errorMessage)
 
-	return resultDict
-
-def checkIfLocator(obj):
-	shape = cmds.listRelatives(obj,shapes=True,fullPath=True)
-	if shape!=None:
-		if cmds.objectType(shape) == "locator":
-			return True
-	return False
-	
-def setAssetDict(name, asset, assetType, longName = None, animated = None, position = [0,0,0], rotation = [0,0,0], scale = [1,1,1], parentAssets = [], resolution = None):
-	tempDict = {}
-	tempDict["name"] = name
-	tempDict["longName"] = longName
-	tempDict["asset"] = asset
-	tempDict["assetType"] = assetType
-	tempDict["animated"] = animated
-	tempDict["resolution"] = resolution
-	tempDict["position"] = position
-	tempDict["rotation"] = rotation
-	tempDict["scale"] = scale
-	tempDict["parentAssets"] = parentAssets
-	return tempDict		
+setAssetDict = poslist_scan.set_asset_dict
@@ -24,6 +24,14 @@ from tank import TankError
 import sgtk
 from sgtk.platform import Application
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import fs_cache
+from rts import template_memo
+from rts import version_index
+
 CREATE_NO_WINDOW  = 0x00000008
 
 #from shotgun import Shotgun
@@ -200,30 +208,23 @@ class PublishHook(Hook):
 			return highest
 		
 		def findLastVersion(FolderPath,returnFile=False,returnFilePath=False):
-			if os.path.exists(FolderPath):
-				fileList=os.listdir(FolderPath)
-			else:
-				return 0
-			if fileList != []:
-				fileList.sort()
-				lastVersion = fileList[-1]
-				version = int(re.findall('\d+', lastVersion)[-1])
-				if returnFilePath:
-					return FolderPath+"/"+lastVersion
-				if returnFile:
-					return lastVersion
-				return version
-				#return str(FolderPath+"/"+lastVersion)
-			else:
+			# numeric order, sorting the names as strings puts v1000 before v999
+			lastVersion = version_index.last_in_folder(FolderPath)
+			if lastVersion is None:
 				return 0
+			if returnFilePath:
+				return FolderPath+"/"+lastVersion
+			if returnFile:
+				return lastVersion
+			return int(re.findall('\d+', lastVersion)[-1])
 		
 		def orderMovs(movList,orderList):
 			tmp = ""
 
 		def setAudioToCorrectPath():
 			scenePath = cmds.file(q=True,sceneName=True)
-			scene_template = tk.template_from_path(scenePath)
-			flds = scene_template.get_fields(scenePath)
+			scene_template = memo.template_from_path(scenePath)
+			flds = memo.get_fields(scene_template, scenePath)
 			audio_template = tk.templates["shot_published_audio"]
 
 			tank = sgtk.tank_from_entity('Project', 66)
@@ -237,7 +238,7 @@ class PublishHook(Hook):
 				audioFile = cmds.getAttr(audio+".filename")# "W:/RTS/1_PREPROD/13_ANIMATIC/q340/splitshots/wav new 01/q340_s260_snd_v001.wav";
 				#print audioFile
 				flds['Shot'] = flds['Sequence']+"_"+seqShot
-				audioOutputFile = audio_template.apply_fields(flds)
+				audioOutputFile = memo.apply_fields(audio_template, flds)
 				#audioOutputPath = str.replace(str(audioOutputPath),"\\","/")
 				#print audioFile
 				audioFile = str.replace(str(audioFile),"Z:/Richard The Stork","W:/RTS")
@@ -394,9 +395,9 @@ class PublishHook(Hook):
 				sequenceList[-1]["audioList"] = audioList
 			
 			scenePath = cmds.file(q=True,sceneName=True)
-			scene_template = tk.template_from_path(scenePath)
+			scene_template = memo.template_from_path(scenePath)
 			audio_template = tk.templates["shot_published_audio"]
-			flds = scene_template.get_fields(scenePath)
+			flds = memo.get_fields(scene_template, scenePath)
 			flds['Step'] = 'snd'
 			soundCheckList = ["These audio cuts dont match the camera cuts."]
 			for audio in sequenceList:
@@ -428,9 +429,9 @@ class PublishHook(Hook):
 				os.makedirs(tmpFolder)
 			scenePath = cmds.file(q=True,sceneName=True)
 			sceneName = str.split(str(scenePath),"/")[-1]
-			scene_template = tk.template_from_path(scenePath)
+			scene_template = memo.template_from_path(scenePath)
 			audio_template = tk.templates["shot_published_audio"]
-			flds = scene_template.get_fields(scenePath)
+			flds = memo.get_fields(scene_template, scenePath)
 			flds['Step'] = 'snd'
 			for audio in sequenceList:
 				if audio['audioList'] != []:
@@ -449,16 +450,16 @@ class PublishHook(Hook):
 						i+=1
 						MakeSoundCuts(ffmpegPath,input,output,inSec,outSec)
 						newAudio +=[output]
-					audioOutput = audio_template.apply_fields(flds)
-					
 					# version UP
-					latestVersion = findLastVersion(os.path.dirname(audioOutput))+1
+					latestVersion = versions.next_version(audio_template, flds)
 					flds['version'] = latestVersion
-					audioOutput = audio_template.apply_fields(flds)
+					audioOutput = memo.apply_fields(audio_template, flds)
 					# combine
 					mergedAudio = combineMediaFiles(newAudio,audioOutput,tmpFolder+"/tmp_wavList.txt",ffmpegPath)
+					versions.invalidate(os.path.dirname(audioOutput))
 					
-					ver = str(findLastVersion(os.path.dirname(audioOutput),True))
+					latestAudio = versions.latest_path(audio_template, flds)
+					ver = os.path.basename(latestAudio) if latestAudio else "0"
 					newAudioName = str.rsplit(ver,"_",1)[0]
 					cmds.file( audioOutput, i=True, type="audio",mergeNamespacesOnClash=False, namespace=flds['Shot']+"_audio",resetError=True)
 					crappyAudioName = str.split(ver,".")[0]
@@ -471,8 +472,8 @@ class PublishHook(Hook):
 					cmds.connectAttr(newAudioName+".message", audio['shot']+".audio",f=True)
 					print "-----------------------------------------------------------------------------________________-------------------------------------------------------------------------"
 					# PUBLISH
-					file_template = tk.template_from_path(audioOutput)
-					flds = file_template.get_fields(audioOutput)
+					file_template = memo.template_from_path(audioOutput)
+					flds = memo.get_fields(file_template, audioOutput)
 					print audioOutput
 					ctx = tk.context_from_path(audioOutput)
 
@@ -516,9 +517,11 @@ class PublishHook(Hook):
 		# template stuff...
 		# tk = tank.tank_from_path("W:/RTS/Tank/config")
 		tk = self.parent.tank
+		memo = template_memo.get_session(tk)
+		versions = version_index.get_index()
 		scenePath = cmds.file(q=True,sceneName=True)
-		scene_template = tk.template_from_path(scenePath)
-		flds = scene_template.get_fields(scenePath)
+		scene_template = memo.template_from_path(scenePath)
+		flds = memo.get_fields(scene_template, scenePath)
 		flds['width'] = 1724
 		flds['height'] = 936
 		pb_template = tk.templates["maya_seq_playblast_publish"]
@@ -541,6 +544,9 @@ class PublishHook(Hook):
 		assets= self.parent.shotgun.find("Shot",filters,fields)
 		results = []
 		errors = []
+		# folders cached by an earlier publish of the session may be gone, a failed
+		# publish never reaches the post publish hook resetting the cache
+		fs_cache.reset()
 		if sys.platform == "linux2":
 			ffmpegPath = r'%s' % (os.getenv('FFMPEG','/rakete/tools/rakete/ffmpeg/lx64/ffmpeg'))
 		elif sys.platform == "win32":
@@ -690,17 +696,16 @@ class PublishHook(Hook):
 					cmds.shot(pbShot, e=True, currentCamera=shotCam)
 					focal = cmds.getAttr(shotCam+'.focalLength')
 					# make outputPaths from templates
-					RenderPath = pb_template.apply_fields(flds)
+					RenderPath = memo.apply_fields(pb_template, flds)
 					pbPath = str.split(str(RenderPath),".")[0]
-					renderPathCurrent = pb_template_current.apply_fields(flds)
+					renderPathCurrent = memo.apply_fields(pb_template_current, flds)
 					pbPathCurrent = str.split(str(renderPathCurrent),".")[0]
-					pbPathCurrentMov = mov_template.apply_fields(flds)
-					pbPathCurrentMovShot = mov_shot_template.apply_fields(flds)
-					pbPathCurrentMp4Shot = mp4_shot_template.apply_fields(flds)
+					pbPathCurrentMov = memo.apply_fields(mov_template, flds)
+					pbPathCurrentMovShot = memo.apply_fields(mov_shot_template, flds)
+					pbPathCurrentMp4Shot = memo.apply_fields(mp4_shot_template, flds)
 					for pathToMake in [pbPathCurrent,pbPathCurrentMov,pbPathCurrentMovShot,pbPathCurrentMp4Shot]:
-						if not os.path.exists(os.path.dirname(pathToMake)):
-							#os.makedirs(os.path.dirname(pathToMake))
-							self.parent.ensure_folder_exists(os.path.dirname(pathToMake))
+						# known folders are not checked on disk again for the next shots and eyes
+						fs_cache.ensure_folder(os.path.dirname(pathToMake), self.parent.ensure_folder_exists)
 
 					# report progress:
 					progress_cb(0, "Publishing", task)
@@ -730,8 +735,8 @@ class PublishHook(Hook):
 						print("COPYING PNG "+ImageFullName+"  TO  "+pbFileCurrent+"  FOR SHOT  " + shotName)
 						shutil.copy2(ImageFullName, pbFileCurrent)
 					
-					shotAudio = audio_template.apply_fields(flds)
-					shotAudio = findLastVersion(os.path.dirname(shotAudio),True,True)
+					# any step, the published audio usually comes from the snd step
+					shotAudio = versions.latest_path(audio_template, flds, skip_keys=["Step"]) or 0
 					if shotAudio == 0:
 						print " NO PUBLISHED AUDIO FOUND"
 						for aud in [parentShot,pbShot]:
@@ -759,7 +764,7 @@ class PublishHook(Hook):
 					flds['eye'] = side.lower()
 					
 				
-				RenderPath = pb_template.apply_fields(flds)
+				RenderPath = memo.apply_fields(pb_template, flds)
 				print RenderPath
 
 				for i in boundingboxObjsList:
@@ -793,9 +798,9 @@ class PublishHook(Hook):
 				'''
 				makeSeqMov
 				'''
-				concatTxt = concatMovTxt.apply_fields(flds)
-				pbMovPath = pbMov.apply_fields(flds)
-				pbMp4Path = pbMp4.apply_fields(flds)
+				concatTxt = memo.apply_fields(concatMovTxt, flds)
+				pbMovPath = memo.apply_fields(pbMov, flds)
+				pbMp4Path = memo.apply_fields(pbMp4, flds)
 				pbMp4Path = str.replace(str(pbMp4Path),'\\','/')
 
 				pbMovFile =  str.split(str(pbMovPath),os.path.dirname(pbMovPath))[1][1:]
@@ -822,15 +827,10 @@ class PublishHook(Hook):
 								
 				makeSeqMov = True
 				if makeSeqMov:
-					if not os.path.exists(os.path.dirname(pbMovPath)):
-						self.parent.ensure_folder_exists(os.path.dirname(pbMovPath))
-						# os.makedirs(os.path.dirname(pbMovPath))
+					fs_cache.ensure_folder(os.path.dirname(pbMovPath), self.parent.ensure_folder_exists)
 					
-					if not os.path.exists(os.path.dirname(pbMp4Path)):
-						print "creating", pbMp4Path
-						self.parent.ensure_folder_exists(os.path.dirname(pbMp4Path))
+					if fs_cache.ensure_folder(os.path.dirname(pbMp4Path), self.parent.ensure_folder_exists):
 						print "created", pbMp4Path
-						# os.makedirs(os.path.dirname(pbMp4Path))
 					"""
 						SEQUENCE MOV and MP4 Creation
 					"""
@@ -871,8 +871,7 @@ class PublishHook(Hook):
 						'sg_task': sg_task[0]
 						}
 
-				if not os.path.exists(os.path.dirname(pbMp4Path)):
-					os.makedirs(os.path.dirname(pbMp4Path))
+				fs_cache.ensure_folder(os.path.dirname(pbMp4Path))
 				
 				findVersion = self.parent.shotgun.find_one('Version', 
 														[['code', 'is', flds ['Sequence']+"_"+flds['Step']+"_v"+str('%03d' % (flds['version']))],
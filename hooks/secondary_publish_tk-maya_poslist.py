@@ -9,6 +9,7 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 import shutil
 import json
 import maya.cmds as cmds
@@ -18,6 +19,13 @@ import tank
 from tank import Hook
 from tank import TankError
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import poslist_delta
+from rts import poslist_format
+
 class PublishHook(Hook):
 	"""
 	Single hook that implements publish functionality for secondary tasks
@@ -201,8 +209,31 @@ class PublishHook(Hook):
 			grpNumber += 1
 		
 		progress_cb(80, "Exporting Positionlist")
-		with open(publish_path, "w") as target:
-			target.write(json.dumps(sceneList, sort_keys=True, indent=4, separators=(',', ': ')))
+		# in delta mode only the changes from the previous version are written, see hooks/lib/rts/poslist_delta.py
+		delta = None
+		base_path = None
+		if poslist_delta.enabled():
+			base_path = self._previous_positionlist(publish_template, fields, publish_version)
+		if base_path:
+			try:
+				delta = poslist_delta.make_delta(poslist_format.load(base_path), sceneList, base_path, publish_path,
+												 poslist_format.chain_depth(base_path), poslist_delta.tolerance(),
+												 poslist_delta.snapshot_interval())
+			except (poslist_delta.DeltaError, ValueError, EnvironmentError), e:
+				print "Previous positionlist %s unreadable, publishing the full list: %s" % (base_path, e)
+		companion = poslist_format.companion_path(publish_path)
+		if delta is not None:
+			print "Publishing positionlist delta on %s: %d changes" % (base_path, poslist_delta.size(delta))
+			with open(publish_path, "w") as target:
+				target.write(json.dumps(delta, sort_keys=True, indent=4, separators=(',', ': ')))
+			# a companion left by an earlier publish of this version would be read instead of the delta
+			if os.path.isfile(companion):
+				os.remove(companion)
+		else:
+			with open(publish_path, "w") as target:
+				target.write(json.dumps(sceneList, sort_keys=True, indent=4, separators=(',', ': ')))
+			# binary columns next to the json, read by the loader, see hooks/lib/rts/poslist_format.py
+			poslist_format.write(companion, sceneList)
 
 		# publishedInfo = self.parent.shotgun.find_one("PublishedFile", [["code","is","yqhtfdsjhfshdshgfx"]], ['id','code'])
 		# print publishedInfo
@@ -237,10 +268,27 @@ class PublishHook(Hook):
 				"dependency_paths": [primary_publish_path],
 				"published_file_type":tank_type
 			}
+			if delta is not None:
+				# a delta can not be read without its base
+				args["dependency_paths"].append(base_path)
 			# register the publish:
 			progress_cb(90, "Registering the publish")        
 			tank.util.register_publish(**args)
 
+	def _previous_positionlist(self, publish_template, fields, publish_version):
+		"""
+		Return the path of the latest positionlist published before a version,
+		None if there is none.
+		"""
+		previous = None
+		for path in self.parent.tank.paths_from_template(publish_template, fields, skip_keys=["version"]):
+			version = publish_template.get_fields(path)["version"]
+			if version < publish_version and (previous is None or version > previous[0]):
+				previous = (version, path)
+		if previous is None:
+			return None
+		return previous[1]
+
 
 '''		
 	def __publish_alembic_cache(self, item, output, work_template, primary_publish_path, 
@@ -13,23 +13,54 @@ Hook that loads defines all the available actions, broken down by publish type.
 """
 import sgtk
 import os
-import json
 import pymel.core as pm
 import maya.cmds as cmds
 import maya.mel as mel
+import sys
+import time
 # import cProfile
 
+_lib_path = os.path.join(os.path.dirname(__file__), "lib")
+if _lib_path not in sys.path:
+	sys.path.append(_lib_path)
+
+from rts import name_allocator
+from rts import poslist_assembly
+from rts import poslist_format
+from rts import poslist_spatial
+from rts import poslist_transforms
+from rts import sg_mirror
+
 HookBaseClass = sgtk.get_hook_baseclass()
 
-def getNextAvailableNamespace(namespaceBase, startNumber = 1):
+# fields of the asset publishes the position list actions reference
+ASSET_PUBLISH_FIELDS = ["name",
+						"version_number",
+						"image",
+						"entity",
+						"path",
+						"description",
+						"task",
+						"task.Task.sg_status_list",
+						"task.Task.due_date",
+						"project",
+						"task.Task.content",
+						"created_by",
+						"created_at",
+						"version", # note: not supported on TankPublishedFile so always None
+						"version.Version.sg_status_list",
+						"created_by.HumanUser.image"
+						]
+
+def getNextAvailableNamespace(namespaceBase, startNumber = 1, allocator = None):
     """@brief Return the next available name space.
 
     @param namespaceBase Base of the namespace. (string) ex:NEMO01
+    @param allocator NameAllocator of the running operation, the namespaces are listed once per allocator
     """
-    for i in xrange(startNumber, 10000) :
-        newNamespace = "%s_%03d" % (namespaceBase, i)
-        if not pm.namespace(exists=newNamespace) :
-            return newNamespace
+    if allocator is None:
+        allocator = name_allocator.from_maya()
+    return allocator.next_namespace(namespaceBase, startNumber)
 
 class MayaActions(HookBaseClass):
 	
@@ -160,6 +191,30 @@ class MayaActions(HookBaseClass):
 									  "caption": "References from positionlist", 
 									  "description": "Create the whole scene based on this positionlist (referenced)."} )
 
+		if "poslist_assemble" in actions:
+			action_instances.append( {"name": "assemble from positionlist", 
+									  "params": {"load": "all"},
+									  "caption": "Assemble from positionlist", 
+									  "description": "Create the locators and the unloaded references of the whole positionlist, then load them all."} )
+			action_instances.append( {"name": "assemble from positionlist", 
+									  "params": {"load": "lay"},
+									  "caption": "Assemble from positionlist (load layout only)", 
+									  "description": "Create the locators and the unloaded references of the whole positionlist, then load the layout ones."} )
+			action_instances.append( {"name": "assemble from positionlist", 
+									  "params": {"load": "visible"},
+									  "caption": "Assemble from positionlist (load visible only)", 
+									  "description": "Create the locators and the unloaded references of the whole positionlist, then load the ones seen by the shot cameras."} )
+			action_instances.append( {"name": "assemble from positionlist", 
+									  "params": {"load": "none"},
+									  "caption": "Assemble from positionlist (references unloaded)", 
+									  "description": "Create the locators and the unloaded references of the whole positionlist."} )
+
+		if "poslist_load_deferred" in actions:
+			action_instances.append( {"name": "load deferred references", 
+									  "params": None,
+									  "caption": "Load unloaded references", 
+									  "description": "Load the references left unloaded under the locators of this positionlist."} )
+
 		if "poslist_update_selected" in actions:
 			action_instances.append( {"name": "update position of selected locators", 
 									  "params": None,
@@ -218,6 +273,12 @@ class MayaActions(HookBaseClass):
 		if name == "reference whole list with rtsLocator":
 			self._create_references_from_positionlist(path, sg_publish_data)	
 			
+		if name == "assemble from positionlist":
+			self._assemble_from_positionlist(path, sg_publish_data, params["load"])
+			
+		if name == "load deferred references":
+			self._load_deferred_from_positionlist(path, sg_publish_data)
+			
 		if name == "update position of selected locators":
 			self._update_selected_objects_from_positionlist(path, sg_publish_data)	
 			
@@ -229,6 +290,17 @@ class MayaActions(HookBaseClass):
 	##############################################################################################################
 	# helper methods which can be subclassed in custom hooks to fine tune the behaviour of things
 	
+	def _name_allocator(self):
+		"""
+		Return the NameAllocator of the operation running, see hooks/lib/rts/name_allocator.py.
+		Operations creating many references set self._allocator, a single
+		reference gets a new one.
+		"""
+		allocator = getattr(self, "_allocator", None)
+		if allocator is None:
+			allocator = name_allocator.from_maya()
+		return allocator
+		
 	def _create_reference(self, path, sg_publish_data):
 		"""
 		Create a reference with the same settings Maya would use
@@ -246,13 +318,13 @@ class MayaActions(HookBaseClass):
 		if self.parent.context.entity != sg_publish_data['entity']:     
 			namespace = "%s" % (sg_publish_data.get("entity").get("name"))
 			namespace = namespace.replace(" ", "_")
-			namespace = getNextAvailableNamespace(namespace)
+			namespace = getNextAvailableNamespace(namespace, allocator = self._name_allocator())
 		elif self.parent.context.entity == sg_publish_data['entity']:
 			task = sg_publish_data.get('task')
 			if not task:
 				raise Exception('no task linked to the published file %s' % (sg_publish_data.get('id')))
 			else:
-				step = self.parent.shotgun.find_one('Task', [['id','is', task['id'] ]], ['step.Step.short_name'])
+				step = self._sg_lookups().find_one('Task', [['id','is', task['id'] ]], ['step.Step.short_name'])
 				resolution = ''
 				import re
 				if re.match('.*(High|high|hig|HIGH).*', task.get('name')):
@@ -293,36 +365,183 @@ class MayaActions(HookBaseClass):
 		# Prefix = sg_publish_data.get("entity")
 		IdAsset = sg_publish_data.get("entity").get("id")
 		NameAsset = "%s" % (sg_publish_data.get("entity").get("name"))
-		TypeAsset = self.parent.shotgun.find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
+		TypeAsset = self._sg_lookups().find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
 		
-		poslist = None
-		with open(path, 'r') as positionlistFile:
-			lines = ""
-			readFileLines = positionlistFile.readlines()
-			for l in readFileLines:
-				lines += l
-
-			poslist = json.loads(lines)
+		# from the binary companion when there is one, see hooks/lib/rts/poslist_format.py
+		poslist = poslist_format.load(path)
 		
-		allLocators = cmds.ls(type = "rtsAssetRoot")
-		print allLocators
+		# one listing of the namespaces and locators for the whole list
+		self._allocator = name_allocator.from_maya()
+		allLocators = set(self._allocator.names("rtsAssetRoot"))
+		print sorted(allLocators)
 		
 		objectTypes = {"SET":"Set", "SUB":"Set", "PRP":"Prop", "CHR":"Character", "VHL":"Vehicle"}
-		for type in poslist:
-			poslistGroup = poslist[type]
-			if type in objectTypes:
-				longType = objectTypes[type]
-				if longType == "Prop":
-					print "Prop Handling"
-					for obj in poslistGroup:
-						if obj in allLocators:
-							print "### %s already in scene! (skip file) ###" %obj
-						else:
-							newLocator = self.loadObjectInScene(poslistGroup[obj], longType)	
-				# elif longType == "Set":
-				else:
-					print "%s Handling" %longType
+		try:
+			for type in poslist:
+				poslistGroup = poslist[type]
+				if type in objectTypes:
+					longType = objectTypes[type]
+					if longType == "Prop":
+						print "Prop Handling"
+						for obj in poslistGroup:
+							if obj in allLocators:
+								print "### %s already in scene! (skip file) ###" %obj
+							else:
+								newLocator = self.loadObjectInScene(poslistGroup[obj], longType)	
+					# elif longType == "Set":
+					else:
+						print "%s Handling" %longType
+		finally:
+			self._allocator = None
 					
+	def _assemble_from_positionlist(self, path, sg_publish_data, load = "all"):
+		"""
+		Create the whole scene of a positionlist: all the locators first, placed,
+		then all the references unloaded, then load them in one pass, see
+		hooks/lib/rts/poslist_assembly.py.
+		
+		:param path: Path to file.
+		:param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
+		:param load: "all", "none", "visible" or the resolution of the references to load.
+		"""
+		print "Started _assemble_from_positionlist"
+		started = time.time()
+		poslist = self._read_positionlist(path)
+		
+		allocator = name_allocator.from_maya()
+		items = poslist_assembly.plan(poslist, allocator.names("rtsAssetRoot"))
+		self._find_assembly_publishes(items)
+		
+		placed = []
+		cmds.undoInfo(openChunk=True)
+		cmds.refresh(suspend=True)
+		try:
+			for item in items:
+				if item.publish == None:
+					print "Object not made : %s (%s, no %s publish)" %(item.name, item.asset, item.resolution)
+					continue
+				item.locator = createRtsAssetNode(item.name, item.publish)
+				placed.append(item)
+			poslist_transforms.apply([(item.locator, {"position": item.position, "rotation": item.rotation, "scale": item.scale})
+									  for item in placed])
+			
+			for item in placed:
+				namespace = allocator.next_namespace(item.asset.replace(" ", "_"), poslist_assembly.item_number(item.name))
+				item.reference = poslist_assembly.create_reference(item.publish['path']['local_path'], namespace, item.locator)
+				
+			visible = ()
+			if load == poslist_assembly.LOAD_VISIBLE:
+				visible = self._visible_items(placed)
+				if visible == None:
+					load = poslist_assembly.LOAD_ALL
+			loaded = poslist_assembly.to_load(placed, load, visible)
+			for item in loaded:
+				poslist_assembly.load_reference(item.reference, item.locator)
+		finally:
+			cmds.refresh(suspend=False)
+			cmds.undoInfo(closeChunk=True)
+		
+		print "assembled %d of %d objects, %d references loaded in %.2fs" %(len(placed), len(items), len(loaded), time.time() - started)
+		
+	def _sg_lookups(self):
+		"""
+		Return the connection for the lookups of values that do not change once
+		set, the type of an asset or the step of a task: the local mirror of the
+		project, see hooks/lib/rts/sg_mirror.py. The publishes are always read
+		live.
+		"""
+		project = self.parent.context.project
+		if project == None:
+			return self.parent.shotgun
+		return sg_mirror.get_mirror(self.parent.shotgun, project)
+		
+	def _find_assembly_publishes(self, items):
+		"""
+		Set the latest Maya Scene publish of the asset and resolution of every
+		item, with one query for the assets and one for the publishes.
+		"""
+		publish_entity_type = sgtk.util.get_published_file_entity_type(self.parent.tank)
+		if publish_entity_type == "PublishedFile":
+			self._publish_type_field = "published_file_type"
+		else:
+			self._publish_type_field = "tank_type"
+		
+		codes = sorted(set(item.asset for item in items))
+		if not codes:
+			return
+		radius_field = poslist_spatial.radius_field()
+		assets = self.parent.shotgun.find("Asset", [['project', 'is', self.parent.context.project], ['code', 'in', codes]], ['code', 'sg_asset_type', radius_field])
+		if not assets:
+			return
+		assetsByCode = dict((asset['code'], asset) for asset in assets)
+		
+		publish_filters = [['project', 'is', self.parent.context.project],
+						   ['%s.PublishedFileType.code' %self._publish_type_field, 'is', 'Maya Scene'],
+						   ['entity', 'in', [{'type': 'Asset', 'id': asset['id']} for asset in assets]],
+						   ['task.Task.sg_short_name', 'in', sorted(set(item.resolution for item in items))]]
+		publish_fields = [self._publish_type_field, "task.Task.sg_short_name"] + ASSET_PUBLISH_FIELDS
+		latest = poslist_assembly.latest_publishes(self.parent.shotgun.find("PublishedFile", publish_filters, publish_fields))
+		
+		for item in items:
+			asset = assetsByCode.get(item.asset)
+			if asset != None:
+				item.publish = latest.get((asset['id'], item.resolution))
+				item.radius = asset.get(radius_field)
+		
+	def _visible_items(self, items):
+		"""
+		Return the names of the items seen by the shot cameras of the scene over
+		their frame range, None when the scene has no camera to look through or
+		one the frustum test does not handle, see hooks/lib/rts/poslist_spatial.py.
+		Sets and assets without a bounding radius are loaded anyway.
+		"""
+		cameras = poslist_spatial.shot_cameras()
+		if not cameras:
+			print "No shot camera in the scene, loading all the references"
+			return None
+		started = time.time()
+		frames = []
+		for camera, start, end in cameras:
+			cameraFrames = poslist_spatial.camera_frames(camera, start, end)
+			if cameraFrames == None:
+				print "%s is orthographic or offsets its film, loading all the references" %camera
+				return None
+			frames += cameraFrames
+		cullable = [item for item in items if poslist_assembly.cullable(item)]
+		index = poslist_spatial.SpatialIndex([item.name for item in cullable], [item.position for item in cullable],
+											 [poslist_spatial.item_radius(item.radius, item.scale) for item in cullable])
+		visible = index.visible(frames)
+		print "%d of %d objects visible from %d cameras over %d frames in %.2fs, %d without a bounding radius or sets" %(len(visible), len(cullable), len(cameras), len(frames), time.time() - started, len(items) - len(cullable))
+		return visible
+		
+	def _load_deferred_from_positionlist(self, path, sg_publish_data):
+		"""
+		Load the references left unloaded by _assemble_from_positionlist under
+		the locators of a positionlist.
+		
+		:param path: Path to file.
+		:param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
+		"""
+		poslist = self._read_positionlist(path)
+		names = set()
+		for type in poslist:
+			names.update(poslist[type])
+		locators = [locator for locator in cmds.ls(type = "rtsAssetRoot") if locator in names]
+		
+		cmds.undoInfo(openChunk=True)
+		cmds.refresh(suspend=True)
+		try:
+			loaded = poslist_assembly.load_deferred(locators)
+		finally:
+			cmds.refresh(suspend=False)
+			cmds.undoInfo(closeChunk=True)
+		print "%d references loaded" %loaded
+		
+	def _read_positionlist(self, path):
+		if not os.path.exists(path):
+			raise Exception("File not found on disk - '%s'" % path)
+		return poslist_format.load(path)
+		
 	def _create_only_locators_from_positionlist(self, path, sg_publish_data):
 		"""
 		Create a reference with the same settings Maya would use
@@ -346,16 +565,10 @@ class MayaActions(HookBaseClass):
 		# Prefix = sg_publish_data.get("entity")
 		IdAsset = sg_publish_data.get("entity").get("id")
 		NameAsset = "%s" % (sg_publish_data.get("entity").get("name"))
-		TypeAsset = self.parent.shotgun.find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
+		TypeAsset = self._sg_lookups().find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
 		
-		poslist = None
-		with open(path, 'r') as positionlistFile:
-			lines = ""
-			readFileLines = positionlistFile.readlines()
-			for l in readFileLines:
-				lines += l
-
-			poslist = json.loads(lines)
+		# from the binary companion when there is one, see hooks/lib/rts/poslist_format.py
+		poslist = poslist_format.load(path)
 		
 		objectTypes = {"SET":"Set", "SUB":"Set", "PRP":"Prop", "CHR":"Character", "VHL":"Vehicle"}
 		for type in poslist:
@@ -382,18 +595,11 @@ class MayaActions(HookBaseClass):
 		if not os.path.exists(path):
 			raise Exception("File not found on disk - '%s'" % path)
 			
-		poslist = None
-		with open(path, 'r') as positionlistFile:
-			lines = ""
-			readFileLines = positionlistFile.readlines()
-			for l in readFileLines:
-				lines += l
-
-			poslist = json.loads(lines)	
+		# from the binary companion when there is one, see hooks/lib/rts/poslist_format.py
+		poslist = poslist_format.load(path)
 			
-		for type in poslist:
-			poslistGroup = poslist[type]
-			self.updatePosition( poslistGroup ,selectionOnly = True)
+		# all the types at once, the scene is listed and written once
+		self.updatePosition(poslist_transforms.merged_entries(poslist), selectionOnly = True)
 			
 	def _update_objects_from_positionlist(self, path, sg_publish_data):
 		"""
@@ -407,34 +613,44 @@ class MayaActions(HookBaseClass):
 		if not os.path.exists(path):
 			raise Exception("File not found on disk - '%s'" % path)
 			
-		poslist = None
-		with open(path, 'r') as positionlistFile:
-			lines = ""
-			readFileLines = positionlistFile.readlines()
-			for l in readFileLines:
-				lines += l
-
-			poslist = json.loads(lines)	
+		# from the binary companion when there is one, see hooks/lib/rts/poslist_format.py
+		poslist = poslist_format.load(path)
 			
-		for type in poslist:
-			poslistGroup = poslist[type]
-			self.updatePosition( poslistGroup ,selectionOnly = False)
+		# all the types at once, the scene is listed and written once
+		unmatched = self.updatePosition(poslist_transforms.merged_entries(poslist), selectionOnly = False)
+		if unmatched:
+			print "%d positionlist entries without a locator in the scene:" %len(unmatched)
+			for name in unmatched:
+				print "   %s" %name
 			
 	def updatePosition(self,  data, selectionOnly = False):
+		"""
+		Move the rtsAssetRoot locators named like positionlist entries to their
+		positions, in one undo chunk for all of them, see hooks/lib/rts/poslist_transforms.py.
+		
+		:param data: {name: entry} of the positionlist entries.
+		:param selectionOnly: Only update the selected locators.
+		:returns: Names of the entries without a locator.
+		"""
 		objectsToUpdate = None
 		if selectionOnly:
 			objectsToUpdate = cmds.ls(selection = selectionOnly, type = "rtsAssetRoot")
 		else:
 			objectsToUpdate = cmds.ls(type = "rtsAssetRoot")
 			
-		print objectsToUpdate
-		for o in objectsToUpdate:
-			if o in data:
-				print "UPDATE :", o
+		started = time.time()
+		matched, unmatched = poslist_transforms.match(data, objectsToUpdate)
+		failed = poslist_transforms.apply(matched)
+		for o in failed:
+			print "Could not update : %s" %o
+		print "updated %d locators in %.3fs" %(len(matched) - len(failed), time.time() - started)
+		return unmatched
 		
 	def updatePositionOfObject(self, objectName, data):
-		print objectName
-		print data
+		"""
+		Move a locator to the position of its positionlist entry.
+		"""
+		return not poslist_transforms.apply([(objectName, data)])
 			
 	def loadObjectInScene(self, data, type):
 		# print data
@@ -485,24 +701,7 @@ class MayaActions(HookBaseClass):
 		else:			
 			publish_filters = [['project', 'is', self.parent.context.project], ['%s.PublishedFileType.code' %self._publish_type_field,'is', 'Maya Scene'],['entity', 'is', asset],['task.Task.sg_short_name', 'is', resolution]]
 			
-			publish_fields = [self._publish_type_field,
-							  "name",
-							  "version_number",
-							  "image",
-							  "entity",
-							  "path",
-							  "description",
-							  "task",
-							  "task.Task.sg_status_list",
-							  "task.Task.due_date",
-							  "project",
-							  "task.Task.content",
-							  "created_by",
-							  "created_at",
-							  "version", # note: not supported on TankPublishedFile so always None
-							  "version.Version.sg_status_list",
-							  "created_by.HumanUser.image"
-							  ]
+			publish_fields = [self._publish_type_field] + ASSET_PUBLISH_FIELDS
 
 			publishDataList = self.parent.shotgun.find("PublishedFile",publish_filters, publish_fields)
 
@@ -546,7 +745,7 @@ class MayaActions(HookBaseClass):
 		# Prefix = sg_publish_data.get("entity")
 		IdAsset = sg_publish_data.get("entity").get("id")
 		NameAsset = "%s" % (sg_publish_data.get("entity").get("name"))
-		TypeAsset = self.parent.shotgun.find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
+		TypeAsset = self._sg_lookups().find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
 		prefix = ""
 		if TypeAsset['sg_asset_type'] == 'Character':
 			prefix= 'CHR_'
@@ -560,26 +759,15 @@ class MayaActions(HookBaseClass):
 		# if cmds.objExists(NameLoc):
 			# Number += 1
 			# NameLoc = prefix+NameAsset+'_%03d' %(Number)
-		maxNull=0
 		# all = cmds.ls()
 		# for i in all:
 			# if "Shape" not in i and i.startswith(prefix+NameAsset):
 				# numNull = i.split(prefix+NameAsset)[-1]
 				# if numNull >= maxNull:
 					# maxNull = int(numNull)
-		all = cmds.ls(type='locator')
-		for i in all:
-			if i.startswith((prefix+NameAsset)):
-				print "1. Start with %s in %s" %(prefix+NameAsset,i)
-				numLoc = i.split((prefix+NameAsset))[-1].replace("Shape","").replace("_","")
-				print numLoc
-				if int(numLoc) >= maxNull:
-					maxNull = int(numLoc)
-					print maxNull
-			elif i.find((prefix+NameAsset)) != -1:
-				print "2. Found name %s in %s" %(prefix+NameAsset,i)
-				
-		number = maxNull+1
+		# numbered after the highest locator of the asset, the nodes are listed once per allocator
+		allocator = self._name_allocator()
+		number = allocator.next_number(prefix+NameAsset, "locator")
 		namespace = NameAsset+'_%03d' %(number)
 		NameLoc = prefix+namespace
 			
@@ -591,14 +779,14 @@ class MayaActions(HookBaseClass):
 		if self.parent.context.entity != sg_publish_data['entity']:     
 			namespace = "%s" % (sg_publish_data.get("entity").get("name"))
 			namespace = namespace.replace(" ", "_")
-			namespace = getNextAvailableNamespace(namespace, number)
+			namespace = getNextAvailableNamespace(namespace, number, allocator)
 			NameLoc = prefix+namespace
 		elif self.parent.context.entity == sg_publish_data['entity']:
 			task = sg_publish_data.get('task')
 			if not task:
 				raise Exception('no task linked to the published file %s' % (sg_publish_data.get('id')))
 			else:
-				step = self.parent.shotgun.find_one('Task', [['id','is', task['id'] ]], ['step.Step.short_name'])
+				step = self._sg_lookups().find_one('Task', [['id','is', task['id'] ]], ['step.Step.short_name'])
 				resolution = ''
 				import re
 				if re.match('.*(Layout|layout|lay).*', task.get('name')):
@@ -614,7 +802,8 @@ class MayaActions(HookBaseClass):
 				namespace = namespace.replace(" ", "_")
 				#namespace = getNextAvailableNamespace(namespace)
 		
-		cmds.spaceLocator(name=NameLoc)
+		locator = cmds.spaceLocator(name=NameLoc)[0]
+		allocator.add_name(locator, "locator")
 				
 		pm.system.createReference(path,  loadReferenceDepth= "all", mergeNamespacesOnClash=False,namespace=namespace ,gr= True, gn= "TMP" )
 
@@ -637,7 +826,7 @@ class MayaActions(HookBaseClass):
 		# Prefix = sg_publish_data.get("entity")
 		IdAsset = sg_publish_data.get("entity").get("id")
 		NameAsset = "%s" % (sg_publish_data.get("entity").get("name"))
-		TypeAsset = self.parent.shotgun.find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
+		TypeAsset = self._sg_lookups().find_one('Asset', [['id','is', IdAsset ]], ['sg_asset_type'])
 		prefix = ""
 		if TypeAsset['sg_asset_type'] == 'Character':
 			prefix= 'CHR_'
@@ -651,26 +840,15 @@ class MayaActions(HookBaseClass):
 		# if cmds.objExists(NameLoc):
 			# Number += 1
 			# NameLoc = prefix+NameAsset+'_%03d' %(Number)
-		maxNull=0
 		# all = cmds.ls()
 		# for i in all:
 			# if "Shape" not in i and i.startswith(prefix+NameAsset):
 				# numNull = i.split(prefix+NameAsset)[-1]
 				# if numNull >= maxNull:
 					# maxNull = int(numNull)
-		all = cmds.ls(type="rtsAssetRoot")
-		for i in all:
-			if i.startswith((prefix+NameAsset)):
-				# print "1. Start with %s in %s" %(prefix+NameAsset,i)
-				numLoc = i.split((prefix+NameAsset))[-1].replace("Shape","").replace("_","")
-				# print numLoc
-				if int(numLoc) >= maxNull:
-					maxNull = int(numLoc)
-					# print maxNull
-			elif i.find((prefix+NameAsset)) != -1:
-				print "2. Found name %s in %s" %(prefix+NameAsset,i)
-				
-		number = maxNull+1
+		# numbered after the highest rtsAssetRoot of the asset, the nodes are listed once per allocator
+		allocator = self._name_allocator()
+		number = allocator.next_number(prefix+NameAsset, "rtsAssetRoot")
 		namespace = NameAsset+'_%03d' %(number)
 		NameLoc = prefix+namespace
 			
@@ -682,14 +860,14 @@ class MayaActions(HookBaseClass):
 		if self.parent.context.entity != sg_publish_data['entity']:     
 			namespace = "%s" % (sg_publish_data.get("entity").get("name"))
 			namespace = namespace.replace(" ", "_")
-			namespace = getNextAvailableNamespace(namespace, number)
+			namespace = getNextAvailableNamespace(namespace, number, allocator)
 			NameLoc = prefix+namespace
 		elif self.parent.context.entity == sg_publish_data['entity']:
 			task = sg_publish_data.get('task')
 			if not task:
 				raise Exception('no task linked to the published file %s' % (sg_publish_data.get('id')))
 			else:
-				step = self.parent.shotgun.find_one('Task', [['id','is', task['id'] ]], ['step.Step.short_name'])
+				step = self._sg_lookups().find_one('Task', [['id','is', task['id'] ]], ['step.Step.short_name'])
 				resolution = ''
 				import re
 				if re.match('.*(Layout|layout|lay).*', task.get('name')):
@@ -707,6 +885,7 @@ class MayaActions(HookBaseClass):
 		
 		# # cmds.createNode("rtsAssetRoot", name = NameLoc)
 		locator = createRtsAssetNode(NameLoc, sg_publish_data)	
+		allocator.add_name(locator, "rtsAssetRoot")
 		
 		pm.system.createReference(path,  loadReferenceDepth= "all", mergeNamespacesOnClash=False,namespace=namespace ,gr= True, gn= "TMP" )
 
@@ -824,17 +1003,8 @@ class MayaActions(HookBaseClass):
 		
 		
 def setPosition(objName, pos, rot, scl):
-	cmds.setAttr("%s.translateX" %objName, pos[0])
-	cmds.setAttr("%s.translateY" %objName, pos[1])
-	cmds.setAttr("%s.translateZ" %objName, pos[2])
-	
-	cmds.setAttr("%s.rotateX" %objName, rot[0])
-	cmds.setAttr("%s.rotateY" %objName, rot[1])
-	cmds.setAttr("%s.rotateZ" %objName, rot[2])
-	
-	cmds.setAttr("%s.scaleX" %objName, scl[0])
-	cmds.setAttr("%s.scaleY" %objName, scl[1])
-	cmds.setAttr("%s.scaleZ" %objName, scl[2])
+	# compound writes, see hooks/lib/rts/poslist_transforms.py
+	poslist_transforms.set_transform(objName, pos, rot, scl)
 
 def createRtsAssetNode(name, publishData = None):
 	rtsLocator = cmds.createNode("rtsAssetRoot", name = name)